@@ -0,0 +1,168 @@
+# 背景 Agent 狀態輪詢 (Fleet Poller)
+# 定期走訪所有啟用中的 Brand 及其 Workspace，在全域與單一 Brand 的並發上限內
+# 輪詢上游，並把最新結果存在記憶體；API 直接讀取快照，不再等待上游回應
+# 依賴主程式的 load_brands / load_brand_workspaces，
+# backend-upstream-circuit-breaker.py 的 fetch_agent_status_guarded，
+# 以及 backend-dashboard-counters.py 的 agent_monitor_totals
+
+import os
+import time
+import random
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+AGENT_FLEET_POLLER_ENABLED = os.getenv("AGENT_FLEET_POLLER_ENABLED", "true").lower() == "true"
+AGENT_FLEET_POLL_INTERVAL = float(os.getenv("AGENT_FLEET_POLL_INTERVAL", "10"))
+AGENT_FLEET_DISCOVERY_INTERVAL = float(os.getenv("AGENT_FLEET_DISCOVERY_INTERVAL", "300"))
+AGENT_FLEET_GLOBAL_CONCURRENCY = int(os.getenv("AGENT_FLEET_GLOBAL_CONCURRENCY", "20"))
+AGENT_FLEET_BRAND_CONCURRENCY = int(os.getenv("AGENT_FLEET_BRAND_CONCURRENCY", "4"))
+# 每輪開始時每個 Workspace 隨機延遲 0 ~ interval * ratio 秒，避免同時打到上游
+AGENT_FLEET_JITTER_RATIO = float(os.getenv("AGENT_FLEET_JITTER_RATIO", "0.5"))
+
+
+def _is_active(item: dict) -> bool:
+    if "is_active" in item:
+        return bool(item["is_active"])
+    return item.get("status", "active") == "active"
+
+
+class AgentFleetPoller:
+    """所有 Brand / Workspace 的 Agent 狀態快照"""
+
+    def __init__(self):
+        # key: (brand_id, workspace_id)
+        self.snapshots: Dict[Tuple[str, str], dict] = {}
+        self.targets: List[Tuple[str, str]] = []
+        self._global_limit = asyncio.Semaphore(AGENT_FLEET_GLOBAL_CONCURRENCY)
+        self._brand_limits: Dict[str, asyncio.Semaphore] = {}
+        self._last_discovery = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+
+    def get(self, brand_id: str, workspace_id: str) -> Optional[dict]:
+        return self.snapshots.get((brand_id, workspace_id))
+
+    def _brand_limit(self, brand_id: str) -> asyncio.Semaphore:
+        limit = self._brand_limits.get(brand_id)
+        if limit is None:
+            limit = self._brand_limits[brand_id] = asyncio.Semaphore(AGENT_FLEET_BRAND_CONCURRENCY)
+        return limit
+
+    async def discover(self):
+        """重新取得啟用中的 Brand 與 Workspace 清單"""
+        brands = [brand for brand in await load_brands() if _is_active(brand)]
+        workspace_lists = await asyncio.gather(
+            *(load_brand_workspaces(brand["id"]) for brand in brands)
+        )
+
+        targets = []
+        for brand, workspaces in zip(brands, workspace_lists):
+            targets.extend(
+                (brand["id"], workspace["id"])
+                for workspace in workspaces
+                if _is_active(workspace)
+            )
+
+        self.targets = targets
+        active = set(targets)
+        for key in list(self.snapshots):
+            if key not in active:
+                del self.snapshots[key]
+                agent_monitor_totals.remove(key)
+        self._last_discovery = time.monotonic()
+
+    async def _poll_target(self, brand_id: str, workspace_id: str):
+        await asyncio.sleep(random.uniform(0, AGENT_FLEET_POLL_INTERVAL * AGENT_FLEET_JITTER_RATIO))
+        async with self._global_limit, self._brand_limit(brand_id):
+            # 斷路器開啟時直接拋出 CircuitOpenError，保留上一輪的快照
+            snapshot = await fetch_agent_status_guarded(brand_id, workspace_id)
+        self.snapshots[(brand_id, workspace_id)] = snapshot
+        agent_monitor_totals.update((brand_id, workspace_id), snapshot["agents"])
+
+    async def poll_all(self):
+        results = await asyncio.gather(
+            *(self._poll_target(brand_id, workspace_id) for brand_id, workspace_id in self.targets),
+            return_exceptions=True
+        )
+        for (brand_id, workspace_id), result in zip(self.targets, results):
+            if isinstance(result, Exception) and not isinstance(result, CircuitOpenError):
+                print(f"Agent 狀態輪詢失敗 {brand_id}/{workspace_id}: {result}")
+        self.rounds += 1
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                if started - self._last_discovery >= AGENT_FLEET_DISCOVERY_INTERVAL or not self.targets:
+                    await self.discover()
+                await self.poll_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Agent 狀態輪詢發生錯誤: {e}")
+            await asyncio.sleep(max(0.0, AGENT_FLEET_POLL_INTERVAL - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": AGENT_FLEET_POLLER_ENABLED,
+            "targets": len(self.targets),
+            "snapshots": len(self.snapshots),
+            "rounds": self.rounds,
+            "poll_interval": AGENT_FLEET_POLL_INTERVAL,
+            "global_concurrency": AGENT_FLEET_GLOBAL_CONCURRENCY,
+            "brand_concurrency": AGENT_FLEET_BRAND_CONCURRENCY
+        }
+
+
+agent_fleet_poller = AgentFleetPoller()
+
+
+async def get_agent_snapshot(brand_id: str, workspace_id: str) -> dict:
+    """優先讀取背景輪詢的快照；尚未輪詢到的 Workspace 才透過快取向上游取得（TTL 由伺服器設定）。
+    上游失敗時回傳最後一次成功的快照並標示 stale，完全沒有資料時才拋出例外"""
+    snapshot = agent_fleet_poller.get(brand_id, workspace_id)
+    if snapshot is not None:
+        return with_staleness(snapshot, brand_id)
+
+    key = (brand_id, workspace_id)
+    try:
+        snapshot = await agent_status_cache.get_or_fetch(
+            key,
+            lambda: fetch_agent_status_guarded(brand_id, workspace_id)
+        )
+        return with_staleness(snapshot, brand_id)
+    except Exception:
+        last_good = agent_status_last_good.get(key)
+        if last_good is None:
+            raise
+        return with_staleness(last_good, brand_id, stale=True)
+
+
+@app.get("/api/v1/agent-status/fleet")
+async def get_agent_fleet_status(token_data: dict = Depends(verify_token)):
+    """背景輪詢狀態"""
+    return agent_fleet_poller.stats()
+
+
+@app.on_event("startup")
+async def start_agent_fleet_poller():
+    if AGENT_FLEET_POLLER_ENABLED:
+        agent_fleet_poller.start()
+
+
+@app.on_event("shutdown")
+async def stop_agent_fleet_poller():
+    await agent_fleet_poller.stop()
@@ -0,0 +1,157 @@
+# Agent Monitor 分類 API（規格見 backend-agent-monitor-api-spec.md）
+# 在後端一次走訪即完成 on_service / on_line / warning / offline 分類，
+# 支援一次查詢多個 Workspace 或整個 Brand；summary_only 時只計數不建立 Agent 清單
+# 依賴 backend-agent-fleet-poller.py 的 get_agent_snapshot
+
+import time
+import asyncio
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
+from fastapi import Query
+
+ON_SERVICE, ON_LINE, WARNING, OFFLINE = range(4)
+AGENT_MONITOR_BUCKETS = ("on_service", "on_line", "warning", "offline")
+
+
+@lru_cache(maxsize=16384)
+def _parse_activity(value: str) -> Optional[float]:
+    """解析 ISO 字串；相同字串在每輪輪詢間大量重複，因此快取結果"""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _activity_timestamp(value) -> Optional[float]:
+    """last_activity → epoch 秒；數字視為 epoch 秒，其他型別視為沒有最後活動時間"""
+    if isinstance(value, str):
+        return _parse_activity(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def classify_agent(agent: dict, cutoff: float) -> int:
+    online = agent.get("online", agent.get("is_online", False))
+    if not online or agent.get("status") == "Offline":
+        return OFFLINE
+    if not agent.get("available", agent.get("is_available", False)):
+        return ON_LINE
+    last_activity = agent.get("last_activity")
+    timestamp = _activity_timestamp(last_activity) if last_activity else None
+    if timestamp is None or timestamp < cutoff:
+        return WARNING
+    return ON_SERVICE
+
+
+def classify_agents(
+    agents: List[dict],
+    warning_time: int,
+    counts_only: bool = False,
+    workspace_id: Optional[str] = None,
+    now: Optional[float] = None
+):
+    """單次走訪分類，回傳 (各分類數量, 各分類 Agent 清單或 None)"""
+    cutoff = (now or time.time()) - warning_time * 60
+    counts = [0, 0, 0, 0]
+    buckets = None if counts_only else ([], [], [], [])
+
+    for agent in agents:
+        bucket = classify_agent(agent, cutoff)
+        counts[bucket] += 1
+        if buckets is not None:
+            item = {
+                "id": agent.get("id") or agent.get("user_id"),
+                "name": agent.get("name") or agent.get("username"),
+                "email": agent.get("email")
+            }
+            if workspace_id is not None:
+                item["workspace_id"] = workspace_id
+            buckets[bucket].append(item)
+
+    return counts, buckets
+
+
+def _summary(counts: List[int]) -> dict:
+    return {f"{name}_count": count for name, count in zip(AGENT_MONITOR_BUCKETS, counts)}
+
+
+@app.get("/api/v1/monitor/agent-monitor")
+async def get_agent_monitor_data(
+    brand_id: str = Query(...),
+    workspace_id: Optional[str] = Query(None, description="逗號分隔可查詢多個 Workspace，省略則為整個 Brand"),
+    refresh_interval: int = Query(..., ge=1),
+    warning_time: int = Query(..., ge=0),
+    summary_only: bool = Query(False),
+    token_data: dict = Depends(verify_token)
+):
+    """獲取 Agent 監控數據，已按狀態分類"""
+    brand = next((b for b in await load_brands() if b["id"] == brand_id), None)
+    if brand is None:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    workspaces = {w["id"]: w for w in await load_brand_workspaces(brand_id)}
+    if workspace_id:
+        workspace_ids = [w.strip() for w in workspace_id.split(",") if w.strip()]
+        missing = [w for w in workspace_ids if w not in workspaces]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Workspace not found: {', '.join(missing)}")
+    else:
+        workspace_ids = list(workspaces)
+
+    results = await asyncio.gather(
+        *(get_agent_snapshot(brand_id, w) for w in workspace_ids),
+        return_exceptions=True
+    )
+
+    now = time.time()
+    multiple = len(workspace_ids) > 1
+    totals = [0, 0, 0, 0]
+    merged = None if summary_only else ([], [], [], [])
+    workspace_results = []
+    stale = False
+
+    for ws_id, snapshot in zip(workspace_ids, results):
+        entry = {"workspace_id": ws_id, "workspace_name": workspaces[ws_id].get("name")}
+        if isinstance(snapshot, Exception):
+            # 沒有任何可用快照的 Workspace 視為空清單
+            entry["error"] = str(snapshot)
+            entry["summary"] = _summary([0, 0, 0, 0])
+            workspace_results.append(entry)
+            continue
+
+        counts, buckets = classify_agents(
+            snapshot["agents"],
+            warning_time,
+            counts_only=summary_only,
+            workspace_id=ws_id if multiple else None,
+            now=now
+        )
+        for i in range(4):
+            totals[i] += counts[i]
+            if merged is not None:
+                merged[i].extend(buckets[i])
+
+        stale = stale or snapshot["stale"]
+        entry["summary"] = _summary(counts)
+        entry["stale"] = snapshot["stale"]
+        workspace_results.append(entry)
+
+    data = {
+        "brand_id": brand_id,
+        "brand_name": brand.get("name"),
+        "stale": stale
+    }
+    if multiple or not workspace_ids:
+        data["workspaces"] = workspace_results
+    else:
+        data["workspace_id"] = workspace_results[0]["workspace_id"]
+        data["workspace_name"] = workspace_results[0]["workspace_name"]
+        if "error" in workspace_results[0]:
+            data["error"] = workspace_results[0]["error"]
+    if merged is not None:
+        data.update(zip(AGENT_MONITOR_BUCKETS, merged))
+    data["summary"] = _summary(totals)
+
+    return {"success": True, "data": data}
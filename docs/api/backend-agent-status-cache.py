@@ -0,0 +1,110 @@
+# Agent 狀態請求合併 (single-flight) 與短 TTL 快取
+# 多個監控畫面同時輪詢同一個 (brand_id, workspace_id) 時，只會對上游發出一次請求
+# TTL 由伺服器端的 AGENT_STATUS_REFRESH_INTERVAL 決定，不受呼叫端的 refresh_interval 影響；
+# 過期的項目在下次查詢或每 TTL 秒一次的掃描中移除
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# 對應 backend-agent-monitor-api-spec.md 的 refresh_interval（秒）
+AGENT_STATUS_REFRESH_INTERVAL = int(os.getenv("AGENT_STATUS_REFRESH_INTERVAL", "60"))
+# 快取時間取刷新間隔的 1/6，並限制在 1 ~ 30 秒之間
+AGENT_STATUS_TTL_RATIO = 6
+AGENT_STATUS_MIN_TTL = 1.0
+AGENT_STATUS_MAX_TTL = 30.0
+
+
+def agent_status_ttl() -> float:
+    """根據伺服器端的 AGENT_STATUS_REFRESH_INTERVAL 計算快取 TTL"""
+    return min(
+        AGENT_STATUS_MAX_TTL,
+        max(AGENT_STATUS_MIN_TTL, AGENT_STATUS_REFRESH_INTERVAL / AGENT_STATUS_TTL_RATIO)
+    )
+
+
+class SingleFlightCache:
+    """同一個 key 同時只有一個進行中的請求，結果快取 ttl 秒"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._next_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def _sweep(self, now: float):
+        """移除所有過期項目，不再被查詢的 key 不會一直留在記憶體"""
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self.evicted += len(expired)
+        self._next_sweep = now + self.ttl
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.evicted += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+
+        # shield：單一呼叫端斷線不會取消其他等待中的呼叫端
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # 取出例外，避免沒有等待者時出現 "exception was never retrieved"
+            task.exception()
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "requests": requests,
+            "fan_in_ratio": round(requests / self.misses, 2) if self.misses else None,
+            "cached_keys": len(self._entries),
+            "evicted": self.evicted,
+            "inflight": len(self._inflight)
+        }
+
+
+# key: (brand_id, workspace_id)
+agent_status_cache = SingleFlightCache(ttl=agent_status_ttl())
+
+
+@app.get("/api/v1/agent-status/metrics")
+async def get_agent_status_cache_metrics(token_data: dict = Depends(verify_token)):
+    """Agent 狀態快取命中 / 未命中 / 合併請求統計"""
+    return agent_status_cache.stats()
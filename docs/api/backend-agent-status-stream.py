@@ -0,0 +1,174 @@
+# Agent 狀態即時推送 (Server-Sent Events)
+# 每個 (brand_id, workspace_id) 只有一個後端輪詢任務，所有訂閱者共用；
+# 連線後先送出完整快照，之後只推送 status / online / last_activity 有變動的 Agent
+# 依賴 backend-agent-fleet-poller.py 的 get_agent_snapshot
+
+import os
+import json
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+AGENT_STREAM_POLL_INTERVAL = float(os.getenv("AGENT_STREAM_POLL_INTERVAL", "5"))
+AGENT_STREAM_HEARTBEAT = float(os.getenv("AGENT_STREAM_HEARTBEAT", "15"))
+AGENT_STREAM_QUEUE_SIZE = int(os.getenv("AGENT_STREAM_QUEUE_SIZE", "100"))
+
+# 判斷 Agent 是否變動的欄位
+AGENT_DELTA_FIELDS = ("status", "online", "last_activity")
+
+
+def agent_key(agent: dict) -> str:
+    return agent.get("id") or agent.get("user_id")
+
+
+def diff_agents(
+    previous: Dict[str, tuple],
+    agents: List[dict]
+) -> Tuple[Dict[str, tuple], List[dict], List[str]]:
+    """比對前後兩次結果，回傳 (新指紋, 有變動的 Agent, 已移除的 Agent ID)"""
+    current = {}
+    changed = []
+    for agent in agents:
+        key = agent_key(agent)
+        fingerprint = tuple(agent.get(field) for field in AGENT_DELTA_FIELDS)
+        current[key] = fingerprint
+        if previous.get(key) != fingerprint:
+            changed.append(agent)
+    removed = [key for key in previous if key not in current]
+    return current, changed, removed
+
+
+class AgentStatusChannel:
+    """單一 Workspace 的推送頻道：一個輪詢任務，多個訂閱者佇列"""
+
+    def __init__(self, brand_id: str, workspace_id: str):
+        self.brand_id = brand_id
+        self.workspace_id = workspace_id
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.snapshot: Optional[List[dict]] = None
+        self.fingerprints: Dict[str, tuple] = {}
+        self.stale = False
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=AGENT_STREAM_QUEUE_SIZE)
+        if self.snapshot is not None:
+            queue.put_nowait(("snapshot", self.snapshot))
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _publish(self, event: str, data):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # 消費過慢的訂閱者：清空佇列，改送完整快照重新同步
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("snapshot", self.snapshot))
+
+    async def _poll_once(self):
+        snapshot = await get_agent_snapshot(self.brand_id, self.workspace_id)
+        agents = snapshot["agents"]
+        fingerprints, changed, removed = diff_agents(self.fingerprints, agents)
+        first = self.snapshot is None
+        self.snapshot = agents
+        self.fingerprints = fingerprints
+
+        if first:
+            self._publish("snapshot", agents)
+        elif changed or removed:
+            self._publish("delta", {"changed": changed, "removed": removed})
+
+        # 上游狀態改變（開始 / 結束使用過期資料）時通知前端
+        if snapshot["stale"] != self.stale:
+            self.stale = snapshot["stale"]
+            self._publish("stale", {"stale": self.stale, "age": int(snapshot["age"])})
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await self._poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._publish("error", {"detail": str(e)})
+            await asyncio.sleep(AGENT_STREAM_POLL_INTERVAL)
+
+
+class AgentStatusBroker:
+    """管理所有 Workspace 頻道"""
+
+    def __init__(self):
+        self.channels: Dict[Tuple[str, str], AgentStatusChannel] = {}
+
+    def subscribe(self, brand_id: str, workspace_id: str) -> Tuple[AgentStatusChannel, asyncio.Queue]:
+        key = (brand_id, workspace_id)
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = self.channels[key] = AgentStatusChannel(brand_id, workspace_id)
+        return channel, channel.subscribe()
+
+    def unsubscribe(self, channel: AgentStatusChannel, queue: asyncio.Queue):
+        channel.unsubscribe(queue)
+        if not channel.subscribers:
+            self.channels.pop((channel.brand_id, channel.workspace_id), None)
+
+    async def close(self):
+        for channel in list(self.channels.values()):
+            if channel.task is not None:
+                channel.task.cancel()
+        self.channels.clear()
+
+
+agent_status_broker = AgentStatusBroker()
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+@app.get("/api/v1/agent-status/stream")
+async def stream_agent_status(
+    request: Request,
+    workspace_id: str,
+    brand_id: str,
+    token_data: dict = Depends(verify_token)
+):
+    """以 SSE 推送 Workspace 的 Agent 狀態：snapshot 事件後接 delta 事件"""
+
+    async def event_source():
+        channel, queue = agent_status_broker.subscribe(brand_id, workspace_id)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=AGENT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event, data)
+        finally:
+            agent_status_broker.unsubscribe(channel, queue)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.on_event("shutdown")
+async def close_agent_status_broker():
+    await agent_status_broker.close()
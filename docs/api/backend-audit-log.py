@@ -0,0 +1,182 @@
+# 審計日誌非同步批次寫入（audit_logs 表見 docs/database/database-schema.sql）
+# - 處理請求時只把事件放入有上限的 asyncio.Queue，不等待資料庫
+# - 背景寫入器累積到 AUDIT_LOG_BATCH_SIZE 筆或距第一筆超過 AUDIT_LOG_FLUSH_INTERVAL 秒時，
+#   以多列 INSERT 在單一交易中寫入
+# - 佇列滿時呼叫端等待空位（背壓），等待次數與時間列入指標；事件不丟棄
+# - 寫入失敗時重試 AUDIT_LOG_MAX_RETRIES 次，仍失敗才捨棄該批並記錄
+# - 關閉時透過 db.before_close 在連線池關閉前寫完佇列
+# 依賴 backend-database.py 的 db
+
+import os
+import json
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000"))
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "500"))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "1"))
+AUDIT_LOG_MAX_RETRIES = int(os.getenv("AUDIT_LOG_MAX_RETRIES", "3"))
+# 每列 10 個參數，SQLite 舊版單一語句上限 999 個參數
+AUDIT_LOG_INSERT_CHUNK = 90
+AUDIT_LOG_QUERY_CHUNK = 500
+
+
+def _json(value) -> Optional[str]:
+    return json.dumps(value, ensure_ascii=False, default=str) if value is not None else None
+
+
+def write_audit_logs(conn, events: List[tuple]) -> int:
+    """events: (id, user_id, action, resource_type, resource_id, old_values, new_values,
+    ip_address, user_agent, created_at)；已寫入的 id 會被忽略，重寫同一批不會重複"""
+    # 不存在的使用者會違反外鍵而讓整批失敗，改記為 NULL 保留事件
+    user_ids = list({event[1] for event in events if event[1]})
+    known = set()
+    for i in range(0, len(user_ids), AUDIT_LOG_QUERY_CHUNK):
+        chunk = user_ids[i:i + AUDIT_LOG_QUERY_CHUNK]
+        known.update(row[0] for row in conn.execute(
+            f"SELECT id FROM users WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    rows = [event if event[1] in known else (event[0], None, *event[2:]) for event in events]
+
+    row_placeholder = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    for i in range(0, len(rows), AUDIT_LOG_INSERT_CHUNK):
+        chunk = rows[i:i + AUDIT_LOG_INSERT_CHUNK]
+        conn.execute(
+            """INSERT OR IGNORE INTO audit_logs (
+                id, user_id, action, resource_type, resource_id, old_values, new_values,
+                ip_address, user_agent, created_at
+            ) VALUES """ + ",".join([row_placeholder] * len(chunk)),
+            [value for row in chunk for value in row]
+        )
+    return len(rows)
+
+
+class AuditLogWriter:
+    def __init__(self, maxsize: int = AUDIT_LOG_QUEUE_SIZE):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._batch: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+    async def record(
+        self,
+        token_data: Optional[dict],
+        action: str,
+        resource_type: str,
+        resource_id=None,
+        old_values=None,
+        new_values=None,
+        request=None
+    ):
+        """放入佇列即返回；佇列滿時等待寫入器騰出空位"""
+        event = (
+            str(uuid.uuid4()),
+            (token_data or {}).get("user_id"),
+            action,
+            resource_type,
+            str(resource_id) if resource_id is not None else None,
+            _json(old_values),
+            _json(new_values),
+            request.client.host if request is not None and request.client else None,
+            request.headers.get("user-agent") if request is not None else None,
+            datetime.utcnow()
+        )
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+            started = time.monotonic()
+            await self._queue.put(event)
+            self.backpressure_seconds += time.monotonic() - started
+        self.enqueued += 1
+        self.high_water = max(self.high_water, self._queue.qsize())
+
+    async def _write(self, batch: List[tuple]):
+        for attempt in range(AUDIT_LOG_MAX_RETRIES + 1):
+            try:
+                self.written += await db.run(write_audit_logs, batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                self.failures += 1
+                print(f"Audit log flush failed (attempt {attempt + 1}): {e}")
+                if attempt < AUDIT_LOG_MAX_RETRIES:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+        self.dropped += len(batch)
+        print(f"Audit log batch dropped: {len(batch)} events")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + AUDIT_LOG_FLUSH_INTERVAL
+            while len(self._batch) < AUDIT_LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 寫入完成前保留在 self._batch，寫入途中被停止時由 stop() 重寫（以 id 去重）
+            await self._write(self._batch)
+            self._batch = []
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止背景寫入器並寫完尚未寫入的事件（含被中斷的批次）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for i in range(0, len(pending), AUDIT_LOG_BATCH_SIZE):
+            await self._write(pending[i:i + AUDIT_LOG_BATCH_SIZE])
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3)
+        }
+
+
+audit_log_writer = AuditLogWriter()
+
+
+@app.on_event("startup")
+async def start_audit_log_writer():
+    audit_log_writer.start()
+    db.before_close(audit_log_writer.stop)
+
+
+@app.get("/api/v1/audit-logs/metrics")
+async def get_audit_log_metrics(token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in ("Owner", "Admin", "Auditor"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return audit_log_writer.stats()
@@ -0,0 +1,169 @@
+# JWT 驗證快取與金鑰管理
+# - 金鑰只在啟動時載入一次（JWT_SECRET_KEY 或 JWT_SECRET_KEY_FILE），可重新載入以輪替
+# - 已解碼的 payload 以 token 摘要為 key 存在 LRU 快取，依 exp 自動失效
+# - 記錄每次驗證耗時（/api/v1/auth/metrics）
+# 由主程式的 verify_token / login 使用
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import jwt
+
+JWT_ALGORITHM = "HS256"
+JWT_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+
+
+class JWTKeyring:
+    """目前用於簽發的金鑰，以及輪替期間仍接受驗證的舊金鑰"""
+
+    def __init__(self):
+        self.current: Optional[str] = None
+        self.previous: List[str] = []
+        self.version = 0
+
+    def _read_current(self) -> Optional[str]:
+        key_file = os.getenv("JWT_SECRET_KEY_FILE")
+        if key_file:
+            with open(key_file) as f:
+                return f.read().strip()
+        return os.getenv("JWT_SECRET_KEY")
+
+    def load(self):
+        key = self._read_current()
+        if not key:
+            raise RuntimeError("JWT_SECRET_KEY or JWT_SECRET_KEY_FILE must be set")
+        previous = [k for k in os.getenv("JWT_PREVIOUS_SECRET_KEYS", "").split(",") if k]
+        # 輪替：新金鑰生效後，舊的目前金鑰仍可驗證尚未過期的 token
+        if self.current and self.current != key and self.current not in previous:
+            previous.insert(0, self.current)
+        self.current = key
+        self.previous = previous
+        self.version += 1
+
+    @property
+    def signing_key(self) -> str:
+        if self.current is None:
+            self.load()
+        return self.current
+
+    def decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(token, self.signing_key, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidSignatureError:
+            for key in self.previous:
+                try:
+                    return jwt.decode(token, key, algorithms=[JWT_ALGORITHM])
+                except jwt.InvalidSignatureError:
+                    continue
+            raise
+
+
+class TokenCache:
+    """已驗證 token 的 LRU 快取，key 為 token 的 SHA-256 摘要"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return payload
+
+    def put(self, digest: bytes, payload: dict):
+        exp = payload.get("exp")
+        with self._lock:
+            self._entries[digest] = (payload, float(exp) if exp is not None else None)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AuthMetrics:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.failures = 0
+
+    def observe(self, elapsed_ms: float, ok: bool):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.failures += 1
+
+
+jwt_keyring = JWTKeyring()
+token_cache = TokenCache(JWT_CACHE_MAX_SIZE)
+auth_metrics = AuthMetrics()
+
+
+def decode_token_cached(token: str) -> dict:
+    """先查快取，未命中才解碼並驗證簽章；過期的 token 會拋出 ExpiredSignatureError"""
+    digest = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    payload = token_cache.get(digest, now)
+    if payload is not None:
+        return payload
+    payload = jwt_keyring.decode(token)
+    token_cache.put(digest, payload)
+    return payload
+
+
+def reload_jwt_keys():
+    """重新載入金鑰；清除快取，讓已移除金鑰簽發的 token 重新驗證"""
+    jwt_keyring.load()
+    token_cache.clear()
+
+
+@app.on_event("startup")
+async def load_jwt_keys():
+    jwt_keyring.load()
+
+
+@app.get("/api/v1/auth/metrics")
+async def get_auth_metrics(token_data: dict = Depends(verify_token)):
+    """驗證耗時與快取命中統計"""
+    return {
+        "requests": auth_metrics.count,
+        "failures": auth_metrics.failures,
+        "avg_ms": round(auth_metrics.total_ms / auth_metrics.count, 3) if auth_metrics.count else 0,
+        "max_ms": round(auth_metrics.max_ms, 3),
+        "cache_hits": token_cache.hits,
+        "cache_misses": token_cache.misses,
+        "cache_size": len(token_cache),
+        "key_version": jwt_keyring.version
+    }
+
+
+@app.post("/api/v1/auth/keys/reload")
+async def reload_auth_keys(token_data: dict = Depends(verify_token)):
+    """輪替 JWT 金鑰（重新讀取 JWT_SECRET_KEY_FILE / 環境變數）"""
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    reload_jwt_keys()
+    return {"message": "JWT keys reloaded", "key_version": jwt_keyring.version}
@@ -1,6 +1,6 @@
 # Brand 和 Agent Monitor API 端點補充
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
 from pydantic import BaseModel
 from typing import List, Optional
 import httpx
@@ -11,6 +11,7 @@ class Brand(BaseModel):
     name: str
     api_url: str
     token: str
+    token_expires_at: Optional[datetime] = None
     status: str = "active"
     created_at: datetime
     updated_at: datetime
@@ -20,9 +21,8 @@ class BrandToken(BaseModel):
     expires_at: Optional[datetime] = None
 
 # Brand 管理 API
-@app.get("/api/v1/brands")
-async def get_brands(token_data: dict = Depends(verify_token)):
-    """獲取所有 Brand 列表"""
+async def load_brands():
+    """Brand 列表（供 API 與背景輪詢共用）"""
     # TODO: 實際查詢邏輯
     return [
         {
@@ -43,11 +43,28 @@ async def get_brands(token_data: dict = Depends(verify_token)):
         }
     ]
 
+@app.get("/api/v1/brands")
+async def get_brands(token_data: dict = Depends(verify_token)):
+    """獲取所有 Brand 列表"""
+    return await load_brands()
+
 @app.post("/api/v1/brands")
 async def create_brand(brand: Brand, token_data: dict = Depends(verify_token)):
     """創建新 Brand"""
-    # TODO: 實際創建邏輯
-    return {"id": "brand_new", **brand.dict()}
+    def _create_brand(conn):
+        conn.execute(
+            "INSERT INTO brands (id, name, api_url, token, token_expires_at, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (brand.id, brand.name, brand.api_url, brand.token, brand.token_expires_at, brand.status)
+        )
+        bump_counter(conn, "brand_count", 1)
+
+    await db.run(_create_brand)
+    dashboard_counters.apply("brand_count", 1)
+    await brand_credentials.reload(brand.id)
+    await audit_log_writer.record(
+        token_data, "create", "brand", brand.id, new_values=brand.dict(exclude={"token"})
+    )
+    return brand.dict()
 
 @app.get("/api/v1/brands/{brand_id}")
 async def get_brand_by_id(brand_id: str, token_data: dict = Depends(verify_token)):
@@ -62,9 +79,21 @@ async def get_brand_by_id(brand_id: str, token_data: dict = Depends(verify_token
 
 @app.put("/api/v1/brands/{brand_id}")
 async def update_brand(brand_id: str, brand: Brand, token_data: dict = Depends(verify_token)):
-    """更新 Brand"""
-    # TODO: 實際更新邏輯
-    return {"id": brand_id, **brand.dict()}
+    """更新 Brand；本 worker 的憑證快取立即更新（見 backend-brand-credentials.py）"""
+    def _update_brand(conn):
+        return conn.execute("""
+            UPDATE brands SET name = ?, api_url = ?, token = ?, token_expires_at = ?, status = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND deleted_at IS NULL
+        """, (brand.name, brand.api_url, brand.token, brand.token_expires_at, brand.status, brand_id)).rowcount
+
+    if not await db.run(_update_brand):
+        raise HTTPException(status_code=404, detail="Brand not found")
+    await brand_credentials.reload(brand_id)
+    await audit_log_writer.record(
+        token_data, "update", "brand", brand_id, new_values=brand.dict(exclude={"token"})
+    )
+    return {"id": brand_id, **brand.dict(exclude={"id"})}
 
 @app.delete("/api/v1/brands/{brand_id}")
 async def delete_brand(brand_id: str, token_data: dict = Depends(verify_token)):
@@ -74,16 +103,19 @@ async def delete_brand(brand_id: str, token_data: dict = Depends(verify_token)):
 
 @app.get("/api/v1/brands/{brand_id}/token")
 async def get_brand_token(brand_id: str, token_data: dict = Depends(verify_token)):
-    """獲取 Brand 的 API Token"""
-    # TODO: 從資料庫查詢實際 token
-    return {
-        "token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.example_token",
-        "expires_at": None
-    }
+    """獲取 Brand 的 API Token（讀取憑證快取）"""
+    try:
+        credential = brand_credentials.get(brand_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    expires_at = credential["expires_at"]
+    return BrandToken(
+        token=credential["token"],
+        expires_at=datetime.utcfromtimestamp(expires_at) if expires_at is not None else None
+    )
 
-@app.get("/api/v1/brands/{brand_id}/workspaces")
-async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_token)):
-    """獲取 Brand 下的所有 Workspace"""
+async def load_brand_workspaces(brand_id: str):
+    """Brand 下的 Workspace 列表（供 API 與背景輪詢共用）"""
     # TODO: 實際查詢邏輯或調用外部 API
     return [
         {
@@ -100,6 +132,11 @@ async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_
         }
     ]
 
+@app.get("/api/v1/brands/{brand_id}/workspaces")
+async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_token)):
+    """獲取 Brand 下的所有 Workspace"""
+    return await load_brand_workspaces(brand_id)
+
 @app.get("/api/v1/brands/{brand_id}/agents")
 async def get_brand_agents(brand_id: str, token_data: dict = Depends(verify_token)):
     """獲取 Brand 下的所有 Agent"""
@@ -127,105 +164,92 @@ async def get_brand_agents(brand_id: str, token_data: dict = Depends(verify_toke
 
 @app.post("/api/v1/brands/{brand_id}/sync")
 async def sync_brand_resources(brand_id: str, token_data: dict = Depends(verify_token)):
-    """同步 Brand 資源（Workspace、Agent 等）"""
-    # TODO: 實際同步邏輯
+    """同步 Brand 資源（Workspace、Bot、Agent），只寫入與上游不同的列（見 backend-brand-sync.py）"""
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    try:
+        result = await sync_brand(brand_credentials.get(brand_id))
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Brand sync already running")
+    except BrandSyncError as e:
+        raise HTTPException(status_code=502, detail=f"Brand sync failed: {e}")
+
+    stats = result["resources"]
+    await audit_log_writer.record(token_data, "sync", "brand", brand_id, new_values=stats)
     return {
         "message": "Sync completed",
         "synced_at": datetime.utcnow(),
-        "workspaces_count": 2,
-        "agents_count": 5
+        "workspaces_count": stats["workspaces"]["total"],
+        "bots_count": stats["bots"]["total"],
+        "agents_count": stats["agents"]["total"],
+        "watermark": result["watermark"],
+        "changes": stats
     }
 
 # Agent Status API (代理外部 API 調用)
+async def fetch_agent_status(brand_id: str, workspace_id: str):
+    """調用外部 API 取得 Workspace 的 Agent 狀態"""
+    # Brand 的 api_url 與 token 取自憑證快取，見 backend-brand-credentials.py
+    try:
+        credential = brand_credentials.get(brand_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    # 共用連線池，見 backend-upstream-client.py
+    response = await upstream_pool.get(
+        brand_id,
+        credential["api_url"],
+        "/api/v1/users/status",
+        credential["token"],
+        params={"workspace_id": workspace_id}
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"External API error: {response.text}"
+        )
+    return response.json()
+
 @app.get("/api/v1/agent-status")
 async def get_agent_status(
+    response: Response,
     workspace_id: str,
     brand_id: str,
     token_data: dict = Depends(verify_token)
 ):
     """獲取指定 Workspace 的 Agent 狀態"""
     try:
-        # 獲取 Brand Token
-        # TODO: 從資料庫查詢實際 brand token
-        brand_token = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.example_token"
-        
-        # 調用外部 API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.cs-system-009.cxgenie.app/api/v1/users/status",
-                params={"workspace_id": workspace_id},
-                headers={
-                    "Authorization": f"Bearer {brand_token}",
-                    "Accept": "application/json"
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"External API error: {response.text}"
-                )
-                
+        # 讀取背景輪詢快照（backend-agent-fleet-poller.py），
+        # 尚未輪詢到時再透過合併快取向上游取得（backend-agent-status-cache.py）
+        snapshot = await get_agent_snapshot(brand_id, workspace_id)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="External API unavailable",
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
     except httpx.TimeoutException:
         raise HTTPException(
             status_code=408,
             detail="External API timeout"
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        # 如果外部 API 失敗，返回模擬數據
-        return [
-            {
-                "id": "agent_1",
-                "name": "Agent Alice",
-                "user_id": "user_1", 
-                "username": "alice",
-                "status": "Available",
-                "online": True,
-                "is_online": True,
-                "available": True,
-                "is_available": True,
-                "last_activity": "2024-01-15T10:30:00Z"
-            },
-            {
-                "id": "agent_2",
-                "name": "Agent Bob",
-                "user_id": "user_2",
-                "username": "bob", 
-                "status": "Busy",
-                "online": True,
-                "is_online": True,
-                "available": False,
-                "is_available": False,
-                "last_activity": "2024-01-15T10:25:00Z"
-            },
-            {
-                "id": "agent_3",
-                "name": "Agent Charlie",
-                "user_id": "user_3",
-                "username": "charlie",
-                "status": "Offline", 
-                "online": False,
-                "is_online": False,
-                "available": False,
-                "is_available": False,
-                "last_activity": "2024-01-15T09:45:00Z"
-            }
-        ]
+        raise HTTPException(status_code=502, detail=f"External API error: {e}")
+
+    # 上游異常時回傳最後一次成功的快照，以標頭標示資料已過期
+    if snapshot["stale"]:
+        response.headers["X-Data-Stale"] = "true"
+        response.headers["X-Data-Age"] = str(int(snapshot["age"]))
+    return snapshot["agents"]
 
 # Dashboard Agent Monitor API
 @app.get("/api/v1/dashboard/agent-monitor")
-async def get_agent_monitor(token_data: dict = Depends(verify_token)):
-    """獲取 Agent 監控統計數據"""
-    # TODO: 實際統計邏輯
-    return {
-        "total_agents": 15,
-        "online_agents": 12,
-        "available_agents": 8,
-        "busy_agents": 4,
-        "offline_agents": 3,
-        "warning_agents": 2,
-        "last_updated": datetime.utcnow()
-    }
\ No newline at end of file
+async def get_agent_monitor(warning_time: Optional[int] = None, token_data: dict = Depends(verify_token)):
+    """獲取 Agent 監控統計數據（背景輪詢更新快照時增量維護）；
+    warning_time 為判定 warning 的閒置分鐘數，預設 DASHBOARD_AGENT_WARNING_MINUTES"""
+    return agent_monitor_totals.summary(warning_time)
\ No newline at end of file
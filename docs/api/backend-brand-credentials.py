@@ -0,0 +1,183 @@
+# Brand 上游憑證快取（token_expires_at 欄位見 docs/database/database-brand-credentials.sql）
+# - 啟動時一次載入所有未刪除 Brand 的 api_url / token / token_expires_at，
+#   代理上游的呼叫只做字典查詢，不等待資料庫
+# - 背景工作每 BRAND_CREDENTIAL_CHECK_INTERVAL 秒重新讀取 BRAND_TOKEN_REFRESH_AHEAD 秒內到期的 token，
+#   每 BRAND_CREDENTIAL_RELOAD_INTERVAL 秒全部重新載入，讓其他 worker 的變更也能生效
+# - 本 worker 建立 / 更新 Brand 後以 reload 立即更新，刪除時以 invalidate 移除並釋放上游連線
+# 依賴 backend-database.py 的 db 與 backend-upstream-client.py 的 upstream_pool
+
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+BRAND_TOKEN_REFRESH_AHEAD = float(os.getenv("BRAND_TOKEN_REFRESH_AHEAD", "300"))
+BRAND_CREDENTIAL_CHECK_INTERVAL = float(os.getenv("BRAND_CREDENTIAL_CHECK_INTERVAL", "30"))
+BRAND_CREDENTIAL_RELOAD_INTERVAL = float(os.getenv("BRAND_CREDENTIAL_RELOAD_INTERVAL", "300"))
+# 同一個未輪替的 token 重複警告的間隔
+BRAND_TOKEN_WARNING_INTERVAL = float(os.getenv("BRAND_TOKEN_WARNING_INTERVAL", "3600"))
+
+BRAND_CREDENTIAL_SQL = """
+    SELECT id, api_url, token, token_expires_at FROM brands
+    WHERE deleted_at IS NULL AND token IS NOT NULL
+"""
+
+
+def _expires_at(value) -> Optional[float]:
+    """token_expires_at → epoch 秒；未設定時回傳 None；無時區的時間視為 UTC"""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _credential(row) -> dict:
+    return {
+        "id": str(row["id"]),
+        "api_url": row["api_url"],
+        "token": row["token"],
+        "expires_at": _expires_at(row["token_expires_at"])
+    }
+
+
+class BrandCredentialCache:
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+        # brand_id → 上次警告 token 未輪替的時間
+        self._warned: Dict[str, float] = {}
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.expired_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get(self, brand_id) -> dict:
+        """{"id", "api_url", "token", "expires_at"}；不在快取中時拋出 LookupError"""
+        entry = self._entries.get(str(brand_id))
+        if entry is None:
+            self.misses += 1
+            raise LookupError(f"Brand {brand_id} not found")
+        self.hits += 1
+        if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+            self.expired_hits += 1
+        return entry
+
+    def brand_ids(self):
+        return list(self._entries)
+
+    async def load_all(self):
+        rows = await db.fetchall(BRAND_CREDENTIAL_SQL)
+        self._entries = {str(row["id"]): _credential(row) for row in rows}
+        self.loaded_at = time.time()
+
+    async def reload(self, brand_id):
+        """重新讀取單一 Brand；已刪除或沒有 token 時從快取移除"""
+        row = await db.fetchone(BRAND_CREDENTIAL_SQL + " AND id = ?", (brand_id,))
+        if row is None:
+            self._entries.pop(str(brand_id), None)
+        else:
+            self._entries[str(brand_id)] = _credential(row)
+
+    async def invalidate(self, brand_id):
+        """Brand 刪除時移除憑證並關閉其上游連線"""
+        self._entries.pop(str(brand_id), None)
+        self._warned.pop(str(brand_id), None)
+        await upstream_pool.close_brand(str(brand_id))
+
+    def expiring(self, within: float = BRAND_TOKEN_REFRESH_AHEAD):
+        deadline = time.time() + within
+        return [
+            brand_id for brand_id, entry in self._entries.items()
+            if entry["expires_at"] is not None and entry["expires_at"] <= deadline
+        ]
+
+    async def refresh_expiring(self):
+        for brand_id in self.expiring():
+            previous = self._entries.get(brand_id)
+            try:
+                await self.reload(brand_id)
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Brand token refresh failed for {brand_id}: {e}")
+                continue
+            current = self._entries.get(brand_id)
+            if (
+                current is None or previous is None or current["expires_at"] is None
+                or current["token"] != previous["token"]
+            ):
+                self._warned.pop(brand_id, None)
+                continue
+            now = time.time()
+            if now - self._warned.get(brand_id, 0.0) >= BRAND_TOKEN_WARNING_INTERVAL:
+                self._warned[brand_id] = now
+                print(f"Brand {brand_id} token expires at "
+                      f"{datetime.utcfromtimestamp(current['expires_at'])} and has not been rotated")
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "brands": len(self._entries),
+            "loaded_at": datetime.utcfromtimestamp(self.loaded_at) if self.loaded_at else None,
+            "expiring": len(self.expiring()),
+            "expired": sum(
+                1 for entry in self._entries.values()
+                if entry["expires_at"] is not None and entry["expires_at"] <= now
+            ),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired_hits": self.expired_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures
+        }
+
+
+brand_credentials = BrandCredentialCache()
+
+
+async def _brand_credential_loop():
+    last_reload = time.monotonic()
+    while True:
+        await asyncio.sleep(BRAND_CREDENTIAL_CHECK_INTERVAL)
+        try:
+            if time.monotonic() - last_reload >= BRAND_CREDENTIAL_RELOAD_INTERVAL:
+                await brand_credentials.load_all()
+                last_reload = time.monotonic()
+            else:
+                await brand_credentials.refresh_expiring()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Brand credential refresh failed: {e}")
+
+
+_brand_credential_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def start_brand_credentials():
+    global _brand_credential_task
+    await brand_credentials.load_all()
+    _brand_credential_task = asyncio.create_task(_brand_credential_loop())
+
+
+@app.on_event("shutdown")
+async def stop_brand_credentials():
+    if _brand_credential_task is not None:
+        _brand_credential_task.cancel()
+        try:
+            await _brand_credential_task
+        except asyncio.CancelledError:
+            pass
+
+
+@app.get("/api/v1/brands/credentials/metrics")
+async def get_brand_credential_metrics(token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return brand_credentials.stats()
@@ -1,109 +1,353 @@
 # 後端 Brand 刪除 API 實作範例
+# 資料庫存取透過共用模組 db（見 backend-database.py）
+# Brand 數量計數器見 backend-dashboard-counters.py，審計日誌見 backend-audit-log.py，
+# 刪除後以 brand_credentials.invalidate 移除上游憑證（見 backend-brand-credentials.py）
+# 有關聯資源的 Brand 以 cascade=true 刪除：先軟刪除，再由背景工作分批刪除關聯資源，
+# 每批一個短交易並把進度寫入 brand_deletion_log，不會長時間佔住寫入鎖；服務重啟後繼續未完成的工作
+# 多個 worker 時以 brand_deletion_log.owner / lease_expires_at 租約認領：每批續約，
+# 租約過期（worker 中斷）後由其他 worker 的背景掃描接手，同一筆 cascade 不會被同時執行
 
+import os
+import json
+import socket
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 
 router = APIRouter(prefix="/api/v1/brands", tags=["brands"])
 
+BRAND_CASCADE_CHUNK = int(os.getenv("BRAND_CASCADE_CHUNK", "500"))
+# 每批之間讓出寫入鎖的秒數
+BRAND_CASCADE_PAUSE = float(os.getenv("BRAND_CASCADE_PAUSE", "0.05"))
+# cascade 租約秒數；每批續約，也是背景掃描認領過期租約的間隔
+BRAND_CASCADE_LEASE = float(os.getenv("BRAND_CASCADE_LEASE", "60"))
+BRAND_CASCADE_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+# (資料表, dashboard 計數器, 進度鍵)
+BRAND_CHILD_TABLES = (
+    ("brand_agents", "agent_count", "agents"),
+    ("brand_bots", "bot_count", "bots"),
+    ("brand_workspaces", "workspace_count", "workspaces")
+)
+
+# 一次查詢取得 Brand 與各關聯資源數量
+BRAND_DEPENDENCY_SQL = """
+    SELECT b.id, b.name, b.deleted_at,
+        (SELECT COUNT(*) FROM brand_workspaces WHERE brand_id = b.id) AS workspace_count,
+        (SELECT COUNT(*) FROM brand_bots WHERE brand_id = b.id) AS bot_count,
+        (SELECT COUNT(*) FROM brand_agents WHERE brand_id = b.id) AS agent_count
+    FROM brands b WHERE b.id = ?
+"""
+
+def _delete_brand(conn, brand_id: int):
+    cursor = conn.cursor()
+
+    # 檢查 Brand 是否存在及是否有關聯資源
+    cursor.execute(BRAND_DEPENDENCY_SQL, (brand_id,))
+    brand = cursor.fetchone()
+
+    if not brand:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    # 有關聯資源時拒絕刪除，改用 cascade=true
+    if brand["workspace_count"] or brand["bot_count"] or brand["agent_count"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot delete brand with associated resources: {brand['workspace_count']} workspaces, {brand['bot_count']} bots, {brand['agent_count']} agents"
+        )
+
+    # 刪除 Brand
+    cursor.execute("DELETE FROM brands WHERE id = ?", (brand_id,))
+
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    # 已軟刪除的 Brand 不在計數內
+    if not brand[2]:
+        bump_counter(conn, "brand_count", -1)
+
+    return brand
+
+class BrandCascadeLeaseLost(Exception):
+    """cascade 租約已過期並由其他 worker 接手"""
+
+def _lease_deadline() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=BRAND_CASCADE_LEASE)
+
+def _claim_brand_cascade(conn, log_id: int) -> bool:
+    """取得或續約 cascade 租約；其他 worker 持有未過期的租約時回傳 False"""
+    return conn.execute("""
+        UPDATE brand_deletion_log SET owner = ?, lease_expires_at = ?
+        WHERE id = ? AND status = 'running'
+          AND (owner IS NULL OR owner = ? OR lease_expires_at IS NULL OR lease_expires_at < ?)
+    """, (BRAND_CASCADE_WORKER, _lease_deadline(), log_id, BRAND_CASCADE_WORKER, datetime.utcnow())).rowcount > 0
+
+def _renew_brand_cascade(conn, log_id: int):
+    if not conn.execute(
+        "UPDATE brand_deletion_log SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+        (_lease_deadline(), log_id, BRAND_CASCADE_WORKER)
+    ).rowcount:
+        raise BrandCascadeLeaseLost(log_id)
+
+def _release_brand_cascades(conn, log_ids):
+    conn.executemany(
+        "UPDATE brand_deletion_log SET owner = NULL, lease_expires_at = NULL WHERE id = ? AND owner = ?",
+        [(log_id, BRAND_CASCADE_WORKER) for log_id in log_ids]
+    )
+
+def _running_brand_cascade(conn, brand_id: int) -> Optional[int]:
+    row = conn.execute(
+        "SELECT id FROM brand_deletion_log WHERE brand_id = ? AND status = 'running'", (brand_id,)
+    ).fetchone()
+    return row["id"] if row else None
+
+def _start_brand_cascade(conn, brand_id: int, deleted_at: datetime):
+    """軟刪除 Brand 並建立由本 worker 持有租約的 cascade 刪除記錄，回傳 (log_id, 是否此次才軟刪除)"""
+    brand = conn.execute(BRAND_DEPENDENCY_SQL, (brand_id,)).fetchone()
+    if not brand:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    running = _running_brand_cascade(conn, brand_id)
+    if running:
+        return running, False
+
+    # 以 deleted_at IS NULL 為條件軟刪除：同一 Brand 同時有兩個刪除請求時只有一個會更新到，
+    # 計數器與觸發器記錄只處理一次
+    if not brand["deleted_at"] and conn.execute(
+        "UPDATE brands SET deleted_at = ?, status = 'deleted' WHERE id = ? AND deleted_at IS NULL",
+        (deleted_at, brand_id)
+    ).rowcount == 1:
+        bump_counter(conn, "brand_count", -1)
+        # log_brand_deletion 觸發器已寫入含關聯資源數量的記錄，改為 cascade 並開始追蹤進度
+        log_id = conn.execute(
+            "SELECT MAX(id) FROM brand_deletion_log WHERE brand_id = ?", (brand_id,)
+        ).fetchone()[0]
+        conn.execute("""
+            UPDATE brand_deletion_log
+            SET deletion_type = 'cascade', status = 'running', progress = '{}', owner = ?, lease_expires_at = ?
+            WHERE id = ?
+        """, (BRAND_CASCADE_WORKER, _lease_deadline(), log_id))
+        return log_id, True
+
+    if not brand["deleted_at"]:
+        # 另一個請求已先軟刪除並開始 cascade 刪除
+        running = _running_brand_cascade(conn, brand_id)
+        if running:
+            return running, False
+
+    cursor = conn.execute("""
+        INSERT INTO brand_deletion_log
+            (brand_id, brand_name, deletion_type, status, progress, associated_resources, owner, lease_expires_at)
+        VALUES (?, ?, 'cascade', 'running', '{}', ?, ?, ?)
+    """, (brand_id, brand["name"], json.dumps({
+        "workspaces": brand["workspace_count"],
+        "bots": brand["bot_count"],
+        "agents": brand["agent_count"]
+    }), BRAND_CASCADE_WORKER, _lease_deadline()))
+    return cursor.lastrowid, False
+
+def _delete_brand_children_chunk(conn, log_id: int, brand_id: int, table: str, counter: str, key: str) -> int:
+    _renew_brand_cascade(conn, log_id)
+    cursor = conn.execute(
+        f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE brand_id = ? LIMIT ?)",
+        (brand_id, BRAND_CASCADE_CHUNK)
+    )
+    deleted = cursor.rowcount
+    if deleted:
+        bump_counter(conn, counter, -deleted)
+        conn.execute("""
+            UPDATE brand_deletion_log
+            SET progress = json_set(progress, '$.' || ?, COALESCE(json_extract(progress, '$.' || ?), 0) + ?)
+            WHERE id = ?
+        """, (key, key, deleted, log_id))
+    return deleted
+
+def _finish_brand_cascade(conn, log_id: int, brand_id: int):
+    _renew_brand_cascade(conn, log_id)
+    conn.execute("DELETE FROM brands WHERE id = ?", (brand_id,))
+    conn.execute(
+        "UPDATE brand_deletion_log SET status = 'completed', completed_at = CURRENT_TIMESTAMP, owner = NULL WHERE id = ?",
+        (log_id,)
+    )
+
+def _fail_brand_cascade(conn, log_id: int, error: str):
+    conn.execute(
+        "UPDATE brand_deletion_log SET status = 'failed', error = ?, owner = NULL WHERE id = ? AND owner = ?",
+        (error, log_id, BRAND_CASCADE_WORKER)
+    )
+
+_brand_cascade_tasks: Dict[int, asyncio.Task] = {}
+
+async def _run_brand_cascade(log_id: int, brand_id: int):
+    try:
+        if not await db.run(_claim_brand_cascade, log_id):
+            return
+        for table, counter, key in BRAND_CHILD_TABLES:
+            while True:
+                deleted = await db.run(_delete_brand_children_chunk, log_id, brand_id, table, counter, key)
+                if deleted:
+                    dashboard_counters.apply(counter, -deleted)
+                if deleted < BRAND_CASCADE_CHUNK:
+                    break
+                await asyncio.sleep(BRAND_CASCADE_PAUSE)
+        await db.run(_finish_brand_cascade, log_id, brand_id)
+    except asyncio.CancelledError:
+        # 關閉服務時中斷，記錄維持 running，由 stop_brand_cascades 釋放租約讓其他 worker 接手
+        raise
+    except BrandCascadeLeaseLost:
+        print(f"Brand cascade deletion {log_id} was taken over by another worker")
+    except Exception as e:
+        print(f"Brand cascade deletion {log_id} failed: {e}")
+        await db.run(_fail_brand_cascade, log_id, str(e))
+    finally:
+        _brand_cascade_tasks.pop(log_id, None)
+
+def _schedule_brand_cascade(log_id: int, brand_id: int):
+    task = _brand_cascade_tasks.get(log_id)
+    if task is None or task.done():
+        _brand_cascade_tasks[log_id] = asyncio.create_task(_run_brand_cascade(log_id, brand_id))
+
+async def _resume_brand_cascades():
+    """排程沒有持有者或租約已過期的 cascade；實際執行前仍以 _claim_brand_cascade 認領"""
+    rows = await db.fetchall("""
+        SELECT id, brand_id FROM brand_deletion_log
+        WHERE status = 'running' AND (owner IS NULL OR lease_expires_at IS NULL OR lease_expires_at < ?)
+    """, (datetime.utcnow(),))
+    for row in rows:
+        _schedule_brand_cascade(row["id"], row["brand_id"])
+
+async def _brand_cascade_lease_loop():
+    while True:
+        await asyncio.sleep(BRAND_CASCADE_LEASE)
+        try:
+            await _resume_brand_cascades()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Brand cascade resume failed: {e}")
+
+_brand_cascade_lease_task: Optional[asyncio.Task] = None
+
+@router.on_event("startup")
+async def resume_brand_cascades():
+    global _brand_cascade_lease_task
+    await _resume_brand_cascades()
+    _brand_cascade_lease_task = asyncio.create_task(_brand_cascade_lease_loop())
+    db.before_close(stop_brand_cascades)
+
+async def stop_brand_cascades():
+    tasks = list(_brand_cascade_tasks.values())
+    if _brand_cascade_lease_task is not None:
+        tasks.append(_brand_cascade_lease_task)
+    log_ids = list(_brand_cascade_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # 釋放租約，其他 worker 不必等到過期即可接手
+    if log_ids:
+        await db.run(_release_brand_cascades, log_ids)
+
 @router.delete("/{brand_id}")
-async def delete_brand(brand_id: int):
-    """刪除 Brand"""
+async def delete_brand(brand_id: int, cascade: bool = False):
+    """刪除 Brand；cascade=true 時軟刪除後在背景分批刪除關聯資源"""
+    if cascade:
+        log_id, soft_deleted = await db.run(_start_brand_cascade, brand_id, datetime.now())
+        if soft_deleted:
+            dashboard_counters.apply("brand_count", -1)
+            await brand_credentials.invalidate(brand_id)
+            await audit_log_writer.record(None, "cascade_delete", "brand", brand_id, new_values={"log_id": log_id})
+        _schedule_brand_cascade(log_id, brand_id)
+        return {
+            "message": "Brand deletion started",
+            "brand_id": brand_id,
+            "log_id": log_id,
+            "status": "running"
+        }
+
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
-        # 檢查 Brand 是否存在
-        cursor.execute("SELECT id, name FROM brands WHERE id = ?", (brand_id,))
-        brand = cursor.fetchone()
-        
-        if not brand:
-            raise HTTPException(status_code=404, detail="Brand not found")
-        
-        # 檢查是否有關聯資源（可選：軟刪除或強制刪除）
-        cursor.execute("SELECT COUNT(*) FROM brand_workspaces WHERE brand_id = ?", (brand_id,))
-        workspace_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM brand_bots WHERE brand_id = ?", (brand_id,))
-        bot_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM brand_agents WHERE brand_id = ?", (brand_id,))
-        agent_count = cursor.fetchone()[0]
-        
-        # 如果有關聯資源，可以選擇：
-        # 1. 拒絕刪除
-        # 2. 級聯刪除
-        # 3. 軟刪除（標記為已刪除）
-        
-        # 方案1：拒絕刪除（如果有關聯資源）
-        if workspace_count > 0 or bot_count > 0 or agent_count > 0:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Cannot delete brand with associated resources: {workspace_count} workspaces, {bot_count} bots, {agent_count} agents"
-            )
-        
-        # 方案2：級聯刪除（刪除所有關聯資源）
-        # cursor.execute("DELETE FROM brand_workspaces WHERE brand_id = ?", (brand_id,))
-        # cursor.execute("DELETE FROM brand_bots WHERE brand_id = ?", (brand_id,))
-        # cursor.execute("DELETE FROM brand_agents WHERE brand_id = ?", (brand_id,))
-        
-        # 刪除 Brand
-        cursor.execute("DELETE FROM brands WHERE id = ?", (brand_id,))
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Brand not found")
-        
-        conn.commit()
-        
+        brand = await db.run(_delete_brand, brand_id)
+        if not brand[2]:
+            dashboard_counters.apply("brand_count", -1)
+        await brand_credentials.invalidate(brand_id)
+        await audit_log_writer.record(None, "delete", "brand", brand_id, old_values={"name": brand[1]})
+
         return {
             "message": "Brand deleted successfully",
             "brand_id": brand_id,
             "brand_name": brand[1]
         }
-        
+
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+def _soft_delete_brand(conn, brand_id: int, deleted_at: datetime):
+    cursor = conn.cursor()
+
+    # 檢查 Brand 是否存在且未被刪除
+    cursor.execute("SELECT id, name, deleted_at FROM brands WHERE id = ?", (brand_id,))
+    brand = cursor.fetchone()
+
+    if not brand:
+        raise HTTPException(status_code=404, detail="Brand not found")
+
+    if brand[2]:  # deleted_at 不為空
+        raise HTTPException(status_code=400, detail="Brand already deleted")
+
+    # 軟刪除：設置 deleted_at 時間戳；條件含 deleted_at IS NULL，同時的重複請求只有一個會更新到
+    cursor.execute(
+        "UPDATE brands SET deleted_at = ?, status = 'deleted' WHERE id = ? AND deleted_at IS NULL",
+        (deleted_at, brand_id)
+    )
+    if cursor.rowcount != 1:
+        raise HTTPException(status_code=400, detail="Brand already deleted")
+    bump_counter(conn, "brand_count", -1)
+
+    return brand
 
 # 軟刪除版本（推薦用於生產環境）
 @router.put("/{brand_id}/soft-delete")
 async def soft_delete_brand(brand_id: int):
     """軟刪除 Brand（標記為已刪除，不實際刪除資料）"""
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
-        # 檢查 Brand 是否存在且未被刪除
-        cursor.execute("SELECT id, name, deleted_at FROM brands WHERE id = ?", (brand_id,))
-        brand = cursor.fetchone()
-        
-        if not brand:
-            raise HTTPException(status_code=404, detail="Brand not found")
-        
-        if brand[2]:  # deleted_at 不為空
-            raise HTTPException(status_code=400, detail="Brand already deleted")
-        
-        # 軟刪除：設置 deleted_at 時間戳
-        cursor.execute(
-            "UPDATE brands SET deleted_at = ?, status = 'deleted' WHERE id = ?",
-            (datetime.now(), brand_id)
+        deleted_at = datetime.now()
+        brand = await db.run(_soft_delete_brand, brand_id, deleted_at)
+        dashboard_counters.apply("brand_count", -1)
+        await brand_credentials.invalidate(brand_id)
+        await audit_log_writer.record(
+            None, "soft_delete", "brand", brand_id, new_values={"deleted_at": deleted_at.isoformat()}
         )
-        
-        conn.commit()
-        
+
         return {
             "message": "Brand soft deleted successfully",
             "brand_id": brand_id,
             "brand_name": brand[1],
-            "deleted_at": datetime.now().isoformat()
+            "deleted_at": deleted_at.isoformat()
         }
-        
+
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
\ No newline at end of file
+
+@router.get("/{brand_id}/deletion-status")
+async def get_brand_deletion_status(brand_id: int):
+    """最近一次刪除記錄與 cascade 進度"""
+    row = await db.fetchone("""
+        SELECT id, deletion_type, status, associated_resources, progress, error, deleted_at, completed_at
+        FROM brand_deletion_log WHERE brand_id = ? ORDER BY id DESC LIMIT 1
+    """, (brand_id,))
+    if row is None:
+        raise HTTPException(status_code=404, detail="No deletion record")
+    return {
+        "brand_id": brand_id,
+        "log_id": row["id"],
+        "deletion_type": row["deletion_type"],
+        "status": row["status"],
+        "associated_resources": json.loads(row["associated_resources"] or "{}"),
+        "progress": json.loads(row["progress"] or "{}"),
+        "error": row["error"],
+        "deleted_at": row["deleted_at"],
+        "completed_at": row["completed_at"]
+    }
@@ -0,0 +1,264 @@
+# Brand 資源增量同步（資料表見 docs/database/database-brand-sync.sql）
+# - 以 brand_credentials 的 api_url / token 透過共用連線池 upstream_pool 取得上游 Workspace / Bot / Agent 列表；
+#   回應含 total 時其餘分頁在 BRAND_SYNC_PAGE_CONCURRENCY 並發內同時取得
+# - 每列上游資料計算雜湊，與資料表中的 fingerprint 比對，只 upsert 新增或變動的列、刪除上游已不存在的列；
+#   任一種資源取得失敗時整個 Brand 不寫入，避免把缺漏的分頁當成刪除
+# - 每個 Brand 的同步結果與水位（上游最新的 updated_at）記錄在 brand_sync_state
+# - sync-all 在 BRAND_SYNC_CONCURRENCY 並發內同步所有未刪除的 Brand
+# 依賴 backend-brand-credentials.py 的 brand_credentials、backend-upstream-client.py 的 upstream_pool、backend-upstream-circuit-breaker.py 的 upstream_breakers、
+# backend-database.py 的 db、backend-dashboard-counters.py 的 bump_counter / dashboard_counters
+# 與 backend-audit-log.py 的 audit_log_writer
+
+import os
+import json
+import math
+import hashlib
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BRAND_SYNC_PAGE_SIZE = int(os.getenv("BRAND_SYNC_PAGE_SIZE", "100"))
+BRAND_SYNC_MAX_PAGES = int(os.getenv("BRAND_SYNC_MAX_PAGES", "1000"))
+BRAND_SYNC_PAGE_CONCURRENCY = int(os.getenv("BRAND_SYNC_PAGE_CONCURRENCY", "4"))
+BRAND_SYNC_CONCURRENCY = int(os.getenv("BRAND_SYNC_CONCURRENCY", "4"))
+BRAND_SYNC_DELETE_CHUNK = 500
+# (結果鍵, 資料表, 上游 id 欄位, 名稱欄位, 上游路徑, dashboard 計數器)
+BRAND_SYNC_RESOURCES = (
+    ("workspaces", "brand_workspaces", "workspace_id", "workspace_name",
+     os.getenv("BRAND_SYNC_WORKSPACES_PATH", "/api/v1/workspaces"), "workspace_count"),
+    ("bots", "brand_bots", "bot_id", "bot_name",
+     os.getenv("BRAND_SYNC_BOTS_PATH", "/api/v1/bots"), "bot_count"),
+    ("agents", "brand_agents", "agent_id", "agent_name",
+     os.getenv("BRAND_SYNC_AGENTS_PATH", "/api/v1/users"), "agent_count")
+)
+
+
+class BrandSyncError(Exception):
+    """上游回應無法用於同步"""
+
+
+def record_fingerprint(record: dict) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _sync_row(record: dict) -> Optional[tuple]:
+    """上游資料 → (上游 id, 名稱, 狀態, fingerprint)；沒有 id 的資料略過"""
+    external_id = record.get("id") or record.get("_id")
+    if external_id is None:
+        return None
+    status = record.get("status")
+    if status is None:
+        status = "active" if record.get("is_active", True) else "inactive"
+    return (
+        str(external_id),
+        record.get("name") or record.get("username"),
+        str(status),
+        record_fingerprint(record)
+    )
+
+
+async def _fetch_page(brand: dict, path: str, page: int) -> Tuple[List[dict], Optional[int]]:
+    response = await upstream_pool.get(
+        brand["id"], brand["api_url"], path, brand["token"],
+        params={"page": page, "limit": BRAND_SYNC_PAGE_SIZE}
+    )
+    if response.status_code != 200:
+        raise BrandSyncError(f"{path} page {page}: HTTP {response.status_code}")
+    body = response.json()
+    if isinstance(body, list):
+        return body, None
+    items = body.get("data", body.get("items"))
+    if not isinstance(items, list):
+        raise BrandSyncError(f"{path} page {page}: unexpected response")
+    return items, body.get("total")
+
+
+async def fetch_all_pages(brand: dict, path: str) -> List[dict]:
+    """取得所有分頁；超過 BRAND_SYNC_MAX_PAGES 或筆數少於 total 時拋出 BrandSyncError，
+    不完整的列表不能用來判斷哪些資源已被刪除"""
+    items, total = await _fetch_page(brand, path, 1)
+    records = list(items)
+    if total is not None:
+        pages = math.ceil(total / BRAND_SYNC_PAGE_SIZE)
+        if pages > BRAND_SYNC_MAX_PAGES:
+            raise BrandSyncError(f"{path}: {total} records exceed BRAND_SYNC_MAX_PAGES")
+        limit = asyncio.Semaphore(BRAND_SYNC_PAGE_CONCURRENCY)
+
+        async def fetch(page: int) -> List[dict]:
+            async with limit:
+                return (await _fetch_page(brand, path, page))[0]
+
+        for page_items in await asyncio.gather(*(fetch(page) for page in range(2, pages + 1))):
+            records.extend(page_items)
+        if len(records) < total:
+            raise BrandSyncError(f"{path}: received {len(records)} of {total} records")
+        return records
+
+    # 沒有 total 時依序取得，直到某頁不滿
+    page = 1
+    while len(items) >= BRAND_SYNC_PAGE_SIZE:
+        if page >= BRAND_SYNC_MAX_PAGES:
+            raise BrandSyncError(f"{path}: more than BRAND_SYNC_MAX_PAGES pages")
+        page += 1
+        items, _ = await _fetch_page(brand, path, page)
+        records.extend(items)
+    return records
+
+
+def apply_brand_sync(conn, brand_id: str, resources: Dict[str, Dict[str, tuple]], watermark: Optional[str]) -> dict:
+    """resources: {結果鍵: {上游 id: (上游 id, 名稱, 狀態, fingerprint)}}，在單一交易中寫入差異"""
+    stats = {}
+    for key, table, id_column, name_column, _, counter in BRAND_SYNC_RESOURCES:
+        incoming = resources[key]
+        stored = {
+            row[0]: row[1]
+            for row in conn.execute(f"SELECT {id_column}, fingerprint FROM {table} WHERE brand_id = ?", (brand_id,))
+        }
+        changed = [row for external_id, row in incoming.items() if stored.get(external_id) != row[3]]
+        inserted = sum(1 for row in changed if row[0] not in stored)
+        removed = [external_id for external_id in stored if external_id not in incoming]
+
+        conn.executemany(f"""
+            INSERT INTO {table} (brand_id, {id_column}, {name_column}, status, fingerprint)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (brand_id, {id_column}) DO UPDATE SET
+                {name_column} = excluded.{name_column},
+                status = excluded.status,
+                fingerprint = excluded.fingerprint,
+                updated_at = CURRENT_TIMESTAMP
+        """, [(brand_id, *row) for row in changed])
+        for i in range(0, len(removed), BRAND_SYNC_DELETE_CHUNK):
+            chunk = removed[i:i + BRAND_SYNC_DELETE_CHUNK]
+            conn.execute(
+                f"DELETE FROM {table} WHERE brand_id = ? AND {id_column} IN ({','.join('?' * len(chunk))})",
+                (brand_id, *chunk)
+            )
+        delta = inserted - len(removed)
+        if delta:
+            bump_counter(conn, counter, delta)
+
+        stats[key] = {
+            "total": len(incoming),
+            "inserted": inserted,
+            "updated": len(changed) - inserted,
+            "deleted": len(removed),
+            "unchanged": len(incoming) - len(changed),
+            "counter_delta": delta
+        }
+
+    conn.execute("""
+        INSERT INTO brand_sync_state (brand_id, status, synced_at, watermark, last_error, stats)
+        VALUES (?, 'success', ?, ?, NULL, ?)
+        ON CONFLICT (brand_id) DO UPDATE SET
+            status = 'success',
+            synced_at = excluded.synced_at,
+            watermark = COALESCE(excluded.watermark, brand_sync_state.watermark),
+            last_error = NULL,
+            stats = excluded.stats,
+            updated_at = CURRENT_TIMESTAMP
+    """, (brand_id, datetime.utcnow(), watermark, json.dumps(stats)))
+    return stats
+
+
+def _record_sync_failure(conn, brand_id: str, error: str):
+    conn.execute("""
+        INSERT INTO brand_sync_state (brand_id, status, last_error) VALUES (?, 'failed', ?)
+        ON CONFLICT (brand_id) DO UPDATE SET
+            status = 'failed', last_error = excluded.last_error, updated_at = CURRENT_TIMESTAMP
+    """, (brand_id, error))
+
+
+_brand_sync_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _brand_sync_lock(brand_id: str) -> asyncio.Lock:
+    lock = _brand_sync_locks.get(brand_id)
+    if lock is None:
+        lock = _brand_sync_locks[brand_id] = asyncio.Lock()
+    return lock
+
+
+async def sync_brand(brand: dict) -> dict:
+    """brand 為 brand_credentials.get() 的結果；同一 Brand 已在同步中時拋出 RuntimeError"""
+    brand_id = str(brand["id"])
+    lock = _brand_sync_lock(brand_id)
+    if lock.locked():
+        raise RuntimeError("Sync already running")
+    async with lock:
+        breaker = upstream_breakers.get(brand_id)
+        try:
+            if breaker is not None and not breaker.is_closed:
+                raise BrandSyncError(f"Upstream circuit {breaker.state}")
+            pages = await asyncio.gather(*(
+                fetch_all_pages(brand, resource[4]) for resource in BRAND_SYNC_RESOURCES
+            ))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            await db.run(_record_sync_failure, brand_id, error)
+            raise BrandSyncError(error)
+
+        resources = {}
+        watermark = None
+        for resource, records in zip(BRAND_SYNC_RESOURCES, pages):
+            rows = {}
+            for record in records:
+                row = _sync_row(record)
+                if row is not None:
+                    rows[row[0]] = row
+                updated_at = record.get("updated_at")
+                if updated_at and (watermark is None or str(updated_at) > watermark):
+                    watermark = str(updated_at)
+            resources[resource[0]] = rows
+
+        stats = await db.run(apply_brand_sync, brand_id, resources, watermark)
+        for key, _, _, _, _, counter in BRAND_SYNC_RESOURCES:
+            if stats[key]["counter_delta"]:
+                dashboard_counters.apply(counter, stats[key]["counter_delta"])
+        return {"brand_id": brand_id, "watermark": watermark, "resources": stats}
+
+
+async def sync_all_brands() -> dict:
+    brands = []
+    for brand_id in brand_credentials.brand_ids():
+        try:
+            brands.append(brand_credentials.get(brand_id))
+        except LookupError:
+            continue
+    limit = asyncio.Semaphore(BRAND_SYNC_CONCURRENCY)
+
+    async def sync(brand: dict):
+        async with limit:
+            return await sync_brand(brand)
+
+    results = await asyncio.gather(*(sync(brand) for brand in brands), return_exceptions=True)
+    synced, failed, skipped = {}, {}, []
+    for brand, result in zip(brands, results):
+        brand_id = str(brand["id"])
+        if isinstance(result, RuntimeError):
+            skipped.append(brand_id)
+        elif isinstance(result, Exception):
+            failed[brand_id] = str(result)
+        else:
+            synced[brand_id] = result["resources"]
+    return {"synced": synced, "failed": failed, "skipped": skipped}
+
+
+@app.post("/api/v1/brands/sync-all")
+async def sync_all_brand_resources(token_data: dict = Depends(verify_token)):
+    """在 BRAND_SYNC_CONCURRENCY 並發內同步所有 Brand，只寫入有變動的資源"""
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    result = await sync_all_brands()
+    await audit_log_writer.record(
+        token_data, "sync_all", "brand",
+        new_values={"synced": len(result["synced"]), "failed": len(result["failed"]), "skipped": len(result["skipped"])}
+    )
+    return {"synced_at": datetime.utcnow(), **result}
+
+
+@app.get("/api/v1/brands/{brand_id}/sync-status")
+async def get_brand_sync_status(brand_id: str, token_data: dict = Depends(verify_token)):
+    row = await db.fetchone("SELECT * FROM brand_sync_state WHERE brand_id = ?", (brand_id,))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Brand has not been synced")
+    return {**dict(row), "stats": json.loads(row["stats"]) if row["stats"] else None}
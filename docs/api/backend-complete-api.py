@@ -1,15 +1,28 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Optional
 import os
+import time
 from datetime import datetime, timedelta
 import jwt
-import httpx
 
 app = FastAPI(title="HRM Backend API", version="1.0.0")
 
+# 以下元件需與本檔一同載入：
+# - backend-auth-cache.py：JWT 金鑰與驗證快取
+# - backend-upstream-client.py：上游連線池 upstream_pool
+# - backend-upstream-circuit-breaker.py：各 Brand 上游斷路器與最後一次成功的快照
+# - backend-agent-status-cache.py：Agent 狀態快取 agent_status_cache
+# - backend-agent-status-stream.py：Agent 狀態 SSE 推送
+# - backend-agent-fleet-poller.py：背景輪詢所有 Brand / Workspace 的 Agent 狀態
+# - backend-agent-monitor-api.py：Agent Monitor 分類 API
+# - backend-dashboard-counters.py：Dashboard 計數器與 Agent 監控摘要
+# - backend-audit-log.py：審計日誌非同步批次寫入
+# - backend-brand-credentials.py：Brand 上游憑證快取 brand_credentials
+# - backend-brand-sync.py：Brand 資源增量同步
+
 # CORS 設定
 app.add_middleware(
     CORSMiddleware,
@@ -45,20 +58,22 @@ class Brand(BaseModel):
     token: str
     status: str = "active"
 
-# 權限驗證
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# 權限驗證（解碼結果快取與金鑰管理見 backend-auth-cache.py）
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    started = time.perf_counter()
+    ok = False
     try:
-        payload = jwt.decode(
-            credentials.credentials, 
-            os.getenv("JWT_SECRET_KEY", "your-secret-key"), 
-            algorithms=["HS256"]
-        )
+        payload = decode_token_cached(credentials.credentials)
+        ok = True
         return payload
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        auth_metrics.observe(elapsed_ms, ok)
 
 # 健康檢查
 @app.get("/health")
@@ -86,7 +101,7 @@ async def login(request: LoginRequest):
             "exp": datetime.utcnow() + timedelta(hours=24)
         }
         
-        token = jwt.encode(token_data, os.getenv("JWT_SECRET_KEY", "your-secret-key"), algorithm="HS256")
+        token = jwt.encode(token_data, jwt_keyring.signing_key, algorithm=JWT_ALGORITHM)
         
         return LoginResponse(
             user=user,
@@ -97,8 +112,8 @@ async def login(request: LoginRequest):
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 # Brand 管理 API
-@app.get("/api/v1/brands")
-async def get_brands(token_data: dict = Depends(verify_token)):
+async def load_brands():
+    """Brand 列表（供 API 與背景輪詢共用）"""
     return [
         {
             "id": "brand_1",
@@ -116,15 +131,22 @@ async def get_brands(token_data: dict = Depends(verify_token)):
         }
     ]
 
+@app.get("/api/v1/brands")
+async def get_brands(token_data: dict = Depends(verify_token)):
+    return await load_brands()
+
 @app.get("/api/v1/brands/{brand_id}/token")
 async def get_brand_token(brand_id: str, token_data: dict = Depends(verify_token)):
-    # TODO: 從資料庫查詢實際 token
+    try:
+        credential = brand_credentials.get(brand_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Brand not found")
     return {
-        "token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.example_token"
+        "token": credential["token"]
     }
 
-@app.get("/api/v1/brands/{brand_id}/workspaces")
-async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_token)):
+async def load_brand_workspaces(brand_id: str):
+    """Brand 下的 Workspace 列表（供 API 與背景輪詢共用）"""
     return [
         {
             "id": "workspace_1",
@@ -140,123 +162,69 @@ async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_
         }
     ]
 
+@app.get("/api/v1/brands/{brand_id}/workspaces")
+async def get_brand_workspaces(brand_id: str, token_data: dict = Depends(verify_token)):
+    return await load_brand_workspaces(brand_id)
+
 # Agent Status API
+async def fetch_agent_status(brand_id: str, workspace_id: str):
+    """調用外部 API 取得 Workspace 的 Agent 狀態"""
+    # 憑證快取，見 backend-brand-credentials.py；找不到 Brand 時拋出 LookupError
+    credential = brand_credentials.get(brand_id)
+    
+    # 共用連線池，見 backend-upstream-client.py
+    response = await upstream_pool.get(
+        brand_id,
+        credential["api_url"],
+        "/api/v1/users/status",
+        credential["token"],
+        params={"workspace_id": workspace_id}
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"External API error: {response.status_code}")
+    return response.json()
+
 @app.get("/api/v1/agent-status")
 async def get_agent_status(
+    response: Response,
     workspace_id: str = Query(...),
     brand_id: str = Query(...),
     token_data: dict = Depends(verify_token)
 ):
     """獲取指定 Workspace 的 Agent 狀態"""
     try:
-        # TODO: 從資料庫查詢實際 brand token
-        brand_token = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.example_token"
-        
-        # 調用外部 API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.cs-system-009.cxgenie.app/api/v1/users/status",
-                params={"workspace_id": workspace_id},
-                headers={
-                    "Authorization": f"Bearer {brand_token}",
-                    "Accept": "application/json"
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                # 外部 API 失敗時返回模擬數據
-                raise Exception(f"External API error: {response.status_code}")
-                
+        # 讀取背景輪詢快照（backend-agent-fleet-poller.py），
+        # 尚未輪詢到時再透過合併快取向上游取得（backend-agent-status-cache.py）
+        snapshot = await get_agent_snapshot(brand_id, workspace_id)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="External API unavailable",
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Brand not found")
     except Exception as e:
-        # 返回模擬數據
-        print(f"使用模擬數據，原因: {e}")
-        return [
-            {
-                "id": "agent_1",
-                "name": "Agent Alice",
-                "user_id": "user_1", 
-                "username": "alice",
-                "status": "Available",
-                "online": True,
-                "is_online": True,
-                "available": True,
-                "is_available": True,
-                "last_activity": "2024-01-15T10:30:00Z"
-            },
-            {
-                "id": "agent_2",
-                "name": "Agent Bob",
-                "user_id": "user_2",
-                "username": "bob", 
-                "status": "Busy",
-                "online": True,
-                "is_online": True,
-                "available": False,
-                "is_available": False,
-                "last_activity": "2024-01-15T10:25:00Z"
-            },
-            {
-                "id": "agent_3",
-                "name": "Agent Charlie",
-                "user_id": "user_3",
-                "username": "charlie",
-                "status": "Available", 
-                "online": False,
-                "is_online": False,
-                "available": True,
-                "is_available": True,
-                "last_activity": "2024-01-15T09:45:00Z"
-            },
-            {
-                "id": "agent_4",
-                "name": "Agent David",
-                "user_id": "user_4",
-                "username": "david",
-                "status": "Offline", 
-                "online": False,
-                "is_online": False,
-                "available": False,
-                "is_available": False,
-                "last_activity": "2024-01-15T08:30:00Z"
-            },
-            {
-                "id": "agent_5",
-                "name": "Agent Eve",
-                "user_id": "user_5",
-                "username": "eve",
-                "status": "Available", 
-                "online": True,
-                "is_online": True,
-                "available": True,
-                "is_available": True,
-                "last_activity": "2024-01-15T10:28:00Z"
-            }
-        ]
+        raise HTTPException(status_code=502, detail=f"External API error: {e}")
+
+    # 上游異常時回傳最後一次成功的快照，以標頭標示資料已過期
+    if snapshot["stale"]:
+        response.headers["X-Data-Stale"] = "true"
+        response.headers["X-Data-Age"] = str(int(snapshot["age"]))
+    return snapshot["agents"]
 
 # Dashboard API
 @app.get("/api/v1/dashboard/agent-monitor")
-async def get_agent_monitor(token_data: dict = Depends(verify_token)):
-    return {
-        "total_agents": 15,
-        "online_agents": 12,
-        "available_agents": 8,
-        "busy_agents": 4,
-        "offline_agents": 3,
-        "warning_agents": 2,
-        "last_updated": datetime.utcnow()
-    }
+async def get_agent_monitor(
+    warning_time: Optional[int] = Query(None, ge=0),
+    token_data: dict = Depends(verify_token)
+):
+    return agent_monitor_totals.summary(warning_time)
 
 @app.get("/api/v1/dashboard/stats")
 async def get_dashboard_stats(token_data: dict = Depends(verify_token)):
-    return {
-        "brand_count": 5,
-        "workspace_count": 12,
-        "bot_count": 8,
-        "agent_count": 24
-    }
+    return dashboard_counters.snapshot()
 
 # 其他必要的 API 端點
 @app.get("/api/v1/users/workspaces")
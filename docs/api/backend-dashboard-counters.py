@@ -0,0 +1,209 @@
+# Dashboard 計數器（資料表見 docs/database/database-dashboard-counters.sql）
+# - brand / workspace / bot / agent 數量存在 dashboard_counters，
+#   建立 / 刪除 / 軟刪除時以 bump_counter 在同一交易中增減，不必每次 COUNT(*)
+# - 各 worker 在記憶體保留一份，每 DASHBOARD_COUNTER_REFRESH_INTERVAL 秒從資料表讀回（只有 4 列），
+#   本 worker 的變動在交易提交後立即套用；讀取 /api/v1/dashboard/stats 只是字典查詢
+# - 校正工作啟動時執行一次，之後每 DASHBOARD_RECONCILE_INTERVAL 秒以 COUNT(*) 重新計算，有偏差時修正並記錄
+# - Agent 監控摘要由 backend-agent-fleet-poller.py 每次更新 Workspace 快照時增量維護；
+#   warning 取決於讀取當下的時間，各 Workspace 只保存排序後的最後活動時間，讀取時再以二分搜尋計算，
+#   上游斷路、快照暫停更新時 warning 數仍會隨時間增加
+# 依賴 backend-database.py 的 db 與 backend-agent-monitor-api.py 的 classify_agent / _activity_timestamp、
+# backend-agent-fleet-poller.py 的 agent_fleet_poller
+
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+DASHBOARD_COUNTER_REFRESH_INTERVAL = float(os.getenv("DASHBOARD_COUNTER_REFRESH_INTERVAL", "2"))
+DASHBOARD_RECONCILE_INTERVAL = float(os.getenv("DASHBOARD_RECONCILE_INTERVAL", "600"))
+# Agent 監控摘要判定 warning 的預設閒置分鐘數（可由 warning_time 參數覆寫）
+DASHBOARD_AGENT_WARNING_MINUTES = int(os.getenv("DASHBOARD_AGENT_WARNING_MINUTES", "10"))
+
+DASHBOARD_COUNTER_QUERIES = {
+    "brand_count": "SELECT COUNT(*) FROM brands WHERE deleted_at IS NULL",
+    "workspace_count": "SELECT COUNT(*) FROM brand_workspaces",
+    "bot_count": "SELECT COUNT(*) FROM brand_bots",
+    "agent_count": "SELECT COUNT(*) FROM brand_agents"
+}
+
+
+def bump_counter(conn, name: str, delta: int):
+    """在呼叫端的交易中增減計數；提交後再呼叫 dashboard_counters.apply 更新本 worker 的記憶體"""
+    conn.execute("""
+        UPDATE dashboard_counters SET value = value + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE name = ?
+    """, (delta, name))
+
+
+def _load_counters(conn) -> Dict[str, int]:
+    return {row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM dashboard_counters")}
+
+
+def reconcile_counters(conn) -> Dict[str, dict]:
+    """以 COUNT(*) 重新計算並修正資料表，回傳有偏差的計數器"""
+    stored = _load_counters(conn)
+    drift = {}
+    for name, sql in DASHBOARD_COUNTER_QUERIES.items():
+        actual = conn.execute(sql).fetchone()[0]
+        if stored.get(name) != actual:
+            drift[name] = {"stored": stored.get(name), "actual": actual}
+            conn.execute("""
+                INSERT INTO dashboard_counters (name, value) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+            """, (name, actual))
+    return drift
+
+
+class DashboardCounters:
+    def __init__(self):
+        self.values: Dict[str, int] = {name: 0 for name in DASHBOARD_COUNTER_QUERIES}
+        self.refreshed_at: Optional[float] = None
+        self.last_reconciled_at: Optional[datetime] = None
+        self.last_drift: Dict[str, dict] = {}
+
+    def apply(self, name: str, delta: int):
+        self.values[name] = self.values.get(name, 0) + delta
+
+    async def refresh(self):
+        self.values.update(await db.run(_load_counters))
+        self.refreshed_at = time.monotonic()
+
+    async def reconcile(self) -> Dict[str, dict]:
+        drift = await db.run(reconcile_counters)
+        if drift:
+            print(f"Dashboard counter drift corrected: {drift}")
+        self.last_drift = drift
+        self.last_reconciled_at = datetime.utcnow()
+        await self.refresh()
+        return drift
+
+    def snapshot(self) -> dict:
+        return dict(self.values)
+
+
+class AgentMonitorTotals:
+    """各 Workspace 的分類數量與全體合計；Workspace 快照更新時只扣掉舊值、加上新值。
+    warning 依讀取時間計算，各 Workspace 另外保存可服務 Agent 排序後的最後活動時間"""
+
+    FIELDS = ("total_agents", "online_agents", "available_agents", "busy_agents", "offline_agents", "warning_agents")
+
+    def __init__(self):
+        self._by_workspace: Dict[Tuple[str, str], Tuple[Tuple[int, ...], List[float]]] = {}
+        # 增量維護的合計：(總數, 離線, 忙碌, 可服務)
+        self.totals: List[int] = [0] * 4
+        self.updated_at: Optional[datetime] = None
+
+    @staticmethod
+    def _count(agents: List[dict]) -> Tuple[Tuple[int, ...], List[float]]:
+        offline = busy = 0
+        activity = []
+        for agent in agents:
+            bucket = classify_agent(agent, float("-inf"))
+            if bucket == OFFLINE:
+                offline += 1
+            elif bucket == ON_LINE:
+                busy += 1
+            else:
+                # 沒有最後活動時間的可服務 Agent 一律為 warning
+                last_activity = agent.get("last_activity")
+                timestamp = _activity_timestamp(last_activity) if last_activity else None
+                activity.append(timestamp if timestamp is not None else float("-inf"))
+        activity.sort()
+        return (len(agents), offline, busy, len(activity)), activity
+
+    def _add(self, counts: Tuple[int, ...], sign: int):
+        for i, value in enumerate(counts):
+            self.totals[i] += sign * value
+
+    def update(self, key: Tuple[str, str], agents: List[dict]):
+        counts, activity = self._count(agents)
+        previous = self._by_workspace.get(key)
+        if previous is not None:
+            self._add(previous[0], -1)
+        self._by_workspace[key] = (counts, activity)
+        self._add(counts, 1)
+        self.updated_at = datetime.utcnow()
+
+    def remove(self, key: Tuple[str, str]):
+        previous = self._by_workspace.pop(key, None)
+        if previous is not None:
+            self._add(previous[0], -1)
+
+    def reconcile(self, snapshots: Dict[Tuple[str, str], dict]) -> bool:
+        """以目前所有快照重新計算，回傳是否有偏差"""
+        before = list(self.totals)
+        self._by_workspace.clear()
+        self.totals = [0] * 4
+        for key, snapshot in snapshots.items():
+            counts, activity = self._count(snapshot["agents"])
+            self._by_workspace[key] = (counts, activity)
+            self._add(counts, 1)
+        return before != self.totals
+
+    def warning_count(self, warning_time: Optional[int] = None, now: Optional[float] = None) -> int:
+        minutes = DASHBOARD_AGENT_WARNING_MINUTES if warning_time is None else warning_time
+        cutoff = (now or time.time()) - minutes * 60
+        return sum(bisect_left(activity, cutoff) for _, activity in self._by_workspace.values())
+
+    def summary(self, warning_time: Optional[int] = None, now: Optional[float] = None) -> dict:
+        total, offline, busy, available = self.totals
+        warning = self.warning_count(warning_time, now)
+        return {
+            **dict(zip(self.FIELDS, (total, total - offline, available, busy, offline, warning))),
+            "last_updated": self.updated_at or datetime.utcnow()
+        }
+
+
+dashboard_counters = DashboardCounters()
+agent_monitor_totals = AgentMonitorTotals()
+
+
+async def _dashboard_counter_loop():
+    # 第一輪即校正，不依主機開機時間（time.monotonic 的起點）而定
+    last_reconcile: Optional[float] = None
+    while True:
+        try:
+            if last_reconcile is None or time.monotonic() - last_reconcile >= DASHBOARD_RECONCILE_INTERVAL:
+                await dashboard_counters.reconcile()
+                if agent_monitor_totals.reconcile(agent_fleet_poller.snapshots):
+                    print("Agent monitor totals drift corrected")
+                last_reconcile = time.monotonic()
+            else:
+                await dashboard_counters.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dashboard counter refresh failed: {e}")
+        await asyncio.sleep(DASHBOARD_COUNTER_REFRESH_INTERVAL)
+
+
+_dashboard_counter_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def start_dashboard_counters():
+    global _dashboard_counter_task
+    _dashboard_counter_task = asyncio.create_task(_dashboard_counter_loop())
+
+
+@app.on_event("shutdown")
+async def stop_dashboard_counters():
+    if _dashboard_counter_task is not None:
+        _dashboard_counter_task.cancel()
+        try:
+            await _dashboard_counter_task
+        except asyncio.CancelledError:
+            pass
+
+
+@app.post("/api/v1/dashboard/reconcile")
+async def reconcile_dashboard_counters(token_data: dict = Depends(verify_token)):
+    """立即以 COUNT(*) 校正計數器"""
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    drift = await dashboard_counters.reconcile()
+    agent_drift = agent_monitor_totals.reconcile(agent_fleet_poller.snapshots)
+    return {"drift": drift, "agent_monitor_drift": agent_drift, "counters": dashboard_counters.snapshot()}
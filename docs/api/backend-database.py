@@ -0,0 +1,132 @@
+# 共用 SQLite 資料庫模組
+# - 固定大小的連線池，WAL 模式並調整 synchronous / cache_size / mmap_size
+# - 阻塞的查詢在有上限的執行緒池中執行，不佔用 event loop
+# - 連線重複使用，sqlite3 的 statement cache 讓相同 SQL 不必重新編譯（prepared statement）
+# 所有 router 透過 db 存取資料庫，不再各自 sqlite3.connect("hrm.db")
+
+import os
+import queue
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Iterable, List, NamedTuple, Optional
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "hrm.db")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "4"))
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", "5000"))
+# cache_size 為負數時單位是 KiB
+DATABASE_CACHE_SIZE_KB = int(os.getenv("DATABASE_CACHE_SIZE_KB", "32768"))
+DATABASE_MMAP_SIZE = int(os.getenv("DATABASE_MMAP_SIZE", str(256 * 1024 * 1024)))
+DATABASE_STATEMENT_CACHE = int(os.getenv("DATABASE_STATEMENT_CACHE", "256"))
+
+
+class ExecuteResult(NamedTuple):
+    """execute 的結果；cursor 所屬的連線已歸還連線池，只回傳在執行緒中取得的值"""
+    rowcount: int
+    lastrowid: Optional[int]
+
+
+class Database:
+    """SQLite 連線池；每個執行緒一次借用一條連線，執行完即歸還"""
+
+    def __init__(self, path: str = DATABASE_PATH, pool_size: int = DATABASE_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._before_close: List[Callable[[], Awaitable[Any]]] = []
+
+    def before_close(self, callback: Callable[[], Awaitable[Any]]):
+        """註冊在關閉連線池前執行的 coroutine（例如把寫入緩衝區的資料寫完）"""
+        self._before_close.append(callback)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=DATABASE_STATEMENT_CACHE
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{DATABASE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {DATABASE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout = {DATABASE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def open(self):
+        if self._executor is not None:
+            return
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+        # 執行緒數與連線數相同，借用連線時不會等待
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+
+    async def shutdown(self):
+        """先執行 before_close 註冊的收尾工作再關閉；各模組 shutdown hook 的順序不固定，
+        需要寫入資料庫的收尾工作不能各自在 shutdown hook 中執行"""
+        for callback in self._before_close:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"Database shutdown callback failed: {e}")
+        # 等待執行中的查詢結束會阻塞，不在 event loop 執行緒中進行
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _run_sync(self, func: Callable[..., Any], *args) -> Any:
+        conn = self._pool.get()
+        try:
+            result = func(conn, *args)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """在執行緒池中執行 func(conn, *args)，成功時 commit，例外時 rollback"""
+        if self._executor is None:
+            self.open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self._run_sync, func, *args))
+
+    async def fetchone(self, sql: str, params: Iterable = ()) -> Optional[sqlite3.Row]:
+        return await self.run(lambda conn: conn.execute(sql, tuple(params)).fetchone())
+
+    async def fetchall(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        return await self.run(lambda conn: conn.execute(sql, tuple(params)).fetchall())
+
+    async def execute(self, sql: str, params: Iterable = ()) -> ExecuteResult:
+        def _execute(conn):
+            cursor = conn.execute(sql, tuple(params))
+            return ExecuteResult(cursor.rowcount, cursor.lastrowid)
+
+        return await self.run(_execute)
+
+    async def executemany(self, sql: str, rows: Iterable[Iterable]) -> int:
+        return await self.run(lambda conn: conn.executemany(sql, rows).rowcount)
+
+
+db = Database()
+
+
+@app.on_event("startup")
+async def open_database():
+    db.open()
+
+
+@app.on_event("shutdown")
+async def close_database():
+    await db.shutdown()
@@ -0,0 +1,375 @@
+# 請假餘額帳本（資料表見 docs/database/database-leave-balance.sql）
+# - 請假申請每次狀態變更（送出 / 核准 / 駁回 / 取消）在同一交易中寫入一列帳本，
+#   並累加 leave_balances 中 (使用者, 假別, 年度) 的 used_days / pending_days
+# - 查詢餘額只讀 leave_balances，團隊餘額一次查詢，成本與人數成正比而非與請假筆數成正比
+# - rebuild_leave_balances 從 leave_requests 重新計算並比對帳本與彙總表，可只驗證或寫入修正
+# 依賴 backend-main.py 的 LeaveRequest、backend-database.py 的 db、backend-schedule-batch-api.py 的 to_utc_naive
+# 與 backend-audit-log.py 的 audit_log_writer
+
+import os
+import json
+import uuid
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from pydantic import BaseModel
+
+LEAVE_BALANCE_VERIFY_INTERVAL = int(os.getenv("LEAVE_BALANCE_VERIFY_INTERVAL", "3600"))
+LEAVE_HALF_DAY_MAX_HOURS = 4
+
+# 各狀態計入 (used_days, pending_days) 的倍數
+LEAVE_STATUS_EFFECT = {"pending": (0, 1), "approved": (1, 0)}
+# 目標狀態 → 允許的原狀態
+LEAVE_TRANSITIONS = {
+    "approved": ("pending",),
+    "rejected": ("pending",),
+    "cancelled": ("pending", "approved")
+}
+LEAVE_MANAGER_ROLES = ("Owner", "Admin", "TeamLeader")
+LEAVE_AUDIT_ACTIONS = {"approved": "approve", "rejected": "reject", "cancelled": "cancel"}
+
+
+class LeaveDecision(BaseModel):
+    reason: Optional[str] = None
+
+
+def leave_year(start_at, tz_name: Optional[str]) -> int:
+    """請假計入的年度：開始時間在申請時區的年份（跨年的請假整筆計入開始年度）"""
+    value = datetime.fromisoformat(str(start_at))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(ZoneInfo(tz_name or "Asia/Taipei")).year
+
+
+def estimate_leave_days(start_at: datetime, end_at: datetime, tz_name: str, allow_half_day: bool = True) -> float:
+    """以申請時區的日曆天計算天數；假別允許半天時，同一天且不超過 4 小時視為半天"""
+    tz = ZoneInfo(tz_name)
+    start = start_at.astimezone(tz) if start_at.tzinfo else start_at.replace(tzinfo=timezone.utc).astimezone(tz)
+    end = end_at.astimezone(tz) if end_at.tzinfo else end_at.replace(tzinfo=timezone.utc).astimezone(tz)
+    if start.date() == end.date() and end - start <= timedelta(hours=LEAVE_HALF_DAY_MAX_HOURS):
+        return 0.5 if allow_half_day else 1.0
+    # 結束於午夜時不算入當天
+    last_day = (end - timedelta(microseconds=1)).date()
+    return float((last_day - start.date()).days + 1)
+
+
+def _apply_balance_delta(
+    conn,
+    key: Tuple[str, str, int],
+    request_id: Optional[str],
+    from_status: Optional[str],
+    to_status: str,
+    used_delta: float,
+    pending_delta: float,
+    actor: Optional[str]
+):
+    user_id, leave_type_id, year = key
+    cursor = conn.execute("""
+        INSERT INTO leave_balance_ledger
+            (user_id, leave_type_id, year, request_id, from_status, to_status, used_delta, pending_delta, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, leave_type_id, year, request_id, from_status, to_status, used_delta, pending_delta, actor))
+    conn.execute("""
+        INSERT INTO leave_balances (user_id, leave_type_id, year, used_days, pending_days, last_ledger_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, leave_type_id, year) DO UPDATE SET
+            used_days = used_days + excluded.used_days,
+            pending_days = pending_days + excluded.pending_days,
+            last_ledger_id = excluded.last_ledger_id,
+            updated_at = CURRENT_TIMESTAMP
+    """, (user_id, leave_type_id, year, used_delta, pending_delta, cursor.lastrowid))
+
+
+def record_leave_transition(conn, request, from_status: Optional[str], to_status: str, actor: Optional[str]):
+    """request 需有 id / applicant_id / type_id / timezone / start_at / days；由呼叫端的交易一併提交"""
+    used_from, pending_from = LEAVE_STATUS_EFFECT.get(from_status, (0, 0))
+    used_to, pending_to = LEAVE_STATUS_EFFECT.get(to_status, (0, 0))
+    days = float(request["days"])
+    used_delta = days * (used_to - used_from)
+    pending_delta = days * (pending_to - pending_from)
+    if not used_delta and not pending_delta:
+        return
+    key = (request["applicant_id"], request["type_id"], leave_year(request["start_at"], request["timezone"]))
+    _apply_balance_delta(conn, key, request["id"], from_status, to_status, used_delta, pending_delta, actor)
+
+
+def insert_leave_request(conn, request: LeaveRequest, applicant_id: str, days: float) -> dict:
+    record = {
+        "id": request.id or str(uuid.uuid4()),
+        "applicant_id": applicant_id,
+        "type_id": request.type_id,
+        "timezone": request.timezone,
+        "start_at": to_utc_naive(request.start_at).isoformat(sep=" "),
+        "end_at": to_utc_naive(request.end_at).isoformat(sep=" "),
+        "days": days
+    }
+    conn.execute("""
+        INSERT INTO leave_requests (id, applicant_id, type_id, timezone, start_at, end_at, days, reason, attachment_urls, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending')
+    """, (
+        record["id"], applicant_id, request.type_id, request.timezone, record["start_at"], record["end_at"],
+        days, request.reason, json.dumps(request.attachment_urls)
+    ))
+    record_leave_transition(conn, record, None, "pending", applicant_id)
+    return record
+
+
+def transition_leave_request(
+    conn,
+    request_id: str,
+    to_status: str,
+    actor: Optional[str],
+    reason: Optional[str] = None
+) -> dict:
+    request = conn.execute("""
+        SELECT id, applicant_id, type_id, timezone, start_at, days, status
+        FROM leave_requests WHERE id = ?
+    """, (request_id,)).fetchone()
+    if request is None:
+        raise LookupError("Leave request not found")
+    from_status = request["status"]
+    if from_status not in LEAVE_TRANSITIONS[to_status]:
+        raise ValueError(f"Cannot change leave request from {from_status} to {to_status}")
+
+    # 以原狀態為條件更新，避免兩個審核者同時處理造成帳本重複計算
+    cursor = conn.execute("""
+        UPDATE leave_requests
+        SET status = ?, reject_reason = COALESCE(?, reject_reason), updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+    """, (to_status, reason, request_id, from_status))
+    if cursor.rowcount == 0:
+        raise ValueError("Leave request was modified concurrently")
+
+    record_leave_transition(conn, request, from_status, to_status, actor)
+    return {"id": request_id, "status": to_status, "previous_status": from_status}
+
+
+def load_leave_balances(
+    conn,
+    year: int,
+    user_ids: Optional[List[str]] = None,
+    team_id: Optional[str] = None
+) -> Dict[str, dict]:
+    """回傳 {user_id: {"name", "balances": {假別代碼: {...}}}}；使用者 × 假別一次查詢"""
+    where = ["u.is_active = 1", "lt.is_active = 1"]
+    params: list = [year]
+    if user_ids is not None:
+        where.append(f"u.id IN ({','.join('?' * len(user_ids))})")
+        params.extend(user_ids)
+    if team_id is not None:
+        where.append("u.team_id = ?")
+        params.append(team_id)
+
+    rows = conn.execute(f"""
+        SELECT u.id AS user_id, u.name AS user_name, lt.id AS leave_type_id, lt.code, lt.name, lt.quota,
+               COALESCE(b.used_days, 0) AS used_days, COALESCE(b.pending_days, 0) AS pending_days
+        FROM users u
+        CROSS JOIN leave_types lt
+        LEFT JOIN leave_balances b
+               ON b.user_id = u.id AND b.leave_type_id = lt.id AND b.year = ?
+        WHERE {' AND '.join(where)}
+        ORDER BY u.name, lt.code
+    """, params).fetchall()
+
+    result: Dict[str, dict] = {}
+    for row in rows:
+        member = result.setdefault(row["user_id"], {"name": row["user_name"], "balances": {}})
+        used = round(float(row["used_days"]), 1)
+        pending = round(float(row["pending_days"]), 1)
+        member["balances"][row["code"]] = {
+            "leave_type_id": row["leave_type_id"],
+            "name": row["name"],
+            "total": row["quota"],
+            "used": used,
+            "pending": pending,
+            "remaining": round(row["quota"] - used - pending, 1)
+        }
+    return result
+
+
+def rebuild_leave_balances(conn, year: int, verify_only: bool = True, actor: Optional[str] = None) -> dict:
+    """由 leave_requests 重新計算指定年度，與帳本加總及彙總表比對；
+    verify_only=False 時寫入 'adjust' 帳本列並把彙總表改為正確值"""
+    # 以 UTC 儲存的開始時間前後各放寬一天，再依申請時區精確判斷年度
+    range_start = datetime(year, 1, 1) - timedelta(days=1)
+    range_end = datetime(year + 1, 1, 1) + timedelta(days=1)
+    expected = defaultdict(lambda: [0.0, 0.0])
+    for row in conn.execute("""
+        SELECT applicant_id, type_id, timezone, start_at, days, status FROM leave_requests
+        WHERE status IN ('pending', 'approved') AND start_at >= ? AND start_at < ?
+    """, (range_start.isoformat(sep=" "), range_end.isoformat(sep=" "))):
+        if leave_year(row["start_at"], row["timezone"]) != year:
+            continue
+        used, pending = LEAVE_STATUS_EFFECT[row["status"]]
+        totals = expected[(row["applicant_id"], row["type_id"], year)]
+        totals[0] += float(row["days"]) * used
+        totals[1] += float(row["days"]) * pending
+
+    ledger = {
+        (row[0], row[1], year): (float(row[2]), float(row[3]))
+        for row in conn.execute("""
+            SELECT user_id, leave_type_id, SUM(used_delta), SUM(pending_delta)
+            FROM leave_balance_ledger WHERE year = ? GROUP BY user_id, leave_type_id
+        """, (year,))
+    }
+    balances = {
+        (row[0], row[1], year): (float(row[2]), float(row[3]))
+        for row in conn.execute("""
+            SELECT user_id, leave_type_id, used_days, pending_days FROM leave_balances WHERE year = ?
+        """, (year,))
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(ledger) | set(balances)):
+        want = tuple(round(v, 1) for v in expected.get(key, (0.0, 0.0)))
+        in_ledger = tuple(round(v, 1) for v in ledger.get(key, (0.0, 0.0)))
+        in_balance = tuple(round(v, 1) for v in balances.get(key, (0.0, 0.0)))
+        if want == in_ledger == in_balance:
+            continue
+        mismatches.append({
+            "user_id": key[0],
+            "leave_type_id": key[1],
+            "expected": {"used": want[0], "pending": want[1]},
+            "ledger": {"used": in_ledger[0], "pending": in_ledger[1]},
+            "balance": {"used": in_balance[0], "pending": in_balance[1]}
+        })
+        if verify_only:
+            continue
+        if want != in_ledger:
+            cursor = conn.execute("""
+                INSERT INTO leave_balance_ledger
+                    (user_id, leave_type_id, year, to_status, used_delta, pending_delta, created_by)
+                VALUES (?, ?, ?, 'adjust', ?, ?, ?)
+            """, (*key, want[0] - in_ledger[0], want[1] - in_ledger[1], actor))
+            last_ledger_id = cursor.lastrowid
+        else:
+            last_ledger_id = None
+        conn.execute("""
+            INSERT INTO leave_balances (user_id, leave_type_id, year, used_days, pending_days, last_ledger_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, leave_type_id, year) DO UPDATE SET
+                used_days = excluded.used_days,
+                pending_days = excluded.pending_days,
+                last_ledger_id = COALESCE(excluded.last_ledger_id, last_ledger_id),
+                updated_at = CURRENT_TIMESTAMP
+        """, (*key, want[0], want[1], last_ledger_id))
+
+    return {
+        "year": year,
+        "checked": len(set(expected) | set(ledger) | set(balances)),
+        "mismatch_count": len(mismatches),
+        "mismatches": mismatches,
+        "repaired": not verify_only and bool(mismatches)
+    }
+
+
+async def _decide_leave_request(request_id: str, to_status: str, token_data: dict, reason: Optional[str] = None):
+    try:
+        result = await db.run(transition_leave_request, request_id, to_status, token_data.get("user_id"), reason)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await audit_log_writer.record(
+        token_data, LEAVE_AUDIT_ACTIONS[to_status], "leave_request", request_id,
+        new_values={"status": to_status, "reason": reason}
+    )
+    return result
+
+
+@app.post("/api/v1/leave-requests/{request_id}/approve")
+async def approve_leave_request(request_id: str, token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in LEAVE_MANAGER_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return await _decide_leave_request(request_id, "approved", token_data)
+
+
+@app.post("/api/v1/leave-requests/{request_id}/reject")
+async def reject_leave_request(
+    request_id: str,
+    decision: LeaveDecision,
+    token_data: dict = Depends(verify_token)
+):
+    if token_data.get("role") not in LEAVE_MANAGER_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return await _decide_leave_request(request_id, "rejected", token_data, decision.reason)
+
+
+@app.post("/api/v1/leave-requests/{request_id}/cancel")
+async def cancel_leave_request(request_id: str, token_data: dict = Depends(verify_token)):
+    """申請人或管理者取消；已核准的請假取消後退回已用天數"""
+    if token_data.get("role") not in LEAVE_MANAGER_ROLES:
+        applicant = await db.fetchone("SELECT applicant_id FROM leave_requests WHERE id = ?", (request_id,))
+        if applicant is None or applicant["applicant_id"] != token_data.get("user_id"):
+            raise HTTPException(status_code=403, detail="Permission denied")
+    return await _decide_leave_request(request_id, "cancelled", token_data)
+
+
+@app.get("/api/v1/teams/{team_id}/leave-balances")
+async def get_team_leave_balances(
+    team_id: str,
+    year: int = None,
+    token_data: dict = Depends(verify_token)
+):
+    """整個團隊的請假餘額（一次查詢）"""
+    if token_data.get("role") not in (*LEAVE_MANAGER_ROLES, "Auditor"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    year = year or datetime.now().year
+    members = await db.run(load_leave_balances, year, None, team_id)
+    return {
+        "team_id": team_id,
+        "year": year,
+        "members": [{"user_id": user_id, **member} for user_id, member in members.items()]
+    }
+
+
+@app.post("/api/v1/leave-balances/rebuild")
+async def rebuild_leave_balance_ledger(
+    year: int = None,
+    verify_only: bool = True,
+    token_data: dict = Depends(verify_token)
+):
+    """比對（verify_only=true）或重建指定年度的請假餘額"""
+    if token_data.get("role") not in ("Owner", "Admin"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return await db.run(
+        rebuild_leave_balances,
+        year or datetime.now().year,
+        verify_only,
+        token_data.get("user_id")
+    )
+
+
+async def _verify_leave_balances_loop():
+    while True:
+        await asyncio.sleep(LEAVE_BALANCE_VERIFY_INTERVAL)
+        try:
+            result = await db.run(rebuild_leave_balances, datetime.now().year, True)
+            if result["mismatch_count"]:
+                print(f"Leave balance mismatch: {result['mismatch_count']} entries in {result['year']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Leave balance verification failed: {e}")
+
+
+_leave_balance_verify_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def start_leave_balance_verification():
+    global _leave_balance_verify_task
+    if LEAVE_BALANCE_VERIFY_INTERVAL > 0:
+        _leave_balance_verify_task = asyncio.create_task(_verify_leave_balances_loop())
+
+
+@app.on_event("shutdown")
+async def stop_leave_balance_verification():
+    if _leave_balance_verify_task is not None:
+        _leave_balance_verify_task.cancel()
+        try:
+            await _leave_balance_verify_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,227 @@
+# 請假與排班的衝突檢查
+# - 只讀取與請假時段重疊的排班：user_id + date 範圍走 idx_user_date，再以 start_at / end_at 過濾，
+#   排班與班別模板在同一查詢中取得
+# - 每個受影響的班別扣除休息時間後計算請假佔比；假別允許半天且未超過班別一半時計 0.5 天
+# - 沒有任何排班的期間（例如未排班的內勤人員）退回以日曆天計算，同樣依假別是否允許半天
+# - revalidate_pending_leave_requests 在匯入排班後重新計算所有 pending 申請的天數並更新帳本
+# 依賴 backend-leave-balance.py（帳本）、backend-shift-expansion.py（休息時段）與 backend-database.py 的 db
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+LEAVE_REVALIDATE_USER_CHUNK = 500
+
+_SHIFT_COLUMNS = """
+    sa.id AS assignment_id, sa.user_id, sa.date, sa.start_at AS shift_start, sa.end_at AS shift_end,
+    st.id, st.name, st.timezone, st.start_time, st.end_time, st.is_cross_day, st.breaks
+"""
+
+
+def _overlap(start: datetime, end: datetime, other_start: datetime, other_end: datetime) -> timedelta:
+    return max(timedelta(0), min(end, other_end) - max(start, other_start))
+
+
+def _local_date(value: datetime, tz_name: str) -> date:
+    return value.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name)).date()
+
+
+def _shift_from_row(row, templates: Dict[str, dict]) -> tuple:
+    """(開始, 結束, 排班 ID, 日期, 休息時段)，時間皆為 UTC"""
+    template = templates.get(row["id"])
+    if template is None:
+        template = templates[row["id"]] = shift_template_from_row(row)
+    day = date.fromisoformat(str(row["date"]))
+    return (
+        to_utc_naive(datetime.fromisoformat(str(row["shift_start"]))),
+        to_utc_naive(datetime.fromisoformat(str(row["shift_end"]))),
+        row["assignment_id"],
+        day,
+        shift_expansions.expand(template, day).breaks
+    )
+
+
+def affected_shifts(leave_start: datetime, leave_end: datetime, shifts: List[tuple], allow_half_day: bool) -> List[dict]:
+    """shifts 需依開始時間排序且彼此不重疊（排班衝突檢測保證）"""
+    ends = [shift[1] for shift in shifts]
+    result = []
+    for start, end, assignment_id, day, breaks in shifts[bisect_right(ends, leave_start):]:
+        if start >= leave_end:
+            break
+        working = end - start
+        overlap = _overlap(leave_start, leave_end, start, end)
+        for break_start, break_end in breaks:
+            working -= _overlap(start, end, break_start, break_end)
+            overlap -= _overlap(leave_start, leave_end, max(start, break_start), min(end, break_end))
+        if overlap <= timedelta(0):
+            # 只請了休息時間
+            continue
+        half = allow_half_day and overlap * 2 <= working
+        result.append({
+            "assignment_id": assignment_id,
+            "date": day.isoformat(),
+            "start_at": start.isoformat(),
+            "end_at": end.isoformat(),
+            "leave_minutes": int(overlap.total_seconds() // 60),
+            "days": 0.5 if half else 1.0
+        })
+    return result
+
+
+def _leave_days(leave_start, leave_end, tz_name, shifts, allow_half_day) -> Tuple[float, List[dict]]:
+    affected = affected_shifts(leave_start, leave_end, shifts, allow_half_day)
+    if not affected:
+        return estimate_leave_days(leave_start, leave_end, tz_name, allow_half_day), affected
+    return sum(item["days"] for item in affected), affected
+
+
+def create_leave_request_checked(conn, request: LeaveRequest, applicant_id: str) -> dict:
+    """檢查重疊的請假、受影響的排班與餘額，通過後寫入；失敗時回傳 {"error": {...}}"""
+    try:
+        ZoneInfo(request.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return {"error": {"error": "invalid_timezone", "detail": f"Unknown timezone: {request.timezone}"}}
+    leave_start = to_utc_naive(request.start_at)
+    leave_end = to_utc_naive(request.end_at)
+
+    leave_type = conn.execute("""
+        SELECT lt.id, lt.quota, lt.allow_half_day, COALESCE(b.used_days, 0) AS used_days,
+               COALESCE(b.pending_days, 0) AS pending_days
+        FROM leave_types lt
+        LEFT JOIN leave_balances b ON b.leave_type_id = lt.id AND b.user_id = ? AND b.year = ?
+        WHERE lt.id = ? AND lt.is_active = 1
+    """, (applicant_id, leave_year(leave_start, request.timezone), request.type_id)).fetchone()
+    if leave_type is None:
+        return {"error": {"error": "invalid_leave_type", "detail": f"Leave type not found: {request.type_id}"}}
+
+    overlapping = conn.execute("""
+        SELECT id FROM leave_requests
+        WHERE applicant_id = ? AND status IN ('pending', 'approved') AND start_at < ? AND end_at > ?
+        LIMIT 1
+    """, (applicant_id, leave_end.isoformat(sep=" "), leave_start.isoformat(sep=" "))).fetchone()
+    if overlapping:
+        return {"error": {"error": "overlapping_leave", "conflicts_with": overlapping["id"]}}
+
+    # 前一天的跨日班也可能與請假重疊
+    templates: Dict[str, dict] = {}
+    shifts = [_shift_from_row(row, templates) for row in conn.execute(f"""
+        SELECT {_SHIFT_COLUMNS}
+        FROM schedule_assignments sa
+        JOIN shift_templates st ON st.id = sa.shift_template_id
+        WHERE sa.user_id = ? AND sa.date BETWEEN ? AND ? AND sa.status != 'cancelled'
+          AND sa.start_at < ? AND sa.end_at > ?
+        ORDER BY sa.start_at
+    """, (
+        applicant_id,
+        (_local_date(leave_start, request.timezone) - timedelta(days=1)).isoformat(),
+        _local_date(leave_end, request.timezone).isoformat(),
+        leave_end.isoformat(sep=" "),
+        leave_start.isoformat(sep=" ")
+    ))]
+    days, affected = _leave_days(leave_start, leave_end, request.timezone, shifts, bool(leave_type["allow_half_day"]))
+
+    remaining = leave_type["quota"] - float(leave_type["used_days"]) - float(leave_type["pending_days"])
+    if days > remaining:
+        return {"error": {
+            "error": "insufficient_balance",
+            "days": days,
+            "remaining": round(remaining, 1),
+            "affected_shifts": affected
+        }}
+
+    record = insert_leave_request(conn, request, applicant_id, days)
+    return {"id": record["id"], "days": days, "affected_shifts": affected}
+
+
+def revalidate_pending_leave_requests(
+    conn,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    actor: Optional[str] = None
+) -> dict:
+    """重新計算 pending 申請的天數（例如匯入排班後），天數變動時更新申請並寫入帳本差額"""
+    where = ["status = 'pending'"]
+    params: list = []
+    # 申請以 UTC 儲存，日期範圍前後各放寬一天涵蓋時區差
+    if from_date:
+        where.append("end_at > ?")
+        params.append((date.fromisoformat(from_date) - timedelta(days=1)).isoformat())
+    if to_date:
+        where.append("start_at < ?")
+        params.append((date.fromisoformat(to_date) + timedelta(days=2)).isoformat())
+    requests = conn.execute(f"""
+        SELECT id, applicant_id, type_id, timezone, start_at, end_at, days
+        FROM leave_requests WHERE {' AND '.join(where)}
+    """, params).fetchall()
+    if not requests:
+        return {"checked": 0, "changed": 0, "without_shifts": 0, "changes": []}
+
+    half_day = {row[0]: bool(row[1]) for row in conn.execute("SELECT id, allow_half_day FROM leave_types")}
+    parsed = []
+    for row in requests:
+        start = datetime.fromisoformat(str(row["start_at"]))
+        end = datetime.fromisoformat(str(row["end_at"]))
+        parsed.append((row, start, end))
+    range_from = (min(start for _, start, _ in parsed).date() - timedelta(days=2)).isoformat()
+    range_to = (max(end for _, _, end in parsed).date() + timedelta(days=1)).isoformat()
+
+    # 每批使用者一次查詢所有相關排班，依使用者分組後以二分搜尋對應各申請
+    user_ids = sorted({row["applicant_id"] for row, _, _ in parsed})
+    templates: Dict[str, dict] = {}
+    shifts_by_user = defaultdict(list)
+    for i in range(0, len(user_ids), LEAVE_REVALIDATE_USER_CHUNK):
+        chunk = user_ids[i:i + LEAVE_REVALIDATE_USER_CHUNK]
+        for row in conn.execute(f"""
+            SELECT {_SHIFT_COLUMNS}
+            FROM schedule_assignments sa
+            JOIN shift_templates st ON st.id = sa.shift_template_id
+            WHERE sa.user_id IN ({','.join('?' * len(chunk))})
+              AND sa.date BETWEEN ? AND ? AND sa.status != 'cancelled'
+            ORDER BY sa.user_id, sa.start_at
+        """, (*chunk, range_from, range_to)):
+            shifts_by_user[row["user_id"]].append(_shift_from_row(row, templates))
+
+    changes = []
+    without_shifts = 0
+    for row, start, end in parsed:
+        days, affected = _leave_days(
+            start, end, row["timezone"] or "Asia/Taipei",
+            shifts_by_user.get(row["applicant_id"], []),
+            half_day.get(row["type_id"], False)
+        )
+        if not affected:
+            without_shifts += 1
+        previous = float(row["days"])
+        if days == previous:
+            continue
+        conn.execute("UPDATE leave_requests SET days = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (days, row["id"]))
+        key = (row["applicant_id"], row["type_id"], leave_year(row["start_at"], row["timezone"]))
+        _apply_balance_delta(conn, key, row["id"], "pending", "pending", 0, days - previous, actor)
+        changes.append({
+            "id": row["id"],
+            "applicant_id": row["applicant_id"],
+            "days_before": previous,
+            "days_after": days,
+            "affected_shifts": len(affected)
+        })
+
+    return {
+        "checked": len(parsed),
+        "changed": len(changes),
+        "without_shifts": without_shifts,
+        "changes": changes
+    }
+
+
+@app.post("/api/v1/leave-requests/revalidate")
+async def revalidate_leave_requests(
+    from_date: str = None,
+    to_date: str = None,
+    token_data: dict = Depends(verify_token)
+):
+    """依目前排班重新計算所有 pending 請假申請的天數"""
+    if token_data.get("role") not in LEAVE_MANAGER_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return await db.run(revalidate_pending_leave_requests, from_date, to_date, token_data.get("user_id"))
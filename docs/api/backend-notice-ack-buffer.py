@@ -0,0 +1,237 @@
+# 公告已讀 / 確認的批次寫入（write-behind），資料表見 docs/database/database-notice-reads.sql
+# - 已讀與確認事件先放入記憶體緩衝區，同一 (公告, 使用者) 的多次事件合併為一筆
+# - 每 NOTICE_ACK_FLUSH_INTERVAL 秒或累積 NOTICE_ACK_BATCH_SIZE 筆時，
+#   以多列 INSERT ... ON CONFLICT 在單一交易中寫入 notice_reads
+# - 同一交易中依「新增的已讀 / 新增的確認」增量更新 notice_ack_counts，查詢確認人數不需 COUNT(*)；
+#   增量取自 INSERT ... DO NOTHING 與 UPDATE ... WHERE acked_at IS NULL 實際變更的列數，
+#   多個 worker 同時寫入同一使用者也不會重複計算
+# - 標記已讀時先確認公告存在，不存在回傳 404；寫入時才發現已刪除的公告 / 使用者計入 dropped
+# - 啟動時檢查 notice_reads.acked_at，缺少時才新增（SQLite 的 ADD COLUMN 不能重複執行），並建立其索引
+# - 關閉時透過 db.before_close 在連線池關閉前寫完緩衝區
+# 依賴 backend-database.py 的 db 與 backend-notice-index.py 的 notice_index
+
+import os
+import uuid
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+NOTICE_ACK_FLUSH_INTERVAL = float(os.getenv("NOTICE_ACK_FLUSH_INTERVAL", "1"))
+NOTICE_ACK_BATCH_SIZE = int(os.getenv("NOTICE_ACK_BATCH_SIZE", "500"))
+# 每列 4 個參數，SQLite 舊版單一語句上限 999 個參數
+NOTICE_ACK_INSERT_CHUNK = 200
+NOTICE_ACK_QUERY_CHUNK = 500
+
+
+def _existing_ids(conn, table: str, ids: set) -> set:
+    found = set()
+    ids = list(ids)
+    for i in range(0, len(ids), NOTICE_ACK_QUERY_CHUNK):
+        chunk = ids[i:i + NOTICE_ACK_QUERY_CHUNK]
+        found.update(row[0] for row in conn.execute(
+            f"SELECT id FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    return found
+
+
+def ensure_notice_reads_schema(conn):
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(notice_reads)")}
+    if "acked_at" not in columns:
+        conn.execute("ALTER TABLE notice_reads ADD COLUMN acked_at TIMESTAMP NULL")
+    # 已確認名單依確認時間排序
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notice_reads_acked ON notice_reads(notice_id, acked_at, user_id)")
+
+
+def write_notice_reads(conn, events: Dict[Tuple[str, str], Tuple[str, Optional[str]]]) -> dict:
+    """events: {(notice_id, user_id): (read_at, acked_at)}；回傳新增的已讀 / 確認數"""
+    # 不存在的公告或使用者會違反外鍵而讓整批失敗，先排除
+    notice_ids = _existing_ids(conn, "notices", {notice_id for notice_id, _ in events})
+    user_ids = _existing_ids(conn, "users", {user_id for _, user_id in events})
+    valid = {key: value for key, value in events.items() if key[0] in notice_ids and key[1] in user_ids}
+
+    by_notice = defaultdict(list)
+    for (notice_id, user_id), (read_at, acked_at) in valid.items():
+        by_notice[notice_id].append((user_id, read_at, acked_at))
+
+    # 依公告分組寫入，各語句實際變更的列數即為該公告新增的已讀 / 確認
+    new_reads = defaultdict(int)
+    new_acks = defaultdict(int)
+    row_placeholder = "(?, ?, ?, ?)"
+    for notice_id, items in by_notice.items():
+        for i in range(0, len(items), NOTICE_ACK_INSERT_CHUNK):
+            chunk = items[i:i + NOTICE_ACK_INSERT_CHUNK]
+            new_reads[notice_id] += conn.execute(
+                "INSERT INTO notice_reads (id, notice_id, user_id, read_at) VALUES "
+                + ",".join([row_placeholder] * len(chunk))
+                + " ON CONFLICT (notice_id, user_id) DO NOTHING",
+                [value for user_id, read_at, _ in chunk for value in (str(uuid.uuid4()), notice_id, user_id, read_at)]
+            ).rowcount
+        acks = [(acked_at, notice_id, user_id) for user_id, _, acked_at in items if acked_at]
+        if acks:
+            new_acks[notice_id] += conn.executemany(
+                "UPDATE notice_reads SET acked_at = ? WHERE notice_id = ? AND user_id = ? AND acked_at IS NULL",
+                acks
+            ).rowcount
+
+    conn.executemany("""
+        INSERT INTO notice_ack_counts (notice_id, read_count, ack_count) VALUES (?, ?, ?)
+        ON CONFLICT (notice_id) DO UPDATE SET
+            read_count = read_count + excluded.read_count,
+            ack_count = ack_count + excluded.ack_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, [
+        (notice_id, new_reads[notice_id], new_acks[notice_id])
+        for notice_id in by_notice
+        if new_reads[notice_id] or new_acks[notice_id]
+    ])
+    return {
+        "rows": len(valid),
+        "dropped": len(events) - len(valid),
+        "new_reads": sum(new_reads.values()),
+        "new_acks": sum(new_acks.values())
+    }
+
+
+class NoticeAckBuffer:
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {}
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def _merge(self, key: Tuple[str, str], read_at: str, acked_at: Optional[str]):
+        """合併同一使用者的多次事件：保留最早的已讀與確認時間"""
+        current = self._pending.get(key)
+        if current is not None:
+            read_at = min(read_at, current[0])
+            acked_at = min(filter(None, (acked_at, current[1])), default=None)
+        self._pending[key] = (read_at, acked_at)
+
+    def record(self, notice_id: str, user_id: str, ack: bool = False):
+        now = datetime.utcnow().isoformat(sep=" ")
+        self._merge((notice_id, user_id), now, now if ack else None)
+        self.events += 1
+        if len(self._pending) >= NOTICE_ACK_BATCH_SIZE:
+            self._full.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            events, self._pending = self._pending, {}
+            try:
+                result = await db.run(write_notice_reads, events)
+            except Exception as e:
+                # 寫入失敗時放回緩衝區，與期間新進的事件合併後下次重試
+                self.failures += 1
+                for key, (read_at, acked_at) in events.items():
+                    self._merge(key, read_at, acked_at)
+                print(f"Notice ack flush failed: {e}")
+                return
+            self.flushes += 1
+            self.rows_written += result["rows"]
+            if result["dropped"]:
+                self.dropped += result["dropped"]
+                print(f"Notice ack flush dropped {result['dropped']} events for deleted notices or users")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=NOTICE_ACK_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "events": self.events,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "coalesce_ratio": round(1 - self.rows_written / self.events, 4) if self.events else 0.0
+        }
+
+
+notice_ack_buffer = NoticeAckBuffer()
+
+
+@app.on_event("startup")
+async def start_notice_ack_buffer():
+    await db.run(ensure_notice_reads_schema)
+    notice_ack_buffer.start()
+    db.before_close(notice_ack_buffer.stop)
+
+
+@app.post("/api/v1/notices/{notice_id}/read")
+async def mark_notice_read(
+    notice_id: str,
+    ack: bool = False,
+    token_data: dict = Depends(verify_token)
+):
+    """標記已讀；ack=true 同時確認（require_ack 公告）。寫入延遲最多 NOTICE_ACK_FLUSH_INTERVAL 秒"""
+    # 公告索引（backend-notice-index.py）只含本 worker 已同步的公告，不在索引中時再查資料表
+    if notice_id not in notice_index.notices and not await db.fetchone(
+        "SELECT 1 FROM notices WHERE id = ? AND is_active = 1", (notice_id,)
+    ):
+        raise HTTPException(status_code=404, detail="Notice not found")
+    notice_ack_buffer.record(notice_id, token_data.get("user_id"), ack)
+    return {"success": True, "message": "公告已確認" if ack else "公告已標記為已讀"}
+
+
+@app.get("/api/v1/notices/{notice_id}/acks")
+async def get_notice_acks(
+    notice_id: str,
+    limit: int = 100,
+    after_acked_at: str = None,
+    after_user_id: str = None,
+    token_data: dict = Depends(verify_token)
+):
+    """確認人數（來自 notice_ack_counts）與依確認時間排序的確認名單；
+    after_acked_at / after_user_id 為上一頁最後一列，用於 keyset 分頁"""
+    limit = max(1, min(limit, 1000))
+    counts = await db.fetchone(
+        "SELECT read_count, ack_count FROM notice_ack_counts WHERE notice_id = ?",
+        (notice_id,)
+    )
+    params = [notice_id]
+    sql = "SELECT user_id, acked_at FROM notice_reads WHERE notice_id = ? AND acked_at IS NOT NULL"
+    if after_acked_at:
+        sql += " AND (acked_at > ? OR (acked_at = ? AND user_id > ?))"
+        params.extend([after_acked_at, after_acked_at, after_user_id or ""])
+    sql += " ORDER BY acked_at, user_id LIMIT ?"
+    params.append(limit)
+    rows = await db.fetchall(sql, params)
+    return {
+        "notice_id": notice_id,
+        "read_count": counts["read_count"] if counts else 0,
+        "ack_count": counts["ack_count"] if counts else 0,
+        "acknowledged": [{"user_id": row["user_id"], "acked_at": row["acked_at"]} for row in rows]
+    }
+
+
+@app.get("/api/v1/notices/ack-metrics")
+async def get_notice_ack_metrics(token_data: dict = Depends(verify_token)):
+    return notice_ack_buffer.stats()
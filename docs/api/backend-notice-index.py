@@ -0,0 +1,341 @@
+# 公告對象的反向索引
+# - Notice.scope 正規化為 (維度, 值) 鍵：brand / workspace / team / role / user，
+#   例如 {"brands": ["b1"], "roles": ["Agent"]}；空的 scope 或 {"all": true} 代表全體
+# - 索引為 {(維度, 值): {公告 ID}}，只包含目前生效中的公告；使用者可見的公告是
+#   自身幾個鍵的集合聯集，成本與命中的公告數成正比，不必逐一比對所有公告
+# - starts_at / ends_at 放入以 NOTICE_WHEEL_RESOLUTION 秒為一格的時間輪，
+#   到期時才加入或移出索引
+# - 建立 / 修改 / 刪除時增量更新；其他 worker 的修改每 NOTICE_INDEX_REFRESH_INTERVAL 秒
+#   依 updated_at 增量同步
+# 依賴 backend-main.py 的 Notice、backend-database.py 的 db 與 backend-schedule-batch-api.py 的 to_utc_naive
+
+import os
+import json
+import uuid
+import heapq
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+NOTICE_WHEEL_RESOLUTION = int(os.getenv("NOTICE_WHEEL_RESOLUTION", "60"))
+NOTICE_INDEX_REFRESH_INTERVAL = float(os.getenv("NOTICE_INDEX_REFRESH_INTERVAL", "5"))
+
+NOTICE_SCOPE_DIMENSIONS = ("brand", "workspace", "team", "role", "user")
+
+
+def notice_scope_keys(scope: Optional[dict]) -> Set[Tuple[str, str]]:
+    """scope → {(維度, 值)}；空集合代表全體。鍵名接受 brand / brands / brand_id / brand_ids 等寫法"""
+    keys = set()
+    if not scope or scope.get("all"):
+        return keys
+    for dimension in NOTICE_SCOPE_DIMENSIONS:
+        for name in (dimension, f"{dimension}s", f"{dimension}_id", f"{dimension}_ids"):
+            values = scope.get(name)
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            keys.update((dimension, str(value)) for value in values)
+    if not keys:
+        raise ValueError(f"Unknown notice scope, expected keys: {', '.join(NOTICE_SCOPE_DIMENSIONS)}")
+    return keys
+
+
+def parse_scope_filter(scope: Optional[str]) -> Set[Tuple[str, str]]:
+    """查詢參數 "brand:b1,workspace:w2" → {(維度, 值)}"""
+    keys = set()
+    for item in (scope or "").split(","):
+        if not item.strip():
+            continue
+        dimension, _, value = item.strip().partition(":")
+        if dimension not in NOTICE_SCOPE_DIMENSIONS or not value:
+            raise ValueError(f"Invalid scope filter: {item}")
+        keys.add((dimension, value))
+    return keys
+
+
+def notice_audience(token_data: dict, user: Optional[dict] = None) -> Set[Tuple[str, str]]:
+    """使用者所屬的 (維度, 值)：token 中的身分與資料庫中的團隊 / brand / workspace"""
+    user = user or {}
+    keys = {("user", str(token_data.get("user_id"))), ("role", str(token_data.get("role")))}
+    team_id = token_data.get("team_id") or user.get("team_id")
+    if team_id:
+        keys.add(("team", str(team_id)))
+    for dimension in ("brand", "workspace"):
+        for value in token_data.get(f"{dimension}_ids") or user.get(f"{dimension}_ids") or ():
+            keys.add((dimension, str(value)))
+    return keys
+
+
+class NoticeIndex:
+    """生效中公告的反向索引與啟用 / 到期時間輪；在 event loop 與 db.run 執行緒間共用，需加鎖"""
+
+    def __init__(self, resolution: int = NOTICE_WHEEL_RESOLUTION):
+        self.resolution = resolution
+        self.notices: Dict[str, dict] = {}
+        self._keys: Dict[str, Set[Tuple[str, str]]] = {}
+        self._postings: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._global: Set[str] = set()
+        self._active: Set[str] = set()
+        # 時間輪：{格子: {公告 ID}}，heap 保存有事件的格子以便跳過空格
+        self._slots: Dict[int, Set[str]] = defaultdict(set)
+        self._slot_heap: List[int] = []
+        self._lock = threading.Lock()
+        self.last_synced_at: Optional[str] = None
+
+    def _slot(self, value: datetime) -> int:
+        return int(value.replace(tzinfo=timezone.utc).timestamp()) // self.resolution
+
+    def _schedule(self, notice_id: str, at: datetime):
+        slot = self._slot(at)
+        if slot not in self._slots:
+            heapq.heappush(self._slot_heap, slot)
+        self._slots[slot].add(notice_id)
+
+    def _activate(self, notice_id: str):
+        if notice_id in self._active:
+            return
+        self._active.add(notice_id)
+        keys = self._keys[notice_id]
+        if not keys:
+            self._global.add(notice_id)
+        for key in keys:
+            self._postings[key].add(notice_id)
+
+    def _deactivate(self, notice_id: str):
+        if notice_id not in self._active:
+            return
+        self._active.discard(notice_id)
+        self._global.discard(notice_id)
+        for key in self._keys.get(notice_id, ()):
+            posting = self._postings.get(key)
+            if posting is not None:
+                posting.discard(notice_id)
+                if not posting:
+                    del self._postings[key]
+
+    def _remove(self, notice_id: str):
+        self._deactivate(notice_id)
+        self.notices.pop(notice_id, None)
+        self._keys.pop(notice_id, None)
+
+    def _upsert(self, notice: dict, now: datetime):
+        notice_id = notice["id"]
+        self._remove(notice_id)
+        if not notice.get("is_active", True) or notice["ends_at"] <= now:
+            return
+        self.notices[notice_id] = notice
+        self._keys[notice_id] = notice_scope_keys(notice["scope"])
+        if notice["starts_at"] <= now:
+            self._activate(notice_id)
+        else:
+            self._schedule(notice_id, notice["starts_at"])
+        self._schedule(notice_id, notice["ends_at"])
+
+    def upsert(self, notice: dict, now: Optional[datetime] = None):
+        """notice 的 starts_at / ends_at 為 UTC（不帶時區）"""
+        with self._lock:
+            self._upsert(notice, now or datetime.utcnow())
+
+    def remove(self, notice_id: str):
+        with self._lock:
+            self._remove(notice_id)
+
+    def advance(self, now: Optional[datetime] = None):
+        """處理到 now 為止的時間輪格子；同一格內依公告自身時間判斷啟用或到期"""
+        now = now or datetime.utcnow()
+        current = self._slot(now)
+        with self._lock:
+            requeue: Dict[int, Set[str]] = {}
+            while self._slot_heap and self._slot_heap[0] <= current:
+                slot = heapq.heappop(self._slot_heap)
+                for notice_id in self._slots.pop(slot, set()):
+                    notice = self.notices.get(notice_id)
+                    if notice is None:
+                        continue
+                    # 公告改期後舊格子留下的項目：以目前的 starts_at / ends_at 判斷
+                    if slot not in (self._slot(notice["starts_at"]), self._slot(notice["ends_at"])):
+                        continue
+                    if notice["ends_at"] <= now:
+                        self._remove(notice_id)
+                        continue
+                    if notice["starts_at"] <= now:
+                        self._activate(notice_id)
+                    # 與現在同一格但尚未開始或尚未到期：保留在格子中，之後再判斷
+                    if notice["starts_at"] > now or slot == self._slot(notice["ends_at"]):
+                        requeue.setdefault(slot, set()).add(notice_id)
+            for slot, notice_ids in requeue.items():
+                heapq.heappush(self._slot_heap, slot)
+                self._slots[slot] = notice_ids
+
+    def visible(
+        self,
+        audience: Iterable[Tuple[str, str]],
+        scope_filter: Optional[Set[Tuple[str, str]]] = None,
+        require_ack: Optional[bool] = None,
+        now: Optional[datetime] = None
+    ) -> List[dict]:
+        self.advance(now)
+        with self._lock:
+            ids = set(self._global)
+            for key in audience:
+                posting = self._postings.get(key)
+                if posting:
+                    ids |= posting
+            if scope_filter:
+                # 全體公告對任何對象都生效，不因 scope 篩選而排除
+                targeted = set(self._global)
+                for key in scope_filter:
+                    targeted |= self._postings.get(key, set())
+                ids &= targeted
+            notices = [self.notices[notice_id] for notice_id in ids]
+        if require_ack is not None:
+            notices = [n for n in notices if n["require_ack"] == require_ack]
+        return sorted(notices, key=lambda n: n["starts_at"], reverse=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "notices": len(self.notices),
+                "active": len(self._active),
+                "global": len(self._global),
+                "keys": len(self._postings),
+                "scheduled_slots": len(self._slots)
+            }
+
+
+notice_index = NoticeIndex()
+
+_NOTICE_COLUMNS = "id, title, content, scope, starts_at, ends_at, require_ack, created_by, is_active, updated_at"
+
+
+def _notice_from_row(row) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "content": row["content"],
+        "scope": json.loads(row["scope"]) if isinstance(row["scope"], str) else row["scope"],
+        "starts_at": datetime.fromisoformat(str(row["starts_at"])),
+        "ends_at": datetime.fromisoformat(str(row["ends_at"])),
+        "require_ack": bool(row["require_ack"]),
+        "created_by": row["created_by"],
+        "is_active": bool(row["is_active"])
+    }
+
+
+def load_notice_changes(conn, since: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    """since 為 None 時載入所有未到期的公告，否則只載入 updated_at 之後有變動的（含停用）；
+    updated_at 只到秒，以 >= 比對避免漏掉同一秒內的修改（重複套用不影響結果）"""
+    if since is None:
+        rows = conn.execute(f"""
+            SELECT {_NOTICE_COLUMNS} FROM notices
+            WHERE is_active = 1 AND ends_at > ?
+        """, (datetime.utcnow().isoformat(sep=" "),)).fetchall()
+        watermark = conn.execute("SELECT MAX(updated_at) FROM notices").fetchone()[0]
+    else:
+        rows = conn.execute(f"""
+            SELECT {_NOTICE_COLUMNS} FROM notices WHERE updated_at >= ? ORDER BY updated_at
+        """, (since,)).fetchall()
+        watermark = str(rows[-1]["updated_at"]) if rows else since
+    return [_notice_from_row(row) for row in rows], (str(watermark) if watermark else since)
+
+
+def load_notice_user(conn, user_id: Optional[str]) -> dict:
+    """使用者的團隊與其 workspace / brand"""
+    user = conn.execute("SELECT team_id FROM users WHERE id = ?", (user_id,)).fetchone()
+    workspaces = conn.execute("SELECT id, brand_id FROM workspaces WHERE owner_id = ?", (user_id,)).fetchall()
+    return {
+        "team_id": user["team_id"] if user else None,
+        "workspace_ids": [row["id"] for row in workspaces],
+        "brand_ids": sorted({row["brand_id"] for row in workspaces})
+    }
+
+
+async def sync_notice_index():
+    notices, watermark = await db.run(load_notice_changes, notice_index.last_synced_at)
+    for notice in notices:
+        notice_index.upsert(notice)
+    notice_index.last_synced_at = watermark
+
+
+def _notice_record(notice: Notice, created_by: Optional[str]) -> dict:
+    notice_scope_keys(notice.scope)  # 驗證 scope
+    return {
+        "id": notice.id or str(uuid.uuid4()),
+        "title": notice.title,
+        "content": notice.content,
+        "scope": notice.scope,
+        "starts_at": to_utc_naive(notice.starts_at),
+        "ends_at": to_utc_naive(notice.ends_at),
+        "require_ack": notice.require_ack,
+        "created_by": created_by,
+        "is_active": True
+    }
+
+
+def save_notice(conn, record: dict, insert: bool) -> bool:
+    values = (
+        record["title"], record["content"], json.dumps(record["scope"]),
+        record["starts_at"].isoformat(sep=" "), record["ends_at"].isoformat(sep=" "),
+        record["require_ack"]
+    )
+    if insert:
+        conn.execute("""
+            INSERT INTO notices (title, content, scope, starts_at, ends_at, require_ack, created_by, id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (*values, record["created_by"], record["id"]))
+        return True
+    cursor = conn.execute("""
+        UPDATE notices
+        SET title = ?, content = ?, scope = ?, starts_at = ?, ends_at = ?, require_ack = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND is_active = 1
+    """, (*values, record["id"]))
+    return cursor.rowcount > 0
+
+
+def _serialize_notice(notice: dict) -> dict:
+    return {
+        **{k: v for k, v in notice.items() if k != "is_active"},
+        "starts_at": notice["starts_at"].isoformat() + "Z",
+        "ends_at": notice["ends_at"].isoformat() + "Z"
+    }
+
+
+async def _notice_index_refresh_loop():
+    while True:
+        await asyncio.sleep(NOTICE_INDEX_REFRESH_INTERVAL)
+        try:
+            await sync_notice_index()
+            notice_index.advance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Notice index refresh failed: {e}")
+
+
+_notice_index_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def start_notice_index():
+    global _notice_index_task
+    await sync_notice_index()
+    _notice_index_task = asyncio.create_task(_notice_index_refresh_loop())
+
+
+@app.on_event("shutdown")
+async def stop_notice_index():
+    if _notice_index_task is not None:
+        _notice_index_task.cancel()
+        try:
+            await _notice_index_task
+        except asyncio.CancelledError:
+            pass
+
+
+@app.get("/api/v1/notices/index-metrics")
+async def get_notice_index_metrics(token_data: dict = Depends(verify_token)):
+    return notice_index.stats()
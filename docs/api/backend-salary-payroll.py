@@ -0,0 +1,286 @@
+# 薪資批次計算（規格見 backend-salary-management-api.md，資料表見 docs/database/database-salary.sql）
+# - 一次計算整個 Workspace 某一期間所有成員的薪資，輸入以少數幾次批次查詢載入：
+#   薪資設定、成員薪資設定（期間結束前最新一筆）、職等、期間內的調整、既有的計算結果
+# - 計算以欄為單位對整批成員套用同一公式，全程使用 Decimal，金額四捨五入至小數兩位
+#   hourly_rate = base_salary / 240（與規格的 DECIMAL(8,2) 一致先四捨五入至小數兩位）；
+#   overtime = hours × hourly_rate × 1.5；
+#   gross = base + overtime + bonus + allowance − deduction；tax = gross × fixed_tax_rate；
+#   net = gross − tax − transfer_fee
+# - 草稿在單一交易中寫入 salary_calculations，已確認 / 已發放的計算不會被覆寫；
+#   金額以 Decimal 字串寫入 TEXT 欄位，不經過浮點數
+# 依賴 backend-database.py 的 db 與 backend-audit-log.py 的 audit_log_writer
+
+import time
+import uuid
+import calendar
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List
+from pydantic import BaseModel
+
+SALARY_ADMIN_ROLES = ("Owner", "Admin")
+SALARY_HOURS_PER_MONTH = Decimal("240")
+SALARY_OVERTIME_MULTIPLIER = Decimal("1.5")
+SALARY_DEFAULT_SETTINGS = {
+    "has_fixed_tax": True,
+    "fixed_tax_rate": Decimal("0.05"),
+    "transfer_fee": Decimal("15.00")
+}
+CENT = Decimal("0.01")
+PAYROLL_MONEY_COLUMNS = (
+    "base_salary", "overtime_amount", "bonus_amount", "allowance_amount", "deduction_amount",
+    "gross_salary", "tax_amount", "transfer_fee", "net_salary"
+)
+# salary_adjustment_types.adjustment_type → 調整合計中固定金額的位置（百分比在下一格）
+SALARY_ADJUSTMENT_SLOTS = {"bonus": 0, "allowance": 2, "deduction": 4}
+
+
+class PayrollRunRequest(BaseModel):
+    workspace_id: str
+    calculation_period: str  # YYYY-MM
+    # member_id → 加班時數；未列出的成員沿用既有草稿的時數
+    overtime_hours: Dict[str, float] = {}
+    dry_run: bool = False
+
+
+def to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value)) if value is not None else Decimal("0")
+
+
+def _round(values: List[Decimal]) -> List[Decimal]:
+    return [value.quantize(CENT, rounding=ROUND_HALF_UP) for value in values]
+
+
+def period_bounds(period: str):
+    """YYYY-MM → (第一天, 最後一天)，格式錯誤時拋出 ValueError"""
+    if len(period) != 7:
+        raise ValueError("calculation_period must be YYYY-MM")
+    first = datetime.strptime(f"{period}-01", "%Y-%m-%d").date()
+    last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    return first.isoformat(), last.isoformat()
+
+
+def load_salary_settings(conn, workspace_id: str) -> dict:
+    row = conn.execute(
+        "SELECT has_fixed_tax, fixed_tax_rate, transfer_fee FROM salary_settings WHERE workspace_id = ?",
+        (workspace_id,)
+    ).fetchone()
+    if row is None:
+        return dict(SALARY_DEFAULT_SETTINGS)
+    return {
+        "has_fixed_tax": bool(row["has_fixed_tax"]),
+        "fixed_tax_rate": to_decimal(row["fixed_tax_rate"]),
+        "transfer_fee": to_decimal(row["transfer_fee"])
+    }
+
+
+def load_payroll_inputs(conn, workspace_id: str, period: str) -> dict:
+    """以固定次數的查詢載入整個 Workspace 的計算輸入，與成員人數無關"""
+    first_day, last_day = period_bounds(period)
+    members_sql = "SELECT member_id FROM employee_salaries WHERE workspace_id = ?"
+
+    # 依生效日排序，同一成員後面的列覆蓋前面的，留下期間結束前最新的設定；
+    # 最新一筆為停用時該成員不計算，不回頭使用較舊的啟用設定
+    employees = {}
+    for row in conn.execute("""
+        SELECT member_id, member_name, department, salary_grade_id, is_active
+        FROM employee_salaries
+        WHERE workspace_id = ? AND effective_date <= ?
+        ORDER BY member_id, effective_date
+    """, (workspace_id, last_day)):
+        employees[row["member_id"]] = row
+
+    grades = {
+        row["id"]: row
+        for row in conn.execute("""
+            SELECT id, grade_name, base_salary, is_active FROM salary_grades
+            WHERE id IN (SELECT salary_grade_id FROM employee_salaries WHERE workspace_id = ?)
+        """, (workspace_id,))
+    }
+
+    # member_id → [固定獎金, 百分比獎金, 固定津貼, 百分比津貼, 固定扣項, 百分比扣項]
+    adjustments: Dict[str, List[Decimal]] = {}
+    for row in conn.execute(f"""
+        SELECT a.member_id, a.amount, t.adjustment_type, t.is_percentage
+        FROM salary_adjustments a
+        JOIN salary_adjustment_types t ON t.id = a.adjustment_type_id
+        WHERE a.adjustment_date BETWEEN ? AND ? AND a.status != 'cancelled'
+          AND a.member_id IN ({members_sql})
+    """, (first_day, last_day, workspace_id)):
+        sums = adjustments.setdefault(row["member_id"], [Decimal("0")] * 6)
+        index = SALARY_ADJUSTMENT_SLOTS.get(row["adjustment_type"], 0) + (1 if row["is_percentage"] else 0)
+        sums[index] += to_decimal(row["amount"])
+
+    existing = {
+        row["member_id"]: row
+        for row in conn.execute(f"""
+            SELECT member_id, status, overtime_hours FROM salary_calculations
+            WHERE calculation_period = ? AND member_id IN ({members_sql})
+        """, (period, workspace_id))
+    }
+
+    return {
+        "settings": load_salary_settings(conn, workspace_id),
+        "employees": employees,
+        "grades": grades,
+        "adjustments": adjustments,
+        "existing": existing
+    }
+
+
+def compute_payroll(columns: Dict[str, List[Decimal]], settings: dict) -> Dict[str, List[Decimal]]:
+    """columns 每個鍵是一欄（每位成員一個值）：base_salary、overtime_hours、
+    bonus_fixed、bonus_percent、allowance_fixed、allowance_percent、deduction_fixed、deduction_percent；
+    百分比以 base_salary 為基準"""
+    base = columns["base_salary"]
+    n = len(base)
+    hourly_rate = _round([salary / SALARY_HOURS_PER_MONTH for salary in base])
+    overtime = _round([
+        hours * rate * SALARY_OVERTIME_MULTIPLIER
+        for hours, rate in zip(columns["overtime_hours"], hourly_rate)
+    ])
+    bonus = _round([
+        fixed + salary * percent / 100
+        for fixed, percent, salary in zip(columns["bonus_fixed"], columns["bonus_percent"], base)
+    ])
+    allowance = _round([
+        fixed + salary * percent / 100
+        for fixed, percent, salary in zip(columns["allowance_fixed"], columns["allowance_percent"], base)
+    ])
+    deduction = _round([
+        fixed + salary * percent / 100
+        for fixed, percent, salary in zip(columns["deduction_fixed"], columns["deduction_percent"], base)
+    ])
+    gross = [b + o + bo + a - d for b, o, bo, a, d in zip(base, overtime, bonus, allowance, deduction)]
+    if settings["has_fixed_tax"]:
+        tax = _round([value * settings["fixed_tax_rate"] for value in gross])
+    else:
+        tax = [Decimal("0.00")] * n
+    fee = [settings["transfer_fee"].quantize(CENT, rounding=ROUND_HALF_UP)] * n
+    net = [g - t - f for g, t, f in zip(gross, tax, fee)]
+    return {
+        "base_salary": base,
+        "overtime_hours": columns["overtime_hours"],
+        "overtime_amount": overtime,
+        "bonus_amount": bonus,
+        "allowance_amount": allowance,
+        "deduction_amount": deduction,
+        "gross_salary": gross,
+        "tax_amount": tax,
+        "transfer_fee": fee,
+        "net_salary": net
+    }
+
+
+def run_payroll(conn, workspace_id: str, period: str, overtime_hours: Dict[str, Decimal],
+                dry_run: bool = False) -> dict:
+    started = time.perf_counter()
+    inputs = load_payroll_inputs(conn, workspace_id, period)
+    employees, grades, existing = inputs["employees"], inputs["grades"], inputs["existing"]
+    zero = Decimal("0")
+
+    members = []
+    locked = []
+    inactive = []
+    missing_grade = []
+    columns = {key: [] for key in (
+        "base_salary", "overtime_hours", "bonus_fixed", "bonus_percent",
+        "allowance_fixed", "allowance_percent", "deduction_fixed", "deduction_percent"
+    )}
+    for member_id, employee in employees.items():
+        if not employee["is_active"]:
+            inactive.append(member_id)
+            continue
+        current = existing.get(member_id)
+        if current is not None and current["status"] != "draft":
+            locked.append(member_id)
+            continue
+        grade = grades.get(employee["salary_grade_id"])
+        if grade is None or not grade["is_active"]:
+            missing_grade.append(member_id)
+            continue
+        hours = overtime_hours.get(member_id)
+        if hours is None:
+            hours = to_decimal(current["overtime_hours"]) if current is not None else zero
+        adjustment = inputs["adjustments"].get(member_id, (zero,) * 6)
+        members.append(employee)
+        columns["base_salary"].append(to_decimal(grade["base_salary"]).quantize(CENT, rounding=ROUND_HALF_UP))
+        columns["overtime_hours"].append(hours)
+        for key, value in zip((
+            "bonus_fixed", "bonus_percent", "allowance_fixed", "allowance_percent", "deduction_fixed", "deduction_percent"
+        ), adjustment):
+            columns[key].append(value)
+
+    result = compute_payroll(columns, inputs["settings"])
+
+    if members and not dry_run:
+        conn.executemany("""
+            INSERT INTO salary_calculations (
+                id, workspace_id, member_id, calculation_period, salary_grade_id, department,
+                base_salary, overtime_hours, overtime_amount, bonus_amount, allowance_amount, deduction_amount,
+                gross_salary, tax_amount, transfer_fee, net_salary, status
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'draft')
+            ON CONFLICT (member_id, calculation_period) DO UPDATE SET
+                workspace_id = excluded.workspace_id,
+                salary_grade_id = excluded.salary_grade_id,
+                department = excluded.department,
+                base_salary = excluded.base_salary,
+                overtime_hours = excluded.overtime_hours,
+                overtime_amount = excluded.overtime_amount,
+                bonus_amount = excluded.bonus_amount,
+                allowance_amount = excluded.allowance_amount,
+                deduction_amount = excluded.deduction_amount,
+                gross_salary = excluded.gross_salary,
+                tax_amount = excluded.tax_amount,
+                transfer_fee = excluded.transfer_fee,
+                net_salary = excluded.net_salary,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE salary_calculations.status = 'draft'
+        """, [
+            (
+                str(uuid.uuid4()), workspace_id, employee["member_id"], period,
+                employee["salary_grade_id"], employee["department"],
+                *(str(result[key][i]) for key in (
+                    "base_salary", "overtime_hours", "overtime_amount", "bonus_amount", "allowance_amount",
+                    "deduction_amount", "gross_salary", "tax_amount", "transfer_fee", "net_salary"
+                ))
+            )
+            for i, employee in enumerate(members)
+        ])
+
+    return {
+        "workspace_id": workspace_id,
+        "calculation_period": period,
+        "dry_run": dry_run,
+        "employee_count": len(members),
+        "skipped": {"locked": locked, "inactive": inactive, "missing_grade": missing_grade},
+        "unknown_members": sorted(set(overtime_hours) - set(employees)),
+        "totals": {key: float(sum(result[key], Decimal("0.00"))) for key in PAYROLL_MONEY_COLUMNS},
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+@app.post("/api/v1/salary/payroll-runs")
+async def create_payroll_run(request: PayrollRunRequest, token_data: dict = Depends(verify_token)):
+    """整個 Workspace 一個期間的薪資批次計算，寫入草稿並回傳彙總；dry_run 時只計算不寫入"""
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    try:
+        period_bounds(request.calculation_period)
+        overtime_hours = {member_id: to_decimal(hours) for member_id, hours in request.overtime_hours.items()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if any(hours < 0 for hours in overtime_hours.values()):
+        raise HTTPException(status_code=400, detail="overtime_hours must not be negative")
+
+    result = await db.run(
+        run_payroll, request.workspace_id, request.calculation_period, overtime_hours, request.dry_run
+    )
+    if not request.dry_run:
+        await audit_log_writer.record(
+            token_data, "payroll_run", "salary_calculation",
+            new_values={key: result[key] for key in ("workspace_id", "calculation_period", "employee_count", "totals")}
+        )
+    return result
@@ -0,0 +1,408 @@
+# 薪資報表彙總（資料表見 docs/database/database-salary-rollups.sql）
+# - 薪資計算確認 / 發放時，在同一交易中把金額累加到 (期間, Workspace, 職等, 部門) 的 salary_rollups，
+#   並遞增該期間在 salary_rollup_periods 的版本號
+# - /salary/reports 與 /salary/statistics 只讀彙總表，不再掃描 salary_calculations
+#   （指定 member_id 時例外，只查該成員的計算）
+# - 各期間的彙總列快取在記憶體，每次查詢只比對範圍內各期間的版本號；
+#   已結束的期間不再變動，版本不變即直接使用快取
+# - 彙總只計入已確認 / 已發放的計算，草稿不列入報表；未指定 workspace_id 時報表涵蓋所有 Workspace
+# 依賴 backend-database.py 的 db、backend-salary-payroll.py 的 to_decimal / period_bounds / SALARY_ADMIN_ROLES
+# 與 backend-audit-log.py 的 audit_log_writer
+
+import threading
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+SALARY_REPORT_ROLES = ("Owner", "Admin", "Auditor")
+SALARY_REPORT_MAX_PERIODS = 60
+SALARY_TREND_PERIODS = 12
+# 目標狀態 → 允許的原狀態
+SALARY_TRANSITIONS = {"confirmed": "draft", "paid": "confirmed"}
+# salary_calculations 欄位 → salary_rollups 欄位
+SALARY_ROLLUP_AMOUNTS = {
+    "base_salary": "base_cents",
+    "overtime_amount": "overtime_cents",
+    "bonus_amount": "bonus_cents",
+    "allowance_amount": "allowance_cents",
+    "deduction_amount": "deduction_cents",
+    "gross_salary": "gross_cents",
+    "tax_amount": "tax_cents",
+    "transfer_fee": "transfer_fee_cents",
+    "net_salary": "net_cents"
+}
+
+
+class PayrollRunConfirm(BaseModel):
+    workspace_id: str
+    calculation_period: str
+
+
+def to_cents(value) -> int:
+    return int((to_decimal(value) * 100).to_integral_value())
+
+
+def period_range(period_from: str, period_to: str) -> List[str]:
+    """period_from ~ period_to（含）之間的所有 YYYY-MM"""
+    period_bounds(period_from)
+    period_bounds(period_to)
+    year, month = int(period_from[:4]), int(period_from[5:])
+    periods = []
+    while f"{year:04d}-{month:02d}" <= period_to:
+        periods.append(f"{year:04d}-{month:02d}")
+        if len(periods) > SALARY_REPORT_MAX_PERIODS:
+            raise ValueError(f"Period range cannot exceed {SALARY_REPORT_MAX_PERIODS} months")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def _rollup_key(row) -> Tuple[str, str, str, str]:
+    return (
+        row["calculation_period"], row["workspace_id"] or "", row["salary_grade_id"] or "", row["department"] or ""
+    )
+
+
+def apply_salary_rollups(conn, rows, to_status: str):
+    """在呼叫端的交易中把狀態變更的計算累加到彙總表"""
+    deltas: Dict[Tuple[str, str, str, str], list] = defaultdict(lambda: [0, 0] + [0] * len(SALARY_ROLLUP_AMOUNTS))
+    for row in rows:
+        delta = deltas[_rollup_key(row)]
+        if to_status == "paid":
+            delta[1] += 1
+            continue
+        delta[0] += 1
+        for i, column in enumerate(SALARY_ROLLUP_AMOUNTS):
+            delta[2 + i] += to_cents(row[column])
+
+    columns = ("employee_count", "paid_count", *SALARY_ROLLUP_AMOUNTS.values())
+    conn.executemany(f"""
+        INSERT INTO salary_rollups (calculation_period, workspace_id, salary_grade_id, department, {", ".join(columns)})
+        VALUES (?, ?, ?, ?, {", ".join("?" * len(columns))})
+        ON CONFLICT (calculation_period, workspace_id, salary_grade_id, department) DO UPDATE SET
+            {", ".join(f"{column} = {column} + excluded.{column}" for column in columns)},
+            updated_at = CURRENT_TIMESTAMP
+    """, [(*key, *delta) for key, delta in deltas.items()])
+    bump_rollup_versions(conn, {key[0] for key in deltas})
+
+
+def bump_rollup_versions(conn, periods):
+    conn.executemany("""
+        INSERT INTO salary_rollup_periods (calculation_period, version) VALUES (?, 1)
+        ON CONFLICT (calculation_period) DO UPDATE SET
+            version = version + 1, updated_at = CURRENT_TIMESTAMP
+    """, [(period,) for period in periods])
+
+
+def transition_salary_calculations(
+    conn,
+    to_status: str,
+    calculation_id: Optional[str] = None,
+    workspace_id: Optional[str] = None,
+    period: Optional[str] = None
+) -> int:
+    """確認或發放單筆計算（calculation_id）或整個 Workspace 一個期間的計算，回傳變更筆數"""
+    from_status = SALARY_TRANSITIONS[to_status]
+    if calculation_id is not None:
+        where, params = "id = ?", [calculation_id]
+    else:
+        where, params = "workspace_id = ? AND calculation_period = ?", [workspace_id, period]
+    # 狀態條件放在 UPDATE 本身，只彙總這次真正變更的列：
+    # 重複送出或單筆與整批確認同時進行時，同一筆計算不會被累加兩次
+    timestamp_column = "confirmed_at" if to_status == "confirmed" else "paid_at"
+    rows = conn.execute(f"""
+        UPDATE salary_calculations
+        SET status = ?, {timestamp_column} = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE {where} AND status = ?
+        RETURNING id, calculation_period, workspace_id, salary_grade_id, department,
+            {", ".join(SALARY_ROLLUP_AMOUNTS)}
+    """, (to_status, datetime.utcnow(), *params, from_status)).fetchall()
+    if not rows:
+        return 0
+    apply_salary_rollups(conn, rows, to_status)
+    return len(rows)
+
+
+def rebuild_salary_rollups(conn, period: str):
+    """由 salary_calculations 重新計算一個期間的彙總"""
+    conn.execute("DELETE FROM salary_rollups WHERE calculation_period = ?", (period,))
+    bump_rollup_versions(conn, [period])
+    rows = conn.execute(f"""
+        SELECT calculation_period, workspace_id, salary_grade_id, department, status,
+            {", ".join(SALARY_ROLLUP_AMOUNTS)}
+        FROM salary_calculations WHERE calculation_period = ? AND status IN ('confirmed', 'paid')
+    """, (period,)).fetchall()
+    apply_salary_rollups(conn, rows, "confirmed")
+    apply_salary_rollups(conn, [row for row in rows if row["status"] == "paid"], "paid")
+    return len(rows)
+
+
+class SalaryRollupCache:
+    """各期間的彙總列與版本號；在 db.run 的執行緒中使用，需加鎖"""
+
+    def __init__(self):
+        self._periods: Dict[str, Tuple[int, List[dict]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, conn, periods: List[str]) -> Dict[str, List[dict]]:
+        placeholders = ",".join("?" * len(periods))
+        versions = {
+            row["calculation_period"]: row["version"]
+            for row in conn.execute(f"""
+                SELECT calculation_period, version FROM salary_rollup_periods
+                WHERE calculation_period IN ({placeholders})
+            """, periods)
+        }
+
+        result = {}
+        stale = []
+        with self._lock:
+            for period in periods:
+                cached = self._periods.get(period)
+                if cached is not None and cached[0] == versions.get(period, 0):
+                    result[period] = cached[1]
+                    self.hits += 1
+                else:
+                    stale.append(period)
+                    self.misses += 1
+        if not stale:
+            return result
+
+        loaded = {period: [] for period in stale}
+        for row in conn.execute(f"""
+            SELECT r.*, g.grade_name FROM salary_rollups r
+            LEFT JOIN salary_grades g ON g.id = r.salary_grade_id
+            WHERE r.calculation_period IN ({",".join("?" * len(stale))})
+        """, stale):
+            loaded[row["calculation_period"]].append(dict(row))
+        with self._lock:
+            for period, rows in loaded.items():
+                self._periods[period] = (versions.get(period, 0), rows)
+        result.update(loaded)
+        return result
+
+    def stats(self) -> dict:
+        return {"periods": len(self._periods), "hits": self.hits, "misses": self.misses}
+
+
+salary_rollups = SalaryRollupCache()
+
+
+def _money(cents: int) -> float:
+    return float(Decimal(cents) / 100)
+
+
+def _member_rollup_rows(conn, member_id: str, periods: List[str]) -> Dict[str, List[dict]]:
+    """指定成員時直接查該成員的計算，轉成與彙總列相同的格式"""
+    result = {period: [] for period in periods}
+    for row in conn.execute("""
+        SELECT c.*, g.grade_name FROM salary_calculations c
+        LEFT JOIN salary_grades g ON g.id = c.salary_grade_id
+        WHERE c.member_id = ? AND c.calculation_period BETWEEN ? AND ?
+          AND c.status IN ('confirmed', 'paid')
+    """, (member_id, periods[0], periods[-1])):
+        item = {
+            "calculation_period": row["calculation_period"],
+            "workspace_id": row["workspace_id"] or "",
+            "salary_grade_id": row["salary_grade_id"] or "",
+            "department": row["department"] or "",
+            "grade_name": row["grade_name"],
+            "employee_count": 1,
+            "paid_count": 1 if row["status"] == "paid" else 0
+        }
+        for column, cents_column in SALARY_ROLLUP_AMOUNTS.items():
+            item[cents_column] = to_cents(row[column])
+        result[row["calculation_period"]].append(item)
+    return result
+
+
+def load_report_rows(conn, periods: List[str], member_id: Optional[str] = None,
+                     department: Optional[str] = None, workspace_id: Optional[str] = None) -> Dict[str, List[dict]]:
+    if member_id:
+        rows = _member_rollup_rows(conn, member_id, periods)
+    else:
+        rows = salary_rollups.load(conn, periods)
+    if workspace_id is not None:
+        rows = {period: [row for row in items if row["workspace_id"] == workspace_id] for period, items in rows.items()}
+    if department is not None:
+        rows = {period: [row for row in items if row["department"] == department] for period, items in rows.items()}
+    return rows
+
+
+def build_salary_report(rows_by_period: Dict[str, List[dict]]) -> dict:
+    """多期間時 employee_count 為各期人數加總（人月）"""
+    totals = defaultdict(int)
+    by_grade: Dict[str, dict] = {}
+    for rows in rows_by_period.values():
+        for row in rows:
+            for column in ("employee_count", "gross_cents", "tax_cents", "net_cents"):
+                totals[column] += row[column]
+            grade = by_grade.setdefault(row["salary_grade_id"], {
+                "grade_name": row["grade_name"], "employee_count": 0, "gross_cents": 0
+            })
+            grade["employee_count"] += row["employee_count"]
+            grade["gross_cents"] += row["gross_cents"]
+
+    employees = totals["employee_count"]
+    return {
+        "summary": {
+            "total_employees": employees,
+            "total_gross_salary": _money(totals["gross_cents"]),
+            "total_tax": _money(totals["tax_cents"]),
+            "total_net_salary": _money(totals["net_cents"]),
+            "average_salary": _money(totals["gross_cents"] // employees) if employees else 0.0
+        },
+        "by_grade": [
+            {
+                "grade_name": grade["grade_name"],
+                "employee_count": grade["employee_count"],
+                "total_salary": _money(grade["gross_cents"]),
+                "average_salary": _money(grade["gross_cents"] // grade["employee_count"])
+            }
+            for grade in sorted(by_grade.values(), key=lambda item: -item["gross_cents"])
+            if grade["employee_count"]
+        ]
+    }
+
+
+def build_salary_statistics(rows_by_period: Dict[str, List[dict]], period: str) -> dict:
+    trend = []
+    for item_period, rows in sorted(rows_by_period.items()):
+        trend.append({
+            "period": item_period,
+            "total_salary": _money(sum(row["gross_cents"] for row in rows)),
+            "employee_count": sum(row["employee_count"] for row in rows)
+        })
+
+    current = rows_by_period.get(period, [])
+    headcount = sum(row["employee_count"] for row in current)
+    grades: Dict[str, dict] = {}
+    for row in current:
+        grade = grades.setdefault(row["salary_grade_id"], {"grade_name": row["grade_name"], "count": 0})
+        grade["count"] += row["employee_count"]
+    return {
+        "monthly_trend": trend,
+        "grade_distribution": [
+            {**grade, "percentage": round(grade["count"] * 100 / headcount, 1)}
+            for grade in sorted(grades.values(), key=lambda item: -item["count"])
+        ] if headcount else [],
+        "adjustment_summary": {
+            "total_bonus": _money(sum(row["bonus_cents"] for row in current)),
+            "total_deduction": _money(sum(row["deduction_cents"] for row in current)),
+            "total_allowance": _money(sum(row["allowance_cents"] for row in current))
+        }
+    }
+
+
+async def _transition(to_status: str, calculation_id: str, token_data: dict):
+    count = await db.run(transition_salary_calculations, to_status, calculation_id)
+    if not count:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Salary calculation not found or not {SALARY_TRANSITIONS[to_status]}"
+        )
+    await audit_log_writer.record(
+        token_data, "confirm" if to_status == "confirmed" else "pay", "salary_calculation", calculation_id,
+        old_values={"status": SALARY_TRANSITIONS[to_status]}, new_values={"status": to_status}
+    )
+
+
+@app.put("/api/v1/salary/calculations/{calculation_id}/confirm")
+async def confirm_salary_calculation(calculation_id: str, token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    await _transition("confirmed", calculation_id, token_data)
+    return {"success": True, "message": "Salary calculation confirmed"}
+
+
+@app.put("/api/v1/salary/calculations/{calculation_id}/pay")
+async def pay_salary_calculation(calculation_id: str, token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    await _transition("paid", calculation_id, token_data)
+    return {"success": True, "message": "Salary marked as paid"}
+
+
+@app.post("/api/v1/salary/payroll-runs/confirm")
+async def confirm_payroll_run(request: PayrollRunConfirm, token_data: dict = Depends(verify_token)):
+    """確認整個 Workspace 一個期間的所有草稿"""
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    try:
+        period_bounds(request.calculation_period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    count = await db.run(
+        transition_salary_calculations, "confirmed", None, request.workspace_id, request.calculation_period
+    )
+    if count:
+        await audit_log_writer.record(
+            token_data, "confirm_run", "salary_calculation",
+            new_values={"workspace_id": request.workspace_id, "calculation_period": request.calculation_period,
+                        "confirmed": count}
+        )
+    return {"success": True, "confirmed": count}
+
+
+@app.get("/api/v1/salary/reports")
+async def get_salary_reports(
+    period_from: str,
+    period_to: str,
+    member_id: Optional[str] = None,
+    department: Optional[str] = None,
+    workspace_id: Optional[str] = None,
+    token_data: dict = Depends(verify_token)
+):
+    if token_data.get("role") not in SALARY_REPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    try:
+        periods = period_range(period_from, period_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not periods:
+        raise HTTPException(status_code=400, detail="period_from must not be after period_to")
+    rows = await db.run(load_report_rows, periods, member_id, department, workspace_id)
+    return {"success": True, "data": build_salary_report(rows)}
+
+
+@app.get("/api/v1/salary/statistics")
+async def get_salary_statistics(
+    period: Optional[str] = None,
+    workspace_id: Optional[str] = None,
+    token_data: dict = Depends(verify_token)
+):
+    """period 與之前共 SALARY_TREND_PERIODS 個月的趨勢，以及 period 的職等分布與調整合計"""
+    if token_data.get("role") not in SALARY_REPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    period = period or datetime.utcnow().strftime("%Y-%m")
+    try:
+        period_bounds(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    year, month = divmod(int(period[:4]) * 12 + int(period[5:]) - 1 - (SALARY_TREND_PERIODS - 1), 12)
+    periods = period_range(f"{year:04d}-{month + 1:02d}", period)
+    rows = await db.run(load_report_rows, periods, None, None, workspace_id)
+    return {"success": True, "data": build_salary_statistics(rows, period)}
+
+
+@app.post("/api/v1/salary/rollups/rebuild")
+async def rebuild_salary_rollups_endpoint(period: str, token_data: dict = Depends(verify_token)):
+    """由 salary_calculations 重新計算一個期間的彙總（Owner / Admin）"""
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    try:
+        period_bounds(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    count = await db.run(rebuild_salary_rollups, period)
+    return {"success": True, "period": period, "calculations": count}
+
+
+@app.get("/api/v1/salary/rollups/metrics")
+async def get_salary_rollup_metrics(token_data: dict = Depends(verify_token)):
+    if token_data.get("role") not in SALARY_ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return salary_rollups.stats()
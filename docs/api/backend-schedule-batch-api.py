@@ -0,0 +1,248 @@
+# 排班指派批次建立與時段衝突檢測
+# 資料表 UNIQUE(user_id, start_at, end_at) 只能擋完全相同的時段，擋不住重疊（含跨日班）；
+# 這裡依使用者以排序後的時段區間找出所有重疊，再以多列 INSERT 在單一交易中寫入
+# 依賴 backend-main.py 的 ScheduleAssignment、backend-database.py 的 db 與 backend-audit-log.py 的 audit_log_writer
+
+import os
+import heapq
+from bisect import bisect_left
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+SCHEDULE_BATCH_MAX_ROWS = int(os.getenv("SCHEDULE_BATCH_MAX_ROWS", "20000"))
+# SQLite 單一語句的參數上限為 999（舊版），每列 9 個欄位
+SCHEDULE_INSERT_CHUNK = 100
+SCHEDULE_QUERY_CHUNK = 500
+
+ASSIGNMENT_COLUMNS = (
+    "id", "user_id", "shift_template_id", "date", "start_at", "end_at",
+    "status", "timezone", "created_by"
+)
+
+
+class ScheduleAssignmentBatch(BaseModel):
+    assignments: List[ScheduleAssignment]
+    # True：任何一列衝突即全部不寫入；False：寫入無衝突的列並回報衝突列
+    all_or_nothing: bool = False
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """統一以 UTC（不帶時區）比較與儲存"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def load_user_intervals(
+    conn,
+    user_ids: List[str],
+    from_date: date,
+    to_date: date
+) -> Dict[str, List[Tuple[datetime, datetime, str]]]:
+    """讀取使用者在日期範圍內未取消的排班（走 idx_user_date 索引）"""
+    intervals = defaultdict(list)
+    for i in range(0, len(user_ids), SCHEDULE_QUERY_CHUNK):
+        chunk = user_ids[i:i + SCHEDULE_QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(f"""
+            SELECT id, user_id, start_at, end_at FROM schedule_assignments
+            WHERE user_id IN ({placeholders})
+              AND date BETWEEN ? AND ?
+              AND status != 'cancelled'
+        """, (*chunk, from_date.isoformat(), to_date.isoformat())).fetchall()
+        for row in rows:
+            intervals[row["user_id"]].append((
+                to_utc_naive(datetime.fromisoformat(str(row["start_at"]))),
+                to_utc_naive(datetime.fromisoformat(str(row["end_at"]))),
+                row["id"]
+            ))
+    return intervals
+
+
+def detect_conflicts(
+    rows: List[Tuple[int, str, datetime, datetime]],
+    existing: Dict[str, List[Tuple[datetime, datetime, str]]]
+) -> Dict[int, List[dict]]:
+    """rows 為 (列號, user_id, start, end)，回傳 {列號: [衝突對象]}。
+
+    1. 與既有排班比對：既有時段依開始時間排序並計算 end 的前綴最大值，
+       以二分搜尋找出開始早於新時段結束者，再往前掃到不可能重疊為止
+    2. 批次內比對：依開始時間排序掃描，heap 保留已接受且尚未結束的時段，先開始者優先
+    整體 O(n log n)
+    """
+    conflicts: Dict[int, List[dict]] = {}
+    by_user = defaultdict(list)
+    for index, user_id, start, end in rows:
+        by_user[user_id].append((start, end, index))
+
+    for user_id, new_rows in by_user.items():
+        current = sorted(existing.get(user_id, ()))
+        starts = [item[0] for item in current]
+        max_end = []
+        for item in current:
+            max_end.append(max(item[1], max_end[-1]) if max_end else item[1])
+
+        candidates = []
+        for start, end, index in new_rows:
+            found = []
+            j = bisect_left(starts, end) - 1
+            while j >= 0 and max_end[j] > start:
+                if current[j][1] > start:
+                    found.append({"type": "existing", "id": current[j][2]})
+                j -= 1
+            if found:
+                conflicts[index] = found
+            else:
+                candidates.append((start, end, index))
+
+        candidates.sort()
+        active = []  # heap: (end, 列號)
+        for start, end, index in candidates:
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            if active:
+                conflicts[index] = [{"type": "batch", "index": other} for _, other in active]
+            else:
+                heapq.heappush(active, (end, index))
+
+    return conflicts
+
+
+def insert_assignments(conn, records: List[tuple]) -> int:
+    """多列 INSERT，每個語句 SCHEDULE_INSERT_CHUNK 列"""
+    row_placeholder = "(" + ",".join("?" * len(ASSIGNMENT_COLUMNS)) + ")"
+    columns = ", ".join(ASSIGNMENT_COLUMNS)
+    for i in range(0, len(records), SCHEDULE_INSERT_CHUNK):
+        chunk = records[i:i + SCHEDULE_INSERT_CHUNK]
+        conn.execute(
+            f"INSERT INTO schedule_assignments ({columns}) VALUES "
+            + ",".join([row_placeholder] * len(chunk)),
+            [value for record in chunk for value in record]
+        )
+    return len(records)
+
+
+def load_existing_ids(conn, ids: List[str]) -> set:
+    """已存在於資料表的排班 id"""
+    found = set()
+    for i in range(0, len(ids), SCHEDULE_QUERY_CHUNK):
+        chunk = ids[i:i + SCHEDULE_QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(
+            row["id"] for row in conn.execute(
+                f"SELECT id FROM schedule_assignments WHERE id IN ({placeholders})", chunk
+            )
+        )
+    return found
+
+
+def _assignment_record(assignment_id: str, assignment: ScheduleAssignment, created_by: Optional[str]) -> tuple:
+    return (
+        assignment_id,
+        assignment.user_id,
+        assignment.shift_template_id,
+        assignment.date,
+        to_utc_naive(assignment.start_at).isoformat(sep=" "),
+        to_utc_naive(assignment.end_at).isoformat(sep=" "),
+        assignment.status,
+        assignment.timezone,
+        created_by
+    )
+
+
+def create_assignments_checked(
+    conn,
+    assignments: List[ScheduleAssignment],
+    created_by: Optional[str],
+    all_or_nothing: bool = False
+) -> dict:
+    """驗證、檢查衝突並寫入；回傳寫入數量與各列錯誤。
+    日期格式錯誤、id 重複（批次內或已存在）都記錄為該列的錯誤，不讓整批失敗"""
+    errors: Dict[int, dict] = {}
+    ids = [assignment.id or str(uuid.uuid4()) for assignment in assignments]
+    taken = load_existing_ids(conn, sorted({assignment.id for assignment in assignments if assignment.id}))
+    seen = set()
+    rows = []
+    dates = []
+    for index, assignment in enumerate(assignments):
+        if ids[index] in taken:
+            errors[index] = {"index": index, "error": "id already exists"}
+            continue
+        if ids[index] in seen:
+            errors[index] = {"index": index, "error": "duplicate id in batch"}
+            continue
+        seen.add(ids[index])
+        try:
+            assignment_date = date.fromisoformat(assignment.date)
+        except (TypeError, ValueError):
+            errors[index] = {"index": index, "error": "date must be YYYY-MM-DD"}
+            continue
+        start = to_utc_naive(assignment.start_at)
+        end = to_utc_naive(assignment.end_at)
+        if end <= start:
+            errors[index] = {"index": index, "error": "end_at must be after start_at"}
+            continue
+        rows.append((index, assignment.user_id, start, end))
+        dates.append(assignment_date)
+
+    if rows:
+        # 前後各多讀一天，涵蓋跨日班
+        existing = load_user_intervals(
+            conn,
+            sorted({user_id for _, user_id, _, _ in rows}),
+            min(dates) - timedelta(days=1),
+            max(dates) + timedelta(days=1)
+        )
+        for index, found in detect_conflicts(rows, existing).items():
+            errors[index] = {"index": index, "error": "conflict", "conflicts_with": found}
+
+    if errors and all_or_nothing:
+        return {"created": 0, "ids": [], "errors": sorted(errors.values(), key=lambda e: e["index"])}
+
+    records = [
+        _assignment_record(ids[index], assignment, created_by)
+        for index, assignment in enumerate(assignments)
+        if index not in errors
+    ]
+    insert_assignments(conn, records)
+    return {
+        "created": len(records),
+        "ids": [record[0] for record in records],
+        "errors": sorted(errors.values(), key=lambda e: e["index"])
+    }
+
+
+@app.post("/api/v1/schedule-assignments/batch")
+async def create_schedule_assignments_batch(
+    batch: ScheduleAssignmentBatch,
+    token_data: dict = Depends(verify_token)
+):
+    """批次建立排班指派，回報每一列的衝突"""
+    if len(batch.assignments) > SCHEDULE_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many assignments, max {SCHEDULE_BATCH_MAX_ROWS} per batch"
+        )
+    try:
+        result = await db.run(
+            create_assignments_checked,
+            batch.assignments,
+            token_data.get("user_id"),
+            batch.all_or_nothing
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if result["ids"]:
+        await audit_log_writer.record(
+            token_data, "batch_create", "schedule_assignment",
+            new_values={"ids": result["ids"], "conflict_count": len(result["errors"])}
+        )
+    return {
+        "total": len(batch.assignments),
+        "conflict_count": len(result["errors"]),
+        **result
+    }
@@ -0,0 +1,275 @@
+# 排班人力覆蓋率（對照 ShiftTemplate 的 min_staff / max_staff / breaks）
+# 將排班、休息與班別時段轉成 (時間, 增量) 事件後排序一次掃描 (sweep line)，
+# 得到分段固定的在班人數與休息人數，再據此計算：
+# - 每個班別每天的時段人數與狀態（人力不足 / 超額 / 休息重疊造成不足）
+# - 固定長度時間桶的最少 / 最多 / 時間加權平均人數（皆為扣除休息後的實際人數）
+# 複雜度 O(n log n)，n 為排班與休息的數量
+# 依賴 backend-shift-expansion.py 的 shift_expansions 與 backend-schedule-batch-api.py 的 to_utc_naive
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import Query
+
+COVERAGE_MAX_DAYS = 93
+
+
+def _load_coverage_templates(conn, template_id: Optional[str]) -> Dict[str, dict]:
+    sql = """
+        SELECT id, name, timezone, start_time, end_time, is_cross_day, breaks, min_staff, max_staff
+        FROM shift_templates WHERE is_active = 1
+    """
+    params = []
+    if template_id:
+        sql += " AND id = ?"
+        params.append(template_id)
+    return {row["id"]: shift_template_from_row(row) for row in conn.execute(sql, params)}
+
+
+def sweep(events: List[tuple]) -> List[tuple]:
+    """events: (時間, 在班增量, 休息增量, 班別時段增量)
+    回傳分段：(開始, 結束, 在班人數, 休息人數, 是否在班別時段內)"""
+    events.sort(key=lambda e: e[0])
+    segments = []
+    on_shift = on_break = in_window = 0
+    i = 0
+    n = len(events)
+    while i < n:
+        t = events[i][0]
+        while i < n and events[i][0] == t:
+            _, d_shift, d_break, d_window = events[i]
+            on_shift += d_shift
+            on_break += d_break
+            in_window += d_window
+            i += 1
+        if i < n:
+            segments.append((t, events[i][0], on_shift, on_break, in_window > 0))
+    return segments
+
+
+def _segment_status(on_shift: int, on_break: int, template: dict) -> Optional[str]:
+    if on_shift < template["min_staff"]:
+        return "understaffed"
+    if on_shift - on_break < template["min_staff"]:
+        return "break_overlap"
+    if on_shift > template["max_staff"]:
+        return "overstaffed"
+    return None
+
+
+def compute_coverage(
+    conn,
+    from_date: date,
+    to_date: date,
+    tz_name: str,
+    bucket_minutes: int,
+    template_id: Optional[str] = None
+) -> dict:
+    tz = ZoneInfo(tz_name)
+    range_start = to_utc_naive(datetime.combine(from_date, time.min, tz))
+    range_end = to_utc_naive(datetime.combine(to_date + timedelta(days=1), time.min, tz))
+
+    def local(value: datetime) -> str:
+        return value.replace(tzinfo=timezone.utc).astimezone(tz).isoformat()
+
+    templates = _load_coverage_templates(conn, template_id)
+
+    # 前一天的跨日班也會落在查詢範圍內（走 idx_date_range）
+    sql = """
+        SELECT shift_template_id, date, start_at, end_at FROM schedule_assignments
+        WHERE date BETWEEN ? AND ? AND status != 'cancelled'
+    """
+    params = [(from_date - timedelta(days=1)).isoformat(), to_date.isoformat()]
+    if template_id:
+        sql += " AND shift_template_id = ?"
+        params.append(template_id)
+
+    events_by_template: Dict[str, List[tuple]] = defaultdict(list)
+    for row in conn.execute(sql, params):
+        template = templates.get(row["shift_template_id"])
+        if template is None:
+            continue
+        start = datetime.fromisoformat(str(row["start_at"]))
+        end = datetime.fromisoformat(str(row["end_at"]))
+        if end <= range_start or start >= range_end:
+            continue
+        events = events_by_template[template["id"]]
+        events.append((start, 1, 0, 0))
+        events.append((end, -1, 0, 0))
+
+        for break_start, break_end in shift_expansions.expand(template, date.fromisoformat(str(row["date"]))).breaks:
+            events.append((break_start, 0, 1, 0))
+            events.append((break_end, 0, -1, 0))
+
+    all_segments = []
+    template_results = []
+    for template in templates.values():
+        # 每天的班別時段，用於判斷沒有任何人排班的時段也算人力不足
+        slots = []
+        for day, interval in shift_expansions.expand_range(template, from_date - timedelta(days=1), to_date):
+            if interval.end_at > range_start and interval.start_at < range_end:
+                slots.append((max(interval.start_at, range_start), min(interval.end_at, range_end), day))
+
+        events = events_by_template.get(template["id"], [])
+        staff_events = list(events)
+        for slot_start, slot_end, _ in slots:
+            events.append((slot_start, 0, 0, 1))
+            events.append((slot_end, 0, 0, -1))
+        segments = sweep(events)
+        all_segments.extend(sweep(staff_events))
+
+        windows = {"understaffed": [], "overstaffed": [], "break_overlap": []}
+        peak_breaks = 0
+        slot_results = []
+        j = 0
+        for slot_start, slot_end, day in slots:
+            summary = {"min_headcount": None, "max_headcount": 0, "min_effective": None, "status": "ok"}
+            worst = None
+            # 班別時段彼此不重疊且依時間排序，分段指標只會往前移動
+            while j < len(segments) and segments[j][1] <= slot_start:
+                j += 1
+            k = j
+            while k < len(segments) and segments[k][0] < slot_end:
+                seg_start, seg_end, on_shift, on_break, _ = segments[k]
+                effective = on_shift - on_break
+                peak_breaks = max(peak_breaks, on_break)
+                summary["min_headcount"] = on_shift if summary["min_headcount"] is None else min(summary["min_headcount"], on_shift)
+                summary["max_headcount"] = max(summary["max_headcount"], on_shift)
+                summary["min_effective"] = effective if summary["min_effective"] is None else min(summary["min_effective"], effective)
+
+                status = _segment_status(on_shift, on_break, template)
+                if status:
+                    worst = worst or status
+                    current = windows[status]
+                    window_start = max(seg_start, slot_start)
+                    window_end = min(seg_end, slot_end)
+                    if current and current[-1]["_end"] == window_start:
+                        current[-1]["_end"] = window_end
+                        current[-1]["min_headcount"] = min(current[-1]["min_headcount"], on_shift)
+                        current[-1]["min_effective"] = min(current[-1]["min_effective"], effective)
+                        current[-1]["max_headcount"] = max(current[-1]["max_headcount"], on_shift)
+                    else:
+                        current.append({
+                            "_start": window_start,
+                            "_end": window_end,
+                            "min_headcount": on_shift,
+                            "max_headcount": on_shift,
+                            "min_effective": effective
+                        })
+                k += 1
+
+            if summary["min_headcount"] is None:
+                summary.update(min_headcount=0, min_effective=0)
+            if worst:
+                summary["status"] = worst
+            slot_results.append({
+                "date": day.isoformat(),
+                "start_at": local(slot_start),
+                "end_at": local(slot_end),
+                **summary
+            })
+
+        for items in windows.values():
+            for item in items:
+                item["start_at"] = local(item.pop("_start"))
+                item["end_at"] = local(item.pop("_end"))
+
+        template_results.append({
+            "shift_template_id": template["id"],
+            "name": template["name"],
+            "min_staff": template["min_staff"],
+            "max_staff": template["max_staff"],
+            "peak_concurrent_breaks": peak_breaks,
+            "slots": slot_results,
+            **windows
+        })
+
+    return {
+        "from_date": from_date.isoformat(),
+        "to_date": to_date.isoformat(),
+        "timezone": tz_name,
+        "bucket_minutes": bucket_minutes,
+        "templates": template_results,
+        "buckets": _bucketize(sweep_totals(all_segments), range_start, range_end, bucket_minutes, local)
+    }
+
+
+def sweep_totals(segments: List[tuple]) -> List[tuple]:
+    """把各班別的分段合併成全體的分段（再掃描一次）"""
+    events = []
+    for seg_start, seg_end, on_shift, on_break, _ in segments:
+        if on_shift or on_break:
+            events.append((seg_start, on_shift, on_break, 0))
+            events.append((seg_end, -on_shift, -on_break, 0))
+    return sweep(events)
+
+
+def _bucketize(segments, range_start, range_end, bucket_minutes, local) -> List[dict]:
+    """固定時間桶統計；分段與時間桶皆已排序，合併走訪 O(分段 + 時間桶)"""
+    size = timedelta(minutes=bucket_minutes)
+    buckets = []
+    j = 0
+    bucket_start = range_start
+    while bucket_start < range_end:
+        bucket_end = min(bucket_start + size, range_end)
+        low = None
+        high = 0
+        max_break = 0
+        weighted = 0.0
+        covered = timedelta(0)
+
+        while j < len(segments) and segments[j][1] <= bucket_start:
+            j += 1
+        k = j
+        while k < len(segments) and segments[k][0] < bucket_end:
+            seg_start, seg_end, on_shift, on_break, _ = segments[k]
+            overlap = min(seg_end, bucket_end) - max(seg_start, bucket_start)
+            effective = on_shift - on_break
+            low = effective if low is None else min(low, effective)
+            high = max(high, effective)
+            max_break = max(max_break, on_break)
+            weighted += effective * overlap.total_seconds()
+            covered += overlap
+            k += 1
+
+        # 桶內未被任何分段覆蓋的時間人數為 0
+        if covered < bucket_end - bucket_start:
+            low = 0
+        buckets.append({
+            "start_at": local(bucket_start),
+            "min_headcount": low or 0,
+            "max_headcount": high,
+            "avg_headcount": round(weighted / (bucket_end - bucket_start).total_seconds(), 2),
+            "max_on_break": max_break
+        })
+        bucket_start = bucket_end
+    return buckets
+
+
+@app.get("/api/v1/schedule-coverage")
+async def get_schedule_coverage(
+    from_date: date = Query(...),
+    to_date: date = Query(...),
+    timezone_name: str = Query("Asia/Taipei", alias="timezone"),
+    bucket_minutes: int = Query(30, ge=5, le=1440),
+    shift_template_id: Optional[str] = None,
+    token_data: dict = Depends(verify_token)
+):
+    """排班人力覆蓋率：各班別時段人數、人力不足 / 超額 / 休息重疊時段及固定時間桶統計"""
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to_date must not be before from_date")
+    if (to_date - from_date).days >= COVERAGE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be within {COVERAGE_MAX_DAYS} days")
+    try:
+        ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {timezone_name}")
+    return await db.run(
+        compute_coverage,
+        from_date,
+        to_date,
+        timezone_name,
+        bucket_minutes,
+        shift_template_id
+    )
@@ -0,0 +1,180 @@
+# 排班 CSV 匯入（格式見 public/templates/schedule_import_template.csv）
+# - 上傳檔案由 SpooledTemporaryFile 暫存，csv.reader 逐列讀取，不會整份載入記憶體
+# - 班別模板與成員在匯入開始時一次載入成查詢字典；時區無效的模板在載入時標記，引用的列回報為錯誤
+# - 每累積 SCHEDULE_IMPORT_BATCH_SIZE 列即做衝突檢測並寫入，回報每一行的錯誤；
+#   整份檔案在 db.run 的單一交易中寫入，最後才提交，匯入中途失敗不會留下部分資料
+# - 班別起訖由 backend-shift-expansion.py 的 shift_expansions 計算（月份區塊快取）
+# - 寫入後以 backend-leave-schedule-check.py 重新計算匯入日期範圍內的 pending 請假
+# 依賴 backend-schedule-batch-api.py 的 create_assignments_checked、backend-database.py 的 db
+# 與 backend-audit-log.py 的 audit_log_writer
+
+import os
+import io
+import csv
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import File, UploadFile
+
+SCHEDULE_IMPORT_BATCH_SIZE = int(os.getenv("SCHEDULE_IMPORT_BATCH_SIZE", "5000"))
+SCHEDULE_IMPORT_MAX_ERRORS = int(os.getenv("SCHEDULE_IMPORT_MAX_ERRORS", "1000"))
+
+SCHEDULE_IMPORT_HEADERS = ("member_id", "member_name", "date", "shift_template_id", "shift_template_name")
+
+
+def _load_import_lookups(conn):
+    """一次載入班別模板（依 ID 與名稱）、時區無效的模板 ID 及成員 ID"""
+    templates_by_id = {}
+    templates_by_name = {}
+    invalid_timezones = set()
+    for row in conn.execute("""
+        SELECT id, name, timezone, start_time, end_time, is_cross_day
+        FROM shift_templates WHERE is_active = 1
+    """):
+        template = shift_template_from_row(row)
+        templates_by_id[row["id"]] = template
+        templates_by_name[row["name"]] = template
+        try:
+            ZoneInfo(template["timezone"])
+        except (ZoneInfoNotFoundError, ValueError):
+            invalid_timezones.add(row["id"])
+
+    member_ids = {row[0] for row in conn.execute("SELECT id FROM users WHERE is_active = 1")}
+    return templates_by_id, templates_by_name, invalid_timezones, member_ids
+
+
+def import_schedule_csv(conn, stream, created_by: Optional[str], dry_run: bool = False) -> dict:
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    header = [column.strip() for column in next(reader, [])]
+    if tuple(header) != SCHEDULE_IMPORT_HEADERS:
+        raise ValueError(f"Invalid CSV header, expected: {','.join(SCHEDULE_IMPORT_HEADERS)}")
+
+    templates_by_id, templates_by_name, invalid_timezones, member_ids = _load_import_lookups(conn)
+    intervals: Dict[Tuple[str, str], ShiftInterval] = {}
+
+    total = 0
+    created = 0
+    error_count = 0
+    errors: List[dict] = []
+    batch: List[ScheduleAssignment] = []
+    batch_lines: List[int] = []
+    imported_days: List[date] = []
+
+    def add_error(line: int, message, **extra):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < SCHEDULE_IMPORT_MAX_ERRORS:
+            errors.append({"line": line, "error": message, **extra})
+
+    def flush():
+        nonlocal created
+        if not batch:
+            return
+        result = create_assignments_checked(conn, batch, created_by)
+        created += result["created"]
+        for error in result["errors"]:
+            add_error(
+                batch_lines[error["index"]],
+                error["error"],
+                **({"conflicts_with": error["conflicts_with"]} if "conflicts_with" in error else {})
+            )
+        batch.clear()
+        batch_lines.clear()
+
+    # 第 1 行為標題，資料從第 2 行開始
+    for line, values in enumerate(reader, start=2):
+        if not values or not any(v.strip() for v in values):
+            continue
+        total += 1
+        if len(values) != len(SCHEDULE_IMPORT_HEADERS):
+            add_error(line, f"Expected {len(SCHEDULE_IMPORT_HEADERS)} columns, got {len(values)}")
+            continue
+
+        member_id, _, day, template_id, template_name = (v.strip() for v in values)
+        if member_id not in member_ids:
+            add_error(line, f"Member not found: {member_id}")
+            continue
+
+        template = templates_by_id.get(template_id) or templates_by_name.get(template_name)
+        if template is None:
+            add_error(line, f"Shift template not found: {template_id or template_name}")
+            continue
+        if template["id"] in invalid_timezones:
+            add_error(line, f"Invalid timezone for shift template {template['id']}: {template['timezone']}")
+            continue
+
+        key = (template["id"], day)
+        interval = intervals.get(key)
+        if interval is None:
+            try:
+                shift_day = date.fromisoformat(day)
+            except ValueError:
+                add_error(line, f"Invalid date: {day}")
+                continue
+            interval = intervals[key] = shift_expansions.expand(template, shift_day)
+            imported_days.append(shift_day)
+
+        batch.append(ScheduleAssignment(
+            user_id=member_id,
+            shift_template_id=template["id"],
+            date=day,
+            start_at=interval.start_at,
+            end_at=interval.end_at,
+            timezone=template["timezone"]
+        ))
+        batch_lines.append(line)
+        if len(batch) >= SCHEDULE_IMPORT_BATCH_SIZE:
+            flush()
+
+    flush()
+    if dry_run:
+        conn.rollback()
+
+    return {
+        "total": total,
+        "created": 0 if dry_run else created,
+        "valid": created,
+        "error_count": error_count,
+        "errors": sorted(errors, key=lambda e: e["line"]),
+        "from_date": min(imported_days).isoformat() if imported_days else None,
+        "to_date": max(imported_days).isoformat() if imported_days else None,
+        "dry_run": dry_run
+    }
+
+
+@app.post("/api/v1/schedule-assignments/import")
+async def import_schedule_assignments(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    token_data: dict = Depends(verify_token)
+):
+    """匯入排班 CSV；dry_run=true 時只驗證不寫入"""
+    try:
+        result = await db.run(import_schedule_csv, file.file, token_data.get("user_id"), dry_run)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+    # 新排班可能改變 pending 請假涵蓋的班別，重新計算匯入日期範圍內的申請
+    if result["created"]:
+        await audit_log_writer.record(
+            token_data, "import", "schedule_assignment",
+            new_values={
+                "filename": file.filename,
+                "created": result["created"],
+                "from_date": result["from_date"],
+                "to_date": result["to_date"]
+            }
+        )
+        revalidation = await db.run(
+            revalidate_pending_leave_requests,
+            result["from_date"],
+            result["to_date"],
+            token_data.get("user_id")
+        )
+        result["leave_revalidation"] = {
+            "checked": revalidation["checked"],
+            "changed": revalidation["changed"]
+        }
+    return result
@@ -0,0 +1,143 @@
+# 排班查詢分頁基準測試：OFFSET 分頁 vs keyset 分頁
+# 在暫存 SQLite 資料庫建立數百萬列的 schedule_assignments（含 idx_user_date / idx_date_range），
+# 印出查詢計畫並比較深層分頁的耗時
+#
+# 用法：python backend-schedule-keyset-benchmark.py [列數] [使用者數]
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import importlib.util
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+spec = importlib.util.spec_from_file_location("schedule_query", os.path.join(HERE, "backend-schedule-query.py"))
+schedule_query = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(schedule_query)
+
+
+def create_table(conn):
+    conn.executescript("""
+        CREATE TABLE schedule_assignments (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            shift_template_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            start_at TEXT NOT NULL,
+            end_at TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            timezone TEXT DEFAULT 'Asia/Taipei',
+            created_by TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, start_at, end_at)
+        );
+        CREATE INDEX idx_user_date ON schedule_assignments (user_id, date);
+        CREATE INDEX idx_date_range ON schedule_assignments (date, start_at, end_at);
+    """)
+
+
+def populate(conn, rows: int, users: int):
+    shifts = [(9, 8), (14, 8), (22, 8)]
+    first_day = date(2020, 1, 1)
+
+    def generate():
+        for n in range(rows):
+            user = n % users
+            day = first_day + timedelta(days=n // users)
+            start_hour, hours = shifts[(user + n // users) % len(shifts)]
+            start_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=start_hour)
+            yield (
+                f"a{n:09d}",
+                f"u{user:05d}",
+                f"t{(user + n // users) % len(shifts)}",
+                day.isoformat(),
+                start_at.isoformat(sep=" "),
+                (start_at + timedelta(hours=hours)).isoformat(sep=" ")
+            )
+
+    conn.executemany("""
+        INSERT INTO schedule_assignments (id, user_id, shift_template_id, date, start_at, end_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, generate())
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def explain(conn, sql, params):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return "; ".join(row[3] for row in plan)
+
+
+def timed(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    limit = 500
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.row_factory = sqlite3.Row
+        create_table(conn)
+
+        started = time.perf_counter()
+        populate(conn, rows, users)
+        print(f"建立 {rows:,} 列（{users} 位使用者）耗時 {time.perf_counter() - started:.1f}s")
+
+        last_day = (date(2020, 1, 1) + timedelta(days=(rows - 1) // users)).isoformat()
+        month_from = (date.fromisoformat(last_day) - timedelta(days=30)).isoformat()
+        fields = schedule_query.SCHEDULE_DEFAULT_FIELDS
+
+        scenarios = [
+            ("整個團隊一個月", {"from_date": month_from, "to_date": last_day}),
+            ("單一使用者全部期間", {"user_id": "u00007", "from_date": "2020-01-01", "to_date": last_day}),
+        ]
+
+        for title, filters in scenarios:
+            print(f"\n== {title} ==")
+            sql, params = schedule_query.build_schedule_query(fields, limit=limit, **filters)
+            print("查詢計畫:", explain(conn, sql, params))
+
+            # 走訪所有頁面；結束時 cursor 為取得最後一頁所用的 cursor（只有一頁時為 None）
+            cursor = None
+            pages = 0
+            while True:
+                page = schedule_query.fetch_schedule_page(conn, limit=limit, cursor=cursor, **filters)
+                pages += 1
+                if not page["next_cursor"]:
+                    break
+                cursor = page["next_cursor"]
+
+            first_ms = timed(lambda: schedule_query.fetch_schedule_page(conn, limit=limit, **filters))
+            print(f"頁數: {pages}（每頁 {limit} 列）")
+            print(f"第一頁: {first_ms:.2f} ms")
+            if cursor is None:
+                print("只有一頁，略過最後一頁的 OFFSET / keyset 比較")
+                continue
+
+            deep_cursor = cursor
+            offset_sql = sql.replace("LIMIT ?", "LIMIT ? OFFSET ?")
+            offset_params = [*params[:-1], limit, (pages - 1) * limit]
+            offset_ms = timed(lambda: conn.execute(offset_sql, offset_params).fetchall())
+            keyset_ms = timed(lambda: schedule_query.fetch_schedule_page(
+                conn, limit=limit, cursor=deep_cursor, **filters
+            ))
+            print(f"最後一頁 OFFSET: {offset_ms:.2f} ms")
+            print(f"最後一頁 keyset: {keyset_ms:.2f} ms")
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
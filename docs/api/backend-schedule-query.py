@@ -0,0 +1,116 @@
+# 排班指派範圍查詢：keyset（cursor）分頁與欄位投影
+# 排序鍵為 (date, start_at, id)，下一頁從上一頁最後一列之後開始，
+# 查詢成本與頁數無關（不使用 OFFSET）
+# - 指定 user_id 時走 idx_user_date (user_id, date)
+# - 未指定 user_id 時走 idx_date_range (date, start_at, end_at)
+# 本檔不依賴 FastAPI，backend-schedule-keyset-benchmark.py 直接載入使用
+
+import json
+import base64
+from typing import List, Optional, Sequence
+
+SCHEDULE_PAGE_DEFAULT_LIMIT = 500
+SCHEDULE_PAGE_MAX_LIMIT = 5000
+
+SCHEDULE_FIELDS = (
+    "id", "user_id", "shift_template_id", "date", "start_at", "end_at",
+    "status", "timezone", "created_by", "created_at", "updated_at"
+)
+SCHEDULE_DEFAULT_FIELDS = (
+    "id", "user_id", "shift_template_id", "date", "start_at", "end_at", "status", "timezone"
+)
+# 產生下一頁 cursor 所需的欄位，查詢時一律包含
+SCHEDULE_CURSOR_FIELDS = ("date", "start_at", "id")
+
+
+def encode_cursor(row) -> str:
+    payload = json.dumps([str(row["date"]), str(row["start_at"]), str(row["id"])])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 3:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str]) -> Sequence[str]:
+    if not fields:
+        return SCHEDULE_DEFAULT_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in SCHEDULE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def build_schedule_query(
+    fields: Sequence[str],
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[List[str]] = None,
+    limit: int = SCHEDULE_PAGE_DEFAULT_LIMIT
+):
+    """回傳 (sql, params)；多取一列用以判斷是否還有下一頁"""
+    columns = list(dict.fromkeys([*fields, *SCHEDULE_CURSOR_FIELDS]))
+    where = []
+    params: list = []
+
+    if user_id:
+        where.append("user_id = ?")
+        params.append(user_id)
+    if from_date:
+        where.append("date >= ?")
+        params.append(from_date)
+    if to_date:
+        where.append("date <= ?")
+        params.append(to_date)
+    if cursor:
+        cursor_date, cursor_start, cursor_id = cursor
+        # 展開成 date >= ? 加上 OR 條件，讓最前面的 date 範圍條件可以使用索引
+        where.append("date >= ?")
+        where.append("(date > ? OR start_at > ? OR (start_at = ? AND id > ?))")
+        params.extend([cursor_date, cursor_date, cursor_start, cursor_start, cursor_id])
+
+    sql = f"SELECT {', '.join(columns)} FROM schedule_assignments"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY date, start_at, id LIMIT ?"
+    params.append(limit + 1)
+    return sql, params
+
+
+def fetch_schedule_page(
+    conn,
+    fields: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = SCHEDULE_PAGE_DEFAULT_LIMIT
+) -> dict:
+    selected = parse_fields(fields)
+    limit = max(1, min(limit, SCHEDULE_PAGE_MAX_LIMIT))
+    sql, params = build_schedule_query(
+        selected,
+        from_date,
+        to_date,
+        user_id,
+        decode_cursor(cursor) if cursor else None,
+        limit
+    )
+    rows = conn.execute(sql, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "assignments": [{field: row[field] for field in selected} for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+        "limit": limit
+    }
@@ -0,0 +1,169 @@
+# 班別展開快取：班別模板 + 日期 → UTC 起訖（含休息時段）
+# - 以 (班別, 時區, 年, 月) 為單位一次預先計算整個月，之後同月份的查詢只是取陣列
+# - 快取鍵包含班別的時間設定指紋，模板修改後即使其他 worker 尚未收到失效通知，
+#   從資料庫重新載入的模板也不會命中舊的區塊；本 worker 的修改則由 invalidate() 立即清除
+# - 夏令時間：不存在的牆上時間（春季跳過的一小時）依 zoneinfo 規則往後順延，
+#   重複的牆上時間（秋季重複的一小時）取第一次出現的時間
+# 回傳的時間皆為 UTC（不帶時區），與 backend-schedule-batch-api.py 的 to_utc_naive 一致
+# 被 backend-schedule-import-api.py、backend-schedule-coverage-api.py 及請假衝突檢查共用
+
+import os
+import json
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+SHIFT_EXPANSION_MAX_BLOCKS = int(os.getenv("SHIFT_EXPANSION_MAX_BLOCKS", "5000"))
+DEFAULT_SHIFT_TIMEZONE = "Asia/Taipei"
+
+
+class ShiftInterval(NamedTuple):
+    start_at: datetime
+    end_at: datetime
+    breaks: Tuple[Tuple[datetime, datetime], ...]
+
+
+def parse_shift_breaks(raw) -> List[Tuple[time, time]]:
+    """breaks 格式：[{"start": "12:00", "end": "13:00"}]（班別時區的牆上時間）"""
+    if not raw:
+        return []
+    items = json.loads(raw) if isinstance(raw, str) else raw
+    result = []
+    for item in items:
+        start = item.get("start") or item.get("start_time")
+        end = item.get("end") or item.get("end_time")
+        if start and end:
+            result.append((time.fromisoformat(start), time.fromisoformat(end)))
+    return result
+
+
+def shift_template_from_row(row) -> dict:
+    """shift_templates 資料列 → 展開用的模板字典"""
+    keys = row.keys()
+    template = {
+        "id": row["id"],
+        "name": row["name"],
+        "timezone": row["timezone"] or DEFAULT_SHIFT_TIMEZONE,
+        "start_time": time.fromisoformat(str(row["start_time"])),
+        "end_time": time.fromisoformat(str(row["end_time"])),
+        "is_cross_day": bool(row["is_cross_day"]),
+        "breaks": parse_shift_breaks(row["breaks"]) if "breaks" in keys else []
+    }
+    for column in ("min_staff", "max_staff"):
+        if column in keys:
+            template[column] = row[column]
+    return template
+
+
+def _utc(day: date, wall: time, tz: ZoneInfo) -> datetime:
+    return datetime.combine(day, wall, tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def expand_shift_day(template: dict, day: date, tz: ZoneInfo) -> ShiftInterval:
+    """不經快取計算單日的班別起訖與休息時段"""
+    start_at = _utc(day, template["start_time"], tz)
+    end_day = day
+    if template["is_cross_day"] or template["end_time"] <= template["start_time"]:
+        end_day = day + timedelta(days=1)
+    end_at = _utc(end_day, template["end_time"], tz)
+
+    breaks = []
+    for break_start, break_end in template.get("breaks", ()):
+        # 早於班別開始時間的休息屬於跨日後的隔天
+        break_day = day if break_start >= template["start_time"] else day + timedelta(days=1)
+        break_end_day = break_day if break_end > break_start else break_day + timedelta(days=1)
+        utc_start = _utc(break_day, break_start, tz)
+        # 整段落在春季跳過的一小時內時，順延後的開始會晚於結束，視為零長度
+        breaks.append((utc_start, max(utc_start, _utc(break_end_day, break_end, tz))))
+    return ShiftInterval(start_at, end_at, tuple(breaks))
+
+
+def _template_fingerprint(template: dict) -> tuple:
+    return (
+        template["start_time"],
+        template["end_time"],
+        template["is_cross_day"],
+        tuple(template.get("breaks", ()))
+    )
+
+
+class ShiftExpansionCache:
+    """以月份為區塊的 LRU 快取；在 db.run 的執行緒中使用，需加鎖"""
+
+    def __init__(self, max_blocks: int = SHIFT_EXPANSION_MAX_BLOCKS):
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[tuple, List[ShiftInterval]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _block(self, template: dict, tz_name: str, year: int, month: int) -> List[ShiftInterval]:
+        key = (template["id"], _template_fingerprint(template), tz_name, year, month)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return block
+            self.misses += 1
+
+        tz = ZoneInfo(tz_name)
+        days = calendar.monthrange(year, month)[1]
+        block = [expand_shift_day(template, date(year, month, d), tz) for d in range(1, days + 1)]
+
+        with self._lock:
+            self._blocks[key] = block
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return block
+
+    def expand(self, template: dict, day: date, tz_name: Optional[str] = None) -> ShiftInterval:
+        """tz_name 省略時使用模板的時區（排班可另外指定時區）"""
+        block = self._block(template, tz_name or template["timezone"], day.year, day.month)
+        return block[day.day - 1]
+
+    def expand_range(
+        self,
+        template: dict,
+        from_date: date,
+        to_date: date,
+        tz_name: Optional[str] = None
+    ) -> Iterator[Tuple[date, ShiftInterval]]:
+        day = from_date
+        while day <= to_date:
+            block = self._block(template, tz_name or template["timezone"], day.year, day.month)
+            last = min(to_date, date(day.year, day.month, len(block)))
+            for d in range(day.day, last.day + 1):
+                yield date(day.year, day.month, d), block[d - 1]
+            day = last + timedelta(days=1)
+
+    def invalidate(self, template_id: Optional[str] = None):
+        """班別模板修改或刪除時呼叫；省略 template_id 則清空全部"""
+        with self._lock:
+            if template_id is None:
+                self._blocks.clear()
+                return
+            for key in [k for k in self._blocks if k[0] == template_id]:
+                del self._blocks[key]
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "blocks": len(self._blocks),
+            "max_blocks": self.max_blocks,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+shift_expansions = ShiftExpansionCache()
+
+
+@app.get("/api/v1/shift-templates/expansion-metrics")
+async def get_shift_expansion_metrics(token_data: dict = Depends(verify_token)):
+    """班別展開快取命中率"""
+    return shift_expansions.stats()
@@ -1,13 +1,19 @@
 # 後端系統設定 API 實作範例
+# 資料庫存取透過共用模組 db（見 backend-database.py）
 
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import time
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 from typing import Optional
-import sqlite3
 from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/system", tags=["system"])
 
+# 每個 worker 最多每隔幾秒向資料庫確認一次設定版本（跨 worker 失效）
+SETTINGS_VERSION_CHECK_INTERVAL = float(os.getenv("SETTINGS_VERSION_CHECK_INTERVAL", "1"))
+
 class SystemSettings(BaseModel):
     siteName: str = "HRM 管理系統"
     defaultLanguage: str = "zh-TW"
@@ -26,120 +32,178 @@ class SystemStats(BaseModel):
     diskUsage: str
     memoryUsage: str
 
+def _row_to_settings(row) -> SystemSettings:
+    return SystemSettings(
+        siteName=row[1],
+        defaultLanguage=row[2],
+        timezone=row[3],
+        debugMode=bool(row[4]),
+        maxLoginAttempts=row[5],
+        sessionTimeout=row[6],
+        emailNotifications=bool(row[7]),
+        maintenanceMode=bool(row[8])
+    )
+
+def _load_settings_if_changed(conn, known_version: Optional[int]):
+    """版本未變時只讀取版本號；有變動才讀取整筆設定"""
+    row = conn.execute("SELECT version FROM system_settings_version WHERE id = 1").fetchone()
+    version = row[0] if row else 0
+    if version == known_version:
+        return version, None, False
+
+    row = conn.execute("SELECT * FROM system_settings ORDER BY id DESC LIMIT 1").fetchone()
+    # 返回預設設定
+    settings = _row_to_settings(row) if row else SystemSettings()
+    return version, settings, True
+
+class SettingsCache:
+    """行程內的系統設定快取，以單調遞增的版本號產生 ETag"""
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.settings: Optional[SystemSettings] = None
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def etag(self) -> str:
+        return f'"settings-v{self.version}"'
+
+    async def get(self):
+        if self.settings is not None and time.monotonic() - self.checked_at < SETTINGS_VERSION_CHECK_INTERVAL:
+            return self.settings, self.etag
+
+        async with self._lock:
+            if self.settings is None or time.monotonic() - self.checked_at >= SETTINGS_VERSION_CHECK_INTERVAL:
+                version, settings, changed = await db.run(_load_settings_if_changed, self.version)
+                if changed:
+                    self.version = version
+                    self.settings = settings
+                self.checked_at = time.monotonic()
+            return self.settings, self.etag
+
+    async def save(self, settings: SystemSettings) -> str:
+        """寫入設定並遞增版本；與 get 的重新載入共用鎖，較舊的讀取結果不會覆蓋剛寫入的設定"""
+        async with self._lock:
+            self.version = await db.run(_save_system_settings, settings)
+            self.settings = settings
+            self.checked_at = time.monotonic()
+            return self.etag
+
+settings_cache = SettingsCache()
+
 @router.get("/settings", response_model=SystemSettings)
-async def get_system_settings():
-    """獲取系統設定"""
+async def get_system_settings(request: Request, response: Response):
+    """獲取系統設定（支援 If-None-Match，未變更時回傳 304）"""
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM system_settings ORDER BY id DESC LIMIT 1")
-        row = cursor.fetchone()
-        
-        if row:
-            return SystemSettings(
-                siteName=row[1],
-                defaultLanguage=row[2],
-                timezone=row[3],
-                debugMode=bool(row[4]),
-                maxLoginAttempts=row[5],
-                sessionTimeout=row[6],
-                emailNotifications=bool(row[7]),
-                maintenanceMode=bool(row[8])
-            )
-        else:
-            # 返回預設設定
-            return SystemSettings()
-            
+        settings, etag = await settings_cache.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return settings
+
+def _save_system_settings(conn, settings: SystemSettings):
+    cursor = conn.cursor()
+
+    # 檢查是否已有設定記錄
+    cursor.execute("SELECT COUNT(*) FROM system_settings")
+    count = cursor.fetchone()[0]
+
+    if count > 0:
+        # 更新現有記錄
+        cursor.execute("""
+            UPDATE system_settings SET
+                site_name = ?,
+                default_language = ?,
+                timezone = ?,
+                debug_mode = ?,
+                max_login_attempts = ?,
+                session_timeout = ?,
+                email_notifications = ?,
+                maintenance_mode = ?,
+                updated_at = ?
+            WHERE id = (SELECT MAX(id) FROM system_settings)
+        """, (
+            settings.siteName,
+            settings.defaultLanguage,
+            settings.timezone,
+            settings.debugMode,
+            settings.maxLoginAttempts,
+            settings.sessionTimeout,
+            settings.emailNotifications,
+            settings.maintenanceMode,
+            datetime.now()
+        ))
+    else:
+        # 插入新記錄
+        cursor.execute("""
+            INSERT INTO system_settings (
+                site_name, default_language, timezone, debug_mode,
+                max_login_attempts, session_timeout, email_notifications,
+                maintenance_mode, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            settings.siteName,
+            settings.defaultLanguage,
+            settings.timezone,
+            settings.debugMode,
+            settings.maxLoginAttempts,
+            settings.sessionTimeout,
+            settings.emailNotifications,
+            settings.maintenanceMode,
+            datetime.now(),
+            datetime.now()
+        ))
+
+    # 遞增設定版本，其他 worker 於下次版本檢查時重新載入
+    cursor.execute("""
+        INSERT INTO system_settings_version (id, version, updated_at) VALUES (1, 1, ?)
+        ON CONFLICT(id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    """, (datetime.now(),))
+    cursor.execute("SELECT version FROM system_settings_version WHERE id = 1")
+    return cursor.fetchone()[0]
 
 @router.put("/settings", response_model=SystemSettings)
-async def update_system_settings(settings: SystemSettings):
+async def update_system_settings(settings: SystemSettings, response: Response):
     """更新系統設定"""
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
-        # 檢查是否已有設定記錄
-        cursor.execute("SELECT COUNT(*) FROM system_settings")
-        count = cursor.fetchone()[0]
-        
-        if count > 0:
-            # 更新現有記錄
-            cursor.execute("""
-                UPDATE system_settings SET
-                    site_name = ?,
-                    default_language = ?,
-                    timezone = ?,
-                    debug_mode = ?,
-                    max_login_attempts = ?,
-                    session_timeout = ?,
-                    email_notifications = ?,
-                    maintenance_mode = ?,
-                    updated_at = ?
-                WHERE id = (SELECT MAX(id) FROM system_settings)
-            """, (
-                settings.siteName,
-                settings.defaultLanguage,
-                settings.timezone,
-                settings.debugMode,
-                settings.maxLoginAttempts,
-                settings.sessionTimeout,
-                settings.emailNotifications,
-                settings.maintenanceMode,
-                datetime.now()
-            ))
-        else:
-            # 插入新記錄
-            cursor.execute("""
-                INSERT INTO system_settings (
-                    site_name, default_language, timezone, debug_mode,
-                    max_login_attempts, session_timeout, email_notifications,
-                    maintenance_mode, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                settings.siteName,
-                settings.defaultLanguage,
-                settings.timezone,
-                settings.debugMode,
-                settings.maxLoginAttempts,
-                settings.sessionTimeout,
-                settings.emailNotifications,
-                settings.maintenanceMode,
-                datetime.now(),
-                datetime.now()
-            ))
-        
-        conn.commit()
+        response.headers["ETag"] = await settings_cache.save(settings)
         return settings
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+
+def _load_system_stats(conn):
+    cursor = conn.cursor()
+
+    # 獲取使用者統計
+    cursor.execute("SELECT COUNT(*) FROM users")
+    total_users = cursor.fetchone()[0]
+
+    cursor.execute("SELECT COUNT(*) FROM users WHERE last_login > datetime('now', '-24 hours')")
+    active_users = cursor.fetchone()[0]
+
+    # 獲取最後備份時間
+    cursor.execute("SELECT created_at FROM system_backups ORDER BY created_at DESC LIMIT 1")
+    backup_row = cursor.fetchone()
+    last_backup = backup_row[0] if backup_row else "未知"
+
+    return total_users, active_users, last_backup
 
 @router.get("/stats", response_model=SystemStats)
 async def get_system_stats():
     """獲取系統統計"""
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
-        # 獲取使用者統計
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users WHERE last_login > datetime('now', '-24 hours')")
-        active_users = cursor.fetchone()[0]
-        
-        # 獲取最後備份時間
-        cursor.execute("SELECT created_at FROM system_backups ORDER BY created_at DESC LIMIT 1")
-        backup_row = cursor.fetchone()
-        last_backup = backup_row[0] if backup_row else "未知"
-        
+        total_users, active_users, last_backup = await db.run(_load_system_stats)
+
         return SystemStats(
             totalUsers=total_users,
             activeUsers=active_users,
@@ -148,33 +212,24 @@ async def get_system_stats():
             diskUsage="45%",  # 實際應該檢查磁碟使用率
             memoryUsage="68%"  # 實際應該檢查記憶體使用率
         )
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @router.post("/backup")
 async def create_backup():
     """建立系統備份"""
     try:
-        conn = sqlite3.connect("hrm.db")
-        cursor = conn.cursor()
-        
         # 記錄備份
-        cursor.execute("""
+        result = await db.execute("""
             INSERT INTO system_backups (backup_path, created_at)
             VALUES (?, ?)
         """, (f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db", datetime.now()))
-        
-        conn.commit()
-        
+
         # 實際備份邏輯應該在這裡實作
         # 例如：複製資料庫檔案、壓縮等
-        
-        return {"message": "備份建立成功", "backup_id": cursor.lastrowid}
-        
+
+        return {"message": "備份建立成功", "backup_id": result.lastrowid}
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
\ No newline at end of file
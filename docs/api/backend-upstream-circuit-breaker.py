@@ -0,0 +1,159 @@
+# 上游 API 斷路器 (Circuit Breaker) 與最後一次成功結果
+# 每個 Brand 一個斷路器：連續失敗達門檻後開啟，期間不再呼叫上游，
+# 退避時間到後進入半開狀態，只放行一個探測請求；成功即關閉，失敗則加倍退避
+# 斷路器開啟時，API 回傳最後一次成功的快照並標示為過期 (stale)；
+# 未達失敗門檻但快照已超過 AGENT_STATUS_STALE_AFTER 秒未成功更新時也標示為過期
+# 只有連線錯誤、逾時與上游 5xx 計入失敗；4xx 與找不到 Brand 原樣拋出，不影響斷路器
+
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import httpx
+
+UPSTREAM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_FAILURE_THRESHOLD", "3"))
+UPSTREAM_BREAKER_BASE_BACKOFF = float(os.getenv("UPSTREAM_BREAKER_BASE_BACKOFF", "5"))
+UPSTREAM_BREAKER_MAX_BACKOFF = float(os.getenv("UPSTREAM_BREAKER_MAX_BACKOFF", "300"))
+# 快照距最後一次成功取得超過此秒數即視為過期（需大於輪詢間隔與快取 TTL）
+AGENT_STATUS_STALE_AFTER = float(os.getenv("AGENT_STATUS_STALE_AFTER", "60"))
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，未呼叫上游"""
+
+    def __init__(self, brand_id: str, retry_after: float):
+        super().__init__(f"Upstream circuit open for brand {brand_id}, retry after {retry_after:.0f}s")
+        self.brand_id = brand_id
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """連線錯誤、逾時與上游 5xx 才算上游故障；請求本身的錯誤（4xx、Brand 不存在）不算"""
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, brand_id: str):
+        self.brand_id = brand_id
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = UPSTREAM_BREAKER_BASE_BACKOFF
+        self.opened_at = 0.0
+        self._probing = False
+        self.last_error: Optional[str] = None
+        self.last_success_at: Optional[datetime] = None
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.backoff - time.monotonic())
+
+    def _allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def _record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = UPSTREAM_BREAKER_BASE_BACKOFF
+        self._probing = False
+        self.last_error = None
+        self.last_success_at = datetime.utcnow()
+
+    def _record_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = str(error)
+        if self.state == self.HALF_OPEN:
+            # 探測失敗：重新開啟並加倍退避
+            self.backoff = min(self.backoff * 2, UPSTREAM_BREAKER_MAX_BACKOFF)
+            self._open()
+        elif self.failures >= UPSTREAM_BREAKER_FAILURE_THRESHOLD:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+    async def call(self, func: Callable[[], Awaitable]):
+        if not self._allow():
+            raise CircuitOpenError(self.brand_id, self.retry_after())
+        try:
+            result = await func()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._record_failure(e)
+            else:
+                # 上游有回應或根本未呼叫上游：不改變狀態，只釋放探測名額
+                self._probing = False
+            raise
+        except BaseException:
+            # 呼叫被取消：不計入失敗，但釋放探測名額，否則半開狀態永遠不會再放行
+            self._probing = False
+            raise
+        self._record_success()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": round(self.retry_after(), 1) if self.state != self.CLOSED else 0,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at
+        }
+
+
+upstream_breakers: Dict[str, CircuitBreaker] = {}
+
+# key: (brand_id, workspace_id)，值為 {"agents": [...], "fetched_at": datetime}
+agent_status_last_good: Dict[Tuple[str, str], dict] = {}
+
+
+def get_upstream_breaker(brand_id: str) -> CircuitBreaker:
+    breaker = upstream_breakers.get(brand_id)
+    if breaker is None:
+        breaker = upstream_breakers[brand_id] = CircuitBreaker(brand_id)
+    return breaker
+
+
+async def fetch_agent_status_guarded(brand_id: str, workspace_id: str) -> dict:
+    """經過斷路器呼叫上游，成功時更新最後一次成功的快照"""
+    breaker = get_upstream_breaker(brand_id)
+    agents = await breaker.call(lambda: fetch_agent_status(brand_id, workspace_id))
+    snapshot = {"agents": agents, "fetched_at": datetime.utcnow()}
+    agent_status_last_good[(brand_id, workspace_id)] = snapshot
+    return snapshot
+
+
+def with_staleness(snapshot: dict, brand_id: str, stale: Optional[bool] = None) -> dict:
+    """附加 stale 與 age（秒）；未指定時依 Brand 斷路器是否關閉，
+    以及快照距最後一次成功取得是否超過 AGENT_STATUS_STALE_AFTER 判斷"""
+    age = (datetime.utcnow() - snapshot["fetched_at"]).total_seconds()
+    if stale is None:
+        stale = not get_upstream_breaker(brand_id).is_closed or age > AGENT_STATUS_STALE_AFTER
+    return {**snapshot, "stale": stale, "age": age}
+
+
+@app.get("/api/v1/agent-status/breakers")
+async def get_upstream_breakers(token_data: dict = Depends(verify_token)):
+    """各 Brand 上游斷路器狀態"""
+    return {brand_id: breaker.stats() for brand_id, breaker in upstream_breakers.items()}
@@ -0,0 +1,122 @@
+# 上游 API (CXGenie) 共用連線池
+# 與 backend-complete-api.py / backend-brand-agent-api.py 載入同一個 app，
+# 所有對上游的呼叫都透過 upstream_pool，避免每次請求重新建立 TCP + TLS 連線
+
+import os
+import asyncio
+from typing import Dict, Optional
+import httpx
+
+# 連線池設定（可透過環境變數調整）
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "10"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要安裝 h2 套件 (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamClientPool:
+    """每個 Brand 一個長連線 AsyncClient，app 生命週期內共用"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._lock = asyncio.Lock()
+        self._http2 = UPSTREAM_HTTP2 and _http2_available()
+        self._closed = True
+
+    def _build_client(self, base_url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            http2=self._http2,
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            headers={"Accept": "application/json"}
+        )
+
+    async def open(self):
+        self._closed = False
+
+    async def get_client(self, brand_id: str, base_url: str) -> httpx.AsyncClient:
+        """取得 Brand 的連線，不存在或 api_url 變更時才建立"""
+        if self._closed:
+            raise RuntimeError("Upstream client pool is closed")
+
+        client = self._clients.get(brand_id)
+        if client is not None and not client.is_closed and client.base_url == httpx.URL(base_url):
+            return client
+
+        async with self._lock:
+            client = self._clients.get(brand_id)
+            if client is not None and not client.is_closed and client.base_url == httpx.URL(base_url):
+                return client
+            if client is not None:
+                await client.aclose()
+            client = self._build_client(base_url)
+            self._clients[brand_id] = client
+            return client
+
+    async def request(
+        self,
+        brand_id: str,
+        base_url: str,
+        method: str,
+        path: str,
+        token: Optional[str] = None,
+        **kwargs
+    ) -> httpx.Response:
+        client = await self.get_client(brand_id, base_url)
+        headers = kwargs.pop("headers", {}) or {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return await client.request(method, path, headers=headers, **kwargs)
+
+    async def get(
+        self,
+        brand_id: str,
+        base_url: str,
+        path: str,
+        token: Optional[str] = None,
+        params: Optional[dict] = None
+    ) -> httpx.Response:
+        return await self.request(brand_id, base_url, "GET", path, token, params=params)
+
+    async def close_brand(self, brand_id: str):
+        """Brand 更新或刪除時釋放其連線"""
+        async with self._lock:
+            client = self._clients.pop(brand_id, None)
+        if client is not None:
+            await client.aclose()
+
+    async def close(self):
+        self._closed = True
+        async with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+upstream_pool = UpstreamClientPool()
+
+
+@app.on_event("startup")
+async def open_upstream_pool():
+    await upstream_pool.open()
+
+
+@app.on_event("shutdown")
+async def close_upstream_pool():
+    await upstream_pool.close()
@@ -0,0 +1,69 @@
+# backend-notice-index.py 的 NoticeIndex 回歸測試（python -m pytest docs/api/test_notice_index.py）
+# 片段檔名含連字號且依賴主程式的 app，只載入 NoticeIndex 本身（notice_index 單例之前的部分）
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_source = (Path(__file__).with_name("backend-notice-index.py")).read_text(encoding="utf-8")
+_namespace: dict = {}
+exec(compile(_source.split("notice_index = NoticeIndex()")[0], "backend-notice-index.py", "exec"), _namespace)
+NoticeIndex = _namespace["NoticeIndex"]
+
+NOW = datetime(2024, 1, 15, 10, 0)
+
+
+def _notice(notice_id, starts_at, ends_at, scope=None):
+    return {
+        "id": notice_id,
+        "title": notice_id,
+        "content": "",
+        "scope": scope or {},
+        "starts_at": starts_at,
+        "ends_at": ends_at,
+        "require_ack": False,
+        "is_active": True
+    }
+
+
+def _visible_ids(index, at, audience=(("role", "Agent"),), scope_filter=None):
+    return {notice["id"] for notice in index.visible(audience, scope_filter, now=at)}
+
+
+def test_rescheduled_notice_does_not_block_later_expiry():
+    index = NoticeIndex()
+    index.upsert(_notice("A", NOW + timedelta(minutes=30), NOW + timedelta(hours=3)), now=NOW)
+    index.upsert(_notice("B", NOW - timedelta(hours=1), NOW + timedelta(hours=1)), now=NOW)
+    # A 改到明天：舊的 starts_at 格子仍在時間輪中
+    index.upsert(_notice("A", NOW + timedelta(days=1), NOW + timedelta(days=1, hours=3)), now=NOW)
+
+    assert _visible_ids(index, NOW + timedelta(minutes=31)) == {"B"}
+    assert _visible_ids(index, NOW + timedelta(hours=1, minutes=30)) == set()
+    assert _visible_ids(index, NOW + timedelta(days=1, minutes=1)) == {"A"}
+
+
+def test_notice_starting_later_in_current_slot_is_requeued():
+    index = NoticeIndex(resolution=3600)
+    starts_at = NOW + timedelta(minutes=20)
+    index.upsert(_notice("A", starts_at, NOW + timedelta(hours=5)), now=NOW)
+
+    assert _visible_ids(index, NOW + timedelta(minutes=10)) == set()
+    assert _visible_ids(index, NOW + timedelta(minutes=21)) == {"A"}
+
+
+def test_notice_expiring_later_in_current_slot_is_requeued():
+    index = NoticeIndex(resolution=3600)
+    index.upsert(_notice("A", NOW - timedelta(hours=1), NOW + timedelta(minutes=5, seconds=30)), now=NOW)
+
+    assert _visible_ids(index, NOW + timedelta(minutes=1)) == {"A"}
+    assert _visible_ids(index, NOW + timedelta(minutes=6)) == set()
+    assert _visible_ids(index, NOW + timedelta(hours=2)) == set()
+
+
+def test_scope_filter_keeps_global_notices():
+    index = NoticeIndex()
+    index.upsert(_notice("global", NOW - timedelta(hours=1), NOW + timedelta(hours=1)), now=NOW)
+    index.upsert(_notice("brand", NOW - timedelta(hours=1), NOW + timedelta(hours=1), {"brands": ["b1"]}), now=NOW)
+    index.upsert(_notice("other", NOW - timedelta(hours=1), NOW + timedelta(hours=1), {"brands": ["b2"]}), now=NOW)
+
+    audience = {("brand", "b1"), ("brand", "b2")}
+    assert _visible_ids(index, NOW, audience, {("brand", "b1")}) == {"global", "brand"}
@@ -4,6 +4,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Optional
 import os
+import time
 from datetime import datetime, timedelta
 import jwt
 
@@ -20,6 +21,23 @@ app.add_middleware(
 
 security = HTTPBearer()
 
+# 以下 docs/api 元件需與本檔一同載入：
+# - backend-auth-cache.py：JWT 金鑰與驗證快取（jwt_keyring / decode_token_cached / auth_metrics）
+# - backend-database.py：共用資料庫連線池 db
+# - backend-schedule-query.py：排班範圍查詢（keyset 分頁）
+# - backend-schedule-batch-api.py：排班批次建立與衝突檢測
+# - backend-shift-expansion.py：班別展開快取（模板 + 日期 → UTC 起訖）
+# - backend-schedule-import-api.py：排班 CSV 匯入
+# - backend-schedule-coverage-api.py：排班人力覆蓋率
+# - backend-leave-balance.py：請假餘額帳本與審核
+# - backend-leave-schedule-check.py：請假與排班衝突檢查
+# - backend-notice-index.py：公告對象反向索引
+# - backend-notice-ack-buffer.py：公告已讀 / 確認批次寫入
+# - backend-dashboard-counters.py：Dashboard 計數器
+# - backend-salary-payroll.py：薪資批次計算
+# - backend-salary-rollups.py：薪資確認 / 發放與報表彙總
+# - backend-audit-log.py：審計日誌非同步批次寫入
+
 # Pydantic Models
 class LoginRequest(BaseModel):
     username: str
@@ -67,6 +85,7 @@ class LeaveRequest(BaseModel):
     type_id: str
     start_at: datetime
     end_at: datetime
+    timezone: str = "Asia/Taipei"
     reason: str
     attachment_urls: List[str] = []
 
@@ -80,19 +99,21 @@ class Notice(BaseModel):
     require_ack: bool = False
 
 # 權限驗證
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    started = time.perf_counter()
+    ok = False
     try:
-        payload = jwt.decode(
-            credentials.credentials, 
-            os.getenv("JWT_SECRET_KEY"), 
-            algorithms=["HS256"]
-        )
+        payload = decode_token_cached(credentials.credentials)
+        ok = True
         return payload
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        auth_metrics.observe(elapsed_ms, ok)
 
 # API 端點
 @app.get("/health")
@@ -120,7 +141,7 @@ async def login(request: LoginRequest):
             "exp": datetime.utcnow() + timedelta(hours=24)
         }
         
-        token = jwt.encode(token_data, os.getenv("JWT_SECRET_KEY"), algorithm="HS256")
+        token = jwt.encode(token_data, jwt_keyring.signing_key, algorithm=JWT_ALGORITHM)
         
         return LoginResponse(
             user=user,
@@ -158,23 +179,55 @@ async def create_shift_template(
     # TODO: 實際創建邏輯
     return {"id": "template_123", **template.dict()}
 
+# 班別模板的修改 / 刪除實作需在提交後呼叫 shift_expansions.invalidate(template_id)，
+# 清除已展開的月份區塊（見 docs/api/backend-shift-expansion.py）
+
 @app.get("/api/v1/schedule-assignments")
 async def get_schedule_assignments(
     from_date: str = None,
     to_date: str = None,
     user_id: str = None,
+    cursor: str = None,
+    limit: int = 500,
+    fields: str = None,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際查詢邏輯
-    return {"assignments": []}
+    # keyset 分頁與欄位投影見 docs/api/backend-schedule-query.py
+    try:
+        return await db.run(
+            fetch_schedule_page,
+            fields,
+            from_date,
+            to_date,
+            user_id,
+            cursor,
+            limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/v1/schedule-assignments")
 async def create_schedule_assignment(
     assignment: ScheduleAssignment,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際創建邏輯與衝突檢測
-    return {"id": "assignment_123", **assignment.dict()}
+    # 衝突檢測與寫入見 docs/api/backend-schedule-batch-api.py
+    result = await db.run(
+        create_assignments_checked,
+        [assignment],
+        token_data.get("user_id"),
+        True
+    )
+    if result["errors"]:
+        error = result["errors"][0]
+        raise HTTPException(
+            status_code=409 if error["error"] in ("conflict", "id already exists") else 400,
+            detail=error
+        )
+    await audit_log_writer.record(
+        token_data, "create", "schedule_assignment", result["ids"][0], new_values=assignment.dict()
+    )
+    return {**assignment.dict(), "id": result["ids"][0]}
 
 @app.get("/api/v1/leave-types")
 async def get_leave_types(token_data: dict = Depends(verify_token)):
@@ -198,20 +251,42 @@ async def get_leave_balance(
     year: int = None,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際查詢邏輯
-    return {
-        "balances": {
-            "ANNUAL": {"total": 14, "used": 5, "remaining": 9}
-        }
-    }
+    # 讀取彙總後的請假帳本（見 docs/api/backend-leave-balance.py）
+    # 只有本人或主管 / 稽核角色可查詢
+    if user_id != token_data.get("user_id") and token_data.get("role") not in (*LEAVE_MANAGER_ROLES, "Auditor"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    year = year or datetime.now().year
+    members = await db.run(load_leave_balances, year, [user_id])
+    if user_id not in members:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"year": year, "balances": members[user_id]["balances"]}
 
 @app.post("/api/v1/leave-requests")
 async def create_leave_request(
     request: LeaveRequest,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際創建邏輯與餘額檢查
-    return {"id": "leave_123", **request.dict()}
+    if request.end_at <= request.start_at:
+        raise HTTPException(status_code=400, detail="end_at must be after start_at")
+    # 排班衝突、天數與餘額檢查見 docs/api/backend-leave-schedule-check.py，
+    # 通過後寫入申請並在同一交易中記入 pending 帳本
+    result = await db.run(create_leave_request_checked, request, token_data.get("user_id"))
+    if "error" in result:
+        error = result["error"]
+        raise HTTPException(
+            status_code=409 if error["error"] == "overlapping_leave" else 400,
+            detail=error
+        )
+    await audit_log_writer.record(
+        token_data, "create", "leave_request", result["id"], new_values={**request.dict(), "days": result["days"]}
+    )
+    return {
+        **request.dict(),
+        "id": result["id"],
+        "days": result["days"],
+        "affected_shifts": result["affected_shifts"],
+        "status": "pending"
+    }
 
 @app.get("/api/v1/notices")
 async def get_notices(
@@ -219,26 +294,66 @@ async def get_notices(
     require_ack: bool = None,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際查詢邏輯
-    return {"notices": []}
+    # 由公告反向索引取得（見 docs/api/backend-notice-index.py），scope 如 "brand:b1,workspace:w2"
+    try:
+        scope_filter = parse_scope_filter(scope)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    user = await db.run(load_notice_user, token_data.get("user_id"))
+    notices = notice_index.visible(notice_audience(token_data, user), scope_filter, require_ack)
+    return {"notices": [_serialize_notice(n) for n in notices]}
 
 @app.post("/api/v1/notices")
 async def create_notice(
     notice: Notice,
     token_data: dict = Depends(verify_token)
 ):
-    # TODO: 實際創建邏輯
-    return {"id": "notice_123", **notice.dict()}
+    if notice.ends_at <= notice.starts_at:
+        raise HTTPException(status_code=400, detail="ends_at must be after starts_at")
+    try:
+        record = _notice_record(notice, token_data.get("user_id"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.run(save_notice, record, True)
+    notice_index.upsert(record)
+    return _serialize_notice(record)
+
+@app.put("/api/v1/notices/{notice_id}")
+async def update_notice(
+    notice_id: str,
+    notice: Notice,
+    token_data: dict = Depends(verify_token)
+):
+    if notice.ends_at <= notice.starts_at:
+        raise HTTPException(status_code=400, detail="ends_at must be after starts_at")
+    notice.id = notice_id
+    try:
+        record = _notice_record(notice, token_data.get("user_id"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await db.run(save_notice, record, False):
+        raise HTTPException(status_code=404, detail="Notice not found")
+    notice_index.upsert(record)
+    return _serialize_notice(record)
+
+@app.delete("/api/v1/notices/{notice_id}")
+async def delete_notice(
+    notice_id: str,
+    token_data: dict = Depends(verify_token)
+):
+    result = await db.execute(
+        "UPDATE notices SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
+        (notice_id,)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Notice not found")
+    notice_index.remove(notice_id)
+    return {"message": "Notice deleted successfully"}
 
 @app.get("/api/v1/dashboard/stats")
 async def get_dashboard_stats(token_data: dict = Depends(verify_token)):
-    # TODO: 實際統計邏輯
-    return {
-        "brand_count": 5,
-        "workspace_count": 12,
-        "bot_count": 8,
-        "agent_count": 24
-    }
+    """計數器由 backend-dashboard-counters.py 增量維護"""
+    return dashboard_counters.snapshot()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,3 @@
+-- Brand 上游 token 的到期時間（NULL 表示不會過期）
+-- 各 worker 的 brand_credentials 快取在到期前 BRAND_TOKEN_REFRESH_AHEAD 秒重新讀取
+ALTER TABLE brands ADD COLUMN token_expires_at TIMESTAMP;
@@ -52,6 +52,11 @@ CREATE TABLE IF NOT EXISTS brand_agents (
     FOREIGN KEY (brand_id) REFERENCES brands(id) ON DELETE CASCADE
 );
 
+-- 依 brand_id 檢查關聯資源與分批刪除
+CREATE INDEX IF NOT EXISTS idx_brand_workspaces_brand ON brand_workspaces(brand_id);
+CREATE INDEX IF NOT EXISTS idx_brand_bots_brand ON brand_bots(brand_id);
+CREATE INDEX IF NOT EXISTS idx_brand_agents_brand ON brand_agents(brand_id);
+
 -- 刪除記錄表（用於審計）
 CREATE TABLE IF NOT EXISTS brand_deletion_log (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -64,6 +69,17 @@ CREATE TABLE IF NOT EXISTS brand_deletion_log (
     associated_resources JSON -- 記錄刪除時的關聯資源數量
 );
 
+-- cascade 刪除進度（既有資料庫同樣執行以下 ALTER TABLE）
+ALTER TABLE brand_deletion_log ADD COLUMN status VARCHAR(20) DEFAULT 'completed'; -- 'running' / 'completed' / 'failed'
+ALTER TABLE brand_deletion_log ADD COLUMN progress JSON; -- 已刪除的關聯資源數量
+ALTER TABLE brand_deletion_log ADD COLUMN completed_at TIMESTAMP NULL;
+ALTER TABLE brand_deletion_log ADD COLUMN error TEXT;
+-- 執行中的 cascade 由取得租約的 worker 處理，租約過期後其他 worker 才能接手
+ALTER TABLE brand_deletion_log ADD COLUMN owner VARCHAR(100) NULL;
+ALTER TABLE brand_deletion_log ADD COLUMN lease_expires_at TIMESTAMP NULL;
+
+CREATE INDEX IF NOT EXISTS idx_brand_deletion_log_brand ON brand_deletion_log(brand_id, status);
+
 -- 觸發器：記錄刪除操作
 CREATE TRIGGER IF NOT EXISTS log_brand_deletion
 AFTER UPDATE OF deleted_at ON brands
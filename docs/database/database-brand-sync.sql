@@ -0,0 +1,22 @@
+-- Brand 資源增量同步
+
+-- 每列上游資料的雜湊，與上游比對後只寫入有變動的列
+ALTER TABLE brand_workspaces ADD COLUMN fingerprint VARCHAR(40);
+ALTER TABLE brand_bots ADD COLUMN fingerprint VARCHAR(40);
+ALTER TABLE brand_agents ADD COLUMN fingerprint VARCHAR(40);
+
+-- 同步以 (brand_id, 上游 id) upsert
+CREATE UNIQUE INDEX IF NOT EXISTS idx_brand_workspaces_external ON brand_workspaces(brand_id, workspace_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_brand_bots_external ON brand_bots(brand_id, bot_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_brand_agents_external ON brand_agents(brand_id, agent_id);
+
+-- 每個 Brand 最後一次同步的狀態與水位（上游資料最新的 updated_at）
+CREATE TABLE IF NOT EXISTS brand_sync_state (
+    brand_id VARCHAR(36) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL, -- 'success' / 'failed'
+    synced_at TIMESTAMP,
+    watermark VARCHAR(40),
+    last_error TEXT,
+    stats JSON,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
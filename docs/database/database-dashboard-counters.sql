@@ -0,0 +1,15 @@
+-- Dashboard 計數器
+
+-- 建立 / 刪除 / 軟刪除時與資料在同一交易中增減，由定期校正工作修正偏差
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 初始值由校正工作（reconcile）計算
+INSERT OR IGNORE INTO dashboard_counters (name, value) VALUES
+('brand_count', 0),
+('workspace_count', 0),
+('bot_count', 0),
+('agent_count', 0);
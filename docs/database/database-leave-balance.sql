@@ -0,0 +1,34 @@
+-- 請假餘額帳本（append-only）與彙總表
+
+-- 每次請假申請狀態變更寫入一列，只新增不修改；
+-- to_status 為 'adjust' 的列是重建工作修正彙總表時留下的差額
+CREATE TABLE IF NOT EXISTS leave_balance_ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id VARCHAR(36) NOT NULL,
+    leave_type_id VARCHAR(36) NOT NULL,
+    year INTEGER NOT NULL,
+    request_id VARCHAR(36),
+    from_status VARCHAR(20),
+    to_status VARCHAR(20) NOT NULL,
+    used_delta DECIMAL(5,1) NOT NULL DEFAULT 0,
+    pending_delta DECIMAL(5,1) NOT NULL DEFAULT 0,
+    created_by VARCHAR(36),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 每位使用者、假別、年度一列的累計值，與帳本在同一交易中更新
+CREATE TABLE IF NOT EXISTS leave_balances (
+    user_id VARCHAR(36) NOT NULL,
+    leave_type_id VARCHAR(36) NOT NULL,
+    year INTEGER NOT NULL,
+    used_days DECIMAL(5,1) NOT NULL DEFAULT 0,
+    pending_days DECIMAL(5,1) NOT NULL DEFAULT 0,
+    last_ledger_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, leave_type_id, year)
+);
+
+-- 建立索引
+CREATE INDEX IF NOT EXISTS idx_leave_ledger_balance ON leave_balance_ledger(user_id, leave_type_id, year);
+CREATE INDEX IF NOT EXISTS idx_leave_ledger_request ON leave_balance_ledger(request_id);
+CREATE INDEX IF NOT EXISTS idx_leave_balances_year ON leave_balances(year, user_id);
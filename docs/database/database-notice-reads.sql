@@ -0,0 +1,19 @@
+-- 公告已讀 / 確認相關資料庫結構
+
+-- notice_reads 增加確認時間（require_ack 公告）：
+-- acked_at TIMESTAMP NULL 與已確認名單的索引 idx_notice_reads_acked (notice_id, acked_at, user_id)
+-- 由 backend-notice-ack-buffer.py 啟動時檢查 PRAGMA table_info 後才新增；
+-- SQLite 的 ALTER TABLE ADD COLUMN 沒有 IF NOT EXISTS，本檔的其餘語句可重複執行
+
+-- 批次 upsert 依 (notice_id, user_id) 判斷衝突
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notice_reads_notice_user ON notice_reads(notice_id, user_id);
+
+-- 每則公告的已讀 / 已確認人數，與 notice_reads 在同一交易中增量更新
+CREATE TABLE IF NOT EXISTS notice_ack_counts (
+    notice_id VARCHAR(36) PRIMARY KEY,
+    read_count INTEGER NOT NULL DEFAULT 0,
+    ack_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (notice_id) REFERENCES notices(id) ON DELETE CASCADE
+);
+
@@ -0,0 +1,30 @@
+-- 薪資報表彙總表
+
+-- 每個 (期間, Workspace, 職等, 部門) 一列，薪資計算確認時累加、發放時累加 paid_count，
+-- 與 salary_calculations 的狀態變更在同一交易中更新；金額以「分」為單位的整數保存，累加不產生誤差
+CREATE TABLE IF NOT EXISTS salary_rollups (
+    calculation_period VARCHAR(7) NOT NULL,
+    workspace_id VARCHAR(36) NOT NULL DEFAULT '',
+    salary_grade_id VARCHAR(36) NOT NULL DEFAULT '',
+    department VARCHAR(100) NOT NULL DEFAULT '',
+    employee_count INTEGER NOT NULL DEFAULT 0,
+    paid_count INTEGER NOT NULL DEFAULT 0,
+    base_cents INTEGER NOT NULL DEFAULT 0,
+    overtime_cents INTEGER NOT NULL DEFAULT 0,
+    bonus_cents INTEGER NOT NULL DEFAULT 0,
+    allowance_cents INTEGER NOT NULL DEFAULT 0,
+    deduction_cents INTEGER NOT NULL DEFAULT 0,
+    gross_cents INTEGER NOT NULL DEFAULT 0,
+    tax_cents INTEGER NOT NULL DEFAULT 0,
+    transfer_fee_cents INTEGER NOT NULL DEFAULT 0,
+    net_cents INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (calculation_period, workspace_id, salary_grade_id, department)
+);
+
+-- 每個期間的版本號，彙總表變動時遞增；各 worker 以此判斷快取中的期間是否仍有效
+CREATE TABLE IF NOT EXISTS salary_rollup_periods (
+    calculation_period VARCHAR(7) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,102 @@
+-- 薪資管理資料庫結構（欄位定義見 docs/api/backend-salary-management-api.md）
+-- 與規格的差異：employee_salaries / salary_calculations 增加 workspace_id 與部門，
+-- salary_calculations 保存計算當時的職等，供整個 Workspace 的批次計算與報表使用，
+-- 並以 allowance_amount 分開保存 allowance 類調整（規格的 salary_calculations 沒有此欄位）
+
+CREATE TABLE IF NOT EXISTS salary_settings (
+    id VARCHAR(36) PRIMARY KEY,
+    workspace_id VARCHAR(36) NOT NULL UNIQUE,
+    has_fixed_tax BOOLEAN DEFAULT 1,
+    fixed_tax_rate DECIMAL(5,4) DEFAULT 0.05,
+    transfer_fee DECIMAL(10,2) DEFAULT 15.00,
+    payroll_cycle VARCHAR(20) DEFAULT 'monthly',
+    payroll_day INTEGER DEFAULT 25,
+    cutoff_day INTEGER DEFAULT 20,
+    auto_generate_days INTEGER DEFAULT 3,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS salary_grades (
+    id VARCHAR(36) PRIMARY KEY,
+    grade_name VARCHAR(100) NOT NULL,
+    base_salary DECIMAL(12,2) NOT NULL,
+    description TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS employee_salaries (
+    id VARCHAR(36) PRIMARY KEY,
+    workspace_id VARCHAR(36) NOT NULL,
+    member_id VARCHAR(100) NOT NULL,
+    member_name VARCHAR(100) NOT NULL,
+    member_email VARCHAR(255) NOT NULL,
+    department VARCHAR(100),
+    salary_grade_id VARCHAR(36) NOT NULL,
+    effective_date DATE NOT NULL,
+    is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (salary_grade_id) REFERENCES salary_grades(id)
+);
+
+-- 批次計算依 Workspace 取出所有成員在期間結束前最新的薪資設定
+CREATE INDEX IF NOT EXISTS idx_employee_salaries_workspace ON employee_salaries(workspace_id, member_id, effective_date);
+
+CREATE TABLE IF NOT EXISTS salary_adjustment_types (
+    id VARCHAR(36) PRIMARY KEY,
+    type_name VARCHAR(100) NOT NULL,
+    adjustment_type VARCHAR(20) NOT NULL, -- 'bonus' / 'deduction' / 'allowance'
+    is_percentage BOOLEAN DEFAULT 0,
+    description TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS salary_adjustments (
+    id VARCHAR(36) PRIMARY KEY,
+    member_id VARCHAR(100) NOT NULL,
+    adjustment_type_id VARCHAR(36) NOT NULL,
+    amount DECIMAL(12,2) NOT NULL,
+    reason TEXT,
+    adjustment_date DATE NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending', -- 'pending' / 'processed' / 'cancelled'
+    processed_at TIMESTAMP NULL,
+    created_by VARCHAR(36),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (adjustment_type_id) REFERENCES salary_adjustment_types(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_salary_adjustments_date ON salary_adjustments(adjustment_date, status, member_id);
+
+CREATE TABLE IF NOT EXISTS salary_calculations (
+    id VARCHAR(36) PRIMARY KEY,
+    workspace_id VARCHAR(36),
+    member_id VARCHAR(100) NOT NULL,
+    calculation_period VARCHAR(7) NOT NULL, -- YYYY-MM
+    salary_grade_id VARCHAR(36),
+    department VARCHAR(100),
+    -- 計算結果以小數兩位的十進位字串保存；SQLite 的 DECIMAL 欄位會把字串轉成浮點數
+    base_salary TEXT NOT NULL,
+    overtime_hours TEXT DEFAULT '0',
+    overtime_amount TEXT DEFAULT '0.00',
+    bonus_amount TEXT DEFAULT '0.00',
+    allowance_amount TEXT DEFAULT '0.00', -- allowance 類調整，與 bonus 分開保存
+    deduction_amount TEXT DEFAULT '0.00',
+    gross_salary TEXT NOT NULL,
+    tax_amount TEXT DEFAULT '0.00',
+    transfer_fee TEXT DEFAULT '0.00',
+    net_salary TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'draft', -- 'draft' / 'confirmed' / 'paid'
+    confirmed_at TIMESTAMP NULL,
+    paid_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (member_id, calculation_period)
+);
+
+CREATE INDEX IF NOT EXISTS idx_salary_calculations_period ON salary_calculations(calculation_period, workspace_id, status);
@@ -117,6 +117,7 @@ CREATE TABLE leave_requests (
     FOREIGN KEY (applicant_id) REFERENCES users(id),
     FOREIGN KEY (type_id) REFERENCES leave_types(id),
     INDEX idx_applicant (applicant_id),
+    INDEX idx_applicant_range (applicant_id, start_at, end_at),
     INDEX idx_status (status),
     INDEX idx_date_range (start_at, end_at)
 );
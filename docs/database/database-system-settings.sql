@@ -15,6 +15,13 @@ CREATE TABLE IF NOT EXISTS system_settings (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 系統設定版本（單列），每次更新設定時遞增，供各 worker 的快取與 ETag 使用
+CREATE TABLE IF NOT EXISTS system_settings_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- 系統備份記錄表
 CREATE TABLE IF NOT EXISTS system_backups (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,6 +35,8 @@ CREATE TABLE IF NOT EXISTS system_backups (
 INSERT OR IGNORE INTO system_settings (id, site_name, default_language, timezone, debug_mode) 
 VALUES (1, 'HRM 管理系統', 'zh-TW', 'Asia/Taipei', FALSE);
 
+INSERT OR IGNORE INTO system_settings_version (id, version) VALUES (1, 1);
+
 -- 建立索引
 CREATE INDEX IF NOT EXISTS idx_system_settings_updated_at ON system_settings(updated_at);
 CREATE INDEX IF NOT EXISTS idx_system_backups_created_at ON system_backups(created_at);
\ No newline at end of file